@@ -1,17 +1,21 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Response
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 from .schemas import UserRegister, UserLogin, TokenResponse, PasswordChange, EmailChange
-from .deps import supabase, get_current_user
-from .utils import verify_password, get_password_hash, create_tokens
+from .deps import supabase, get_current_user, get_refresh_token_user, revoke_token, revoke_user_tokens
+from .utils import verify_password_async, create_tokens
+from ..core.postgrest import postgrest
+from ..core.responses import FastJSONRoute
 from typing import Dict
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+router = APIRouter(prefix="/auth", tags=["auth"], route_class=FastJSONRoute)
 
 @router.post("/register", response_model=TokenResponse)
 async def register(user_data: UserRegister):
     try:
         # Check if user exists
-        existing_user = supabase.auth.admin.list_users(
+        existing_user = await run_in_threadpool(
+            supabase.auth.admin.list_users,
             filters={"email": user_data.email}
         )
         if existing_user:
@@ -21,7 +25,7 @@ async def register(user_data: UserRegister):
             )
 
         # Create user in Supabase
-        user = supabase.auth.admin.create_user({
+        user = await run_in_threadpool(supabase.auth.admin.create_user, {
             "email": user_data.email,
             "password": user_data.password,
             "email_confirm": True
@@ -33,7 +37,7 @@ async def register(user_data: UserRegister):
             "email": user_data.email,
             "display_name": user_data.display_name or user_data.email.split("@")[0]
         }
-        supabase.table("profiles").insert(profile_data).execute()
+        await postgrest.insert("profiles", profile_data, returning=False)
 
         # Generate tokens
         tokens = create_tokens(user.id, user.email)
@@ -49,7 +53,7 @@ async def register(user_data: UserRegister):
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     try:
         # Authenticate with Supabase
-        auth_response = supabase.auth.sign_in_with_password({
+        auth_response = await run_in_threadpool(supabase.auth.sign_in_with_password, {
             "email": form_data.username,
             "password": form_data.password
         })
@@ -72,7 +76,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         )
 
 @router.post("/refresh", response_model=TokenResponse)
-async def refresh_token(response: Response, current_user: Dict = Depends(get_current_user)):
+async def refresh_token(response: Response, current_user: Dict = Depends(get_refresh_token_user)):
     try:
         # Generate new tokens
         tokens = create_tokens(current_user["id"], current_user["email"])
@@ -88,7 +92,11 @@ async def refresh_token(response: Response, current_user: Dict = Depends(get_cur
 async def logout(current_user: Dict = Depends(get_current_user)):
     try:
         # Sign out from Supabase
-        supabase.auth.sign_out()
+        await run_in_threadpool(supabase.auth.sign_out)
+
+        # Deny the presented token for the rest of its lifetime
+        if current_user.get("jti"):
+            await revoke_token(current_user["id"], current_user["jti"], current_user["exp"])
         return {"message": "Successfully logged out"}
     except Exception as e:
         raise HTTPException(
@@ -103,18 +111,22 @@ async def change_password(
 ):
     try:
         # Verify old password
-        user = supabase.auth.get_user(current_user["id"])
-        if not verify_password(password_data.old_password, user.password_hash):
+        user = await run_in_threadpool(supabase.auth.get_user, current_user["id"])
+        if not await verify_password_async(password_data.old_password, user.password_hash):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Incorrect password"
             )
 
         # Update password
-        supabase.auth.admin.update_user_by_id(
+        await run_in_threadpool(
+            supabase.auth.admin.update_user_by_id,
             current_user["id"],
             {"password": password_data.new_password}
         )
+
+        # Invalidate sessions issued with the old password
+        await revoke_user_tokens(current_user["id"])
         return {"message": "Password updated successfully"}
 
     except Exception as e:
@@ -130,18 +142,22 @@ async def change_email(
 ):
     try:
         # Verify password
-        user = supabase.auth.get_user(current_user["id"])
-        if not verify_password(email_data.password, user.password_hash):
+        user = await run_in_threadpool(supabase.auth.get_user, current_user["id"])
+        if not await verify_password_async(email_data.password, user.password_hash):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Incorrect password"
             )
 
         # Update email
-        supabase.auth.admin.update_user_by_id(
+        await run_in_threadpool(
+            supabase.auth.admin.update_user_by_id,
             current_user["id"],
             {"email": email_data.new_email}
         )
+
+        # Existing tokens carry the old email claim
+        await revoke_user_tokens(current_user["id"])
         return {"message": "Email updated successfully"}
 
     except Exception as e:
@@ -154,7 +170,7 @@ async def change_email(
 async def request_password_reset(email: str):
     try:
         # Send password reset email through Supabase
-        supabase.auth.reset_password_email(email)
+        await run_in_threadpool(supabase.auth.reset_password_email, email)
         return {"message": "Password reset email sent"}
     except Exception as e:
         # Don't reveal if email exists
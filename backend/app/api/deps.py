@@ -1,34 +1,118 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
+from starlette.datastructures import Headers
 from fastapi.security import OAuth2PasswordBearer
-from supabase import create_client, Client
-import os
+import time
+import logging
+from typing import Optional
 from dotenv import load_dotenv
-from .utils import decode_token
+from .utils import decode_token, REFRESH_TOKEN_EXPIRE_DAYS
+from ..core.cache import cache, LocalCache
+from ..core.config import settings
+from ..core.database import supabase
 
 load_dotenv()
 
-# Supabase setup
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
+logger = logging.getLogger(__name__)
 
 # OAuth2 scheme for JWT
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+# Redis hash per user holding revoked token ids (jti -> exp) and a "before"
+# cutoff: tokens issued in or before that second are rejected (password
+# change, deletion).
+REVOCATION_KEY = "auth:revoked:{user_id}"
+REVOCATION_TTL = REFRESH_TOKEN_EXPIRE_DAYS * 86400
+
+# Per-process copy of the revocation state; revocations made by another
+# worker take effect here within AUTH_USER_CACHE_TTL seconds.
+_revocation_cache = LocalCache(ttl=settings.AUTH_USER_CACHE_TTL, name="auth_revocations")
+
+async def _get_revocations(user_id: str) -> dict:
+    """Get the revocation state for a user, served from the local cache when fresh"""
+    revocations = _revocation_cache.get(user_id)
+    if revocations is None:
+        try:
+            revocations = await cache.get_all_hash(REVOCATION_KEY.format(user_id=user_id))
+        except Exception as e:
+            # Fail open: the token signature has already been verified. Not
+            # cached, so revocations apply again as soon as Redis is back
+            logger.error(f"Failed to load token revocations for {user_id}: {str(e)}")
+            return {}
+        _revocation_cache.set(user_id, revocations)
+    return revocations
+
+async def revoke_token(user_id: str, jti: str, exp: int) -> None:
+    """Deny a single token (e.g. on logout) until it would have expired anyway"""
+    key = REVOCATION_KEY.format(user_id=user_id)
+    await cache.set_hash(key, jti, str(exp))
+    await cache.expire(key, REVOCATION_TTL)
+    _revocation_cache.delete(user_id)
+
+async def revoke_user_tokens(user_id: str) -> None:
     """
-    Get the current authenticated user from the JWT token.
+    Deny every token issued to the user up to now
+
+    iat has one-second resolution, so tokens issued later in the same
+    second are denied as well.
+    """
+    key = REVOCATION_KEY.format(user_id=user_id)
+    await cache.set_hash(key, "before", str(int(time.time())))
+    await cache.expire(key, REVOCATION_TTL)
+    _revocation_cache.delete(user_id)
+
+# Key in the ASGI scope's state under which admission_key leaves the
+# (token, claims) it decoded, so get_current_user does not decode it again
+TOKEN_CLAIMS_STATE = "token_claims"
+
+async def _authenticate(token: str, token_type: str, claims: Optional[dict] = None) -> dict:
+    """
+    Verify a token of the given type ("access" or "refresh") and return its user.
+
+    The signed claims are trusted as-is; the only per-user state consulted
+    is the (locally cached) revocation denylist, so no network call is made
+    on the hot path. claims, when given, are the already verified claims of
+    token.
     """
     try:
-        payload = decode_token(token)
-        user = supabase.auth.get_user(payload["sub"])
-        if user is None:
+        payload = claims if claims is not None else decode_token(token)
+        # Refresh tokens live for days; they must not pass as access tokens
+        if payload.get("type") != token_type:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token type",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        user_id = payload.get("sub")
+        if not user_id:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return user
+
+        revocations = await _get_revocations(user_id)
+        if revocations:
+            jti = payload.get("jti")
+            # Issued in or before the second of the last revoke_user_tokens
+            revoked_through = revocations.get("before")
+            if (jti and jti in revocations) or (
+                revoked_through is not None and payload.get("iat", 0) <= int(revoked_through)
+            ):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Token has been revoked",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+
+        return {
+            "id": user_id,
+            "email": payload.get("email"),
+            "aud": "authenticated",
+            "jti": payload.get("jti"),
+            "exp": payload.get("exp"),
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -36,6 +120,45 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    Get the current authenticated user from the JWT access token.
+    """
+    decoded = request.scope.get("state", {}).get(TOKEN_CLAIMS_STATE)
+    claims = decoded[1] if decoded and decoded[0] == token else None
+    return await _authenticate(token, "access", claims)
+
+async def get_refresh_token_user(token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    Get the user of a refresh token, for issuing new tokens.
+    """
+    return await _authenticate(token, "refresh")
+
+def admission_key(scope: dict) -> str:
+    """
+    Identity admission control limits a request by (see core/admission.py)
+    
+    The user id of a valid bearer token, so forged tokens cannot use up
+    another user's share; the client address for anonymous requests. Behind
+    a proxy every anonymous request has the proxy's address, so routes
+    reached without a token (login, register) are not admission controlled
+    by default. The decoded claims are left in the scope's state for
+    get_current_user.
+    """
+    scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            claims = decode_token(token)
+            user_id = claims.get("sub")
+            if user_id:
+                scope.setdefault("state", {})[TOKEN_CLAIMS_STATE] = (token, claims)
+                return f"user:{user_id}"
+        except Exception:
+            # Invalid tokens are rejected by get_current_user later
+            pass
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "anonymous"
+
 async def get_current_active_user(current_user: dict = Depends(get_current_user)) -> dict:
     """
     Get the current active user and verify their account is not disabled.
@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import hmac
+import threading
+from ..core.config import settings
+from ..core.diagnostics import blocking_detector, profiler
+from ..core.responses import FastJSONRoute
+
+async def require_diagnostics_token(x_diagnostics_token: Optional[str] = Header(None)):
+    """Only callers holding DIAGNOSTICS_TOKEN may use the diagnostics endpoints"""
+    if not settings.DIAGNOSTICS_TOKEN or not x_diagnostics_token or not hmac.compare_digest(
+        x_diagnostics_token, settings.DIAGNOSTICS_TOKEN
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid diagnostics token"
+        )
+
+router = APIRouter(
+    prefix="/debug",
+    tags=["diagnostics"],
+    dependencies=[Depends(require_diagnostics_token)],
+    include_in_schema=False,
+    route_class=FastJSONRoute
+)
+
+@router.get("/blocking")
+async def get_blocking():
+    """Recent event-loop stalls with their stacks, and total blocked time per function"""
+    return blocking_detector.report()
+
+@router.get("/profile")
+async def get_profile(
+    seconds: float = Query(10, gt=0),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    threads: str = Query("all", pattern="^(all|loop)$"),
+    format: str = Query("collapsed", pattern="^(collapsed|top)$"),
+    idle: bool = False
+):
+    """
+    Sample stacks for a time window
+
+    The collapsed output can be rendered with flamegraph.pl, speedscope
+    or inferno; "top" lists the functions with the most self samples.
+    threads=loop samples only the event loop thread; idle=true keeps
+    samples of threads waiting for work.
+    """
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"seconds must be at most {settings.PROFILE_MAX_SECONDS}"
+        )
+    if profiler.busy:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already running"
+        )
+
+    thread_id = threading.get_ident() if threads == "loop" else None
+    try:
+        collapsed = await run_in_threadpool(profiler.profile, seconds, interval_ms / 1000, thread_id, idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+    if format == "top":
+        return {"seconds": seconds, "functions": profiler.top(collapsed)}
+    return PlainTextResponse(collapsed)
@@ -1,56 +1,85 @@
-from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
-from typing import List, Optional
+from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Optional
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import json
 import logging
 import uuid
 
 from ...core.config import get_settings
-from ...services.storage import CloudStorage
+from ...core.encoding import to_primitive
+from ...core.postgrest import postgrest
+from ...services.storage import storage_client
 from ...services.vision import VisionAI
 from ...services.shopping import ShoppingAPI
-from ...db.mongodb import get_database
-from ...models.user import User
-from ...core.auth import get_current_user
+from ..deps import get_current_user
+from ...core.pagination import encode_cursor, decode_cursor, get_cached_count, adjust_cached_count
+from ...core.jobs import job_queue
+from ...core.responses import FastJSONRoute
+from ...services.analysis import ANALYZE_IMAGE_JOB, analysis_job_id, build_product_query
 
 settings = get_settings()
-router = APIRouter()
+router = APIRouter(prefix="/images", tags=["images"], route_class=FastJSONRoute)
 logger = logging.getLogger(__name__)
 
-cloud_storage = CloudStorage()
-vision_ai = VisionAI()
-shopping_api = ShoppingAPI()
+IMAGE_COUNT_KEY = "image_count:{user_id}"
+
+# Columns returned by the upload history
+IMAGE_HISTORY_COLUMNS = "id,file_name,public_url,analysis,dominant_colors,similar_products,created_at"
+SSE_KEEPALIVE_SECONDS = 15
+
+
+def _check_profile(profile: Optional[str]):
+    """Reject a Vision feature profile VisionAI does not define"""
+    if profile is not None and profile not in VisionAI.PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"profile must be one of: {', '.join(VisionAI.PROFILES)}"
+        )
 
 
 @router.post("/upload/")
 async def upload_image(
     file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None,
-    current_user: User = Depends(get_current_user),
+    current_user: Dict = Depends(get_current_user),
     analyze: bool = True,
-    db = Depends(get_database)
+    per_garment: bool = False,
+    profile: Optional[str] = None
 ):
     """
-    Upload an image to cloud storage and optionally analyze it with Vision AI.
-    Returns the image URL and analysis results if requested.
+    Upload an image to cloud storage and optionally queue it for analysis.
+    Returns as soon as the image is stored; poll /jobs/{job_id} for the
+    analysis and similar products. With per_garment, every detected garment
+    is analysed and searched on its own crop. profile selects the Vision
+    feature profile of the analysis (see VisionAI.PROFILES).
     """
+    _check_profile(profile)
+    if not file.content_type or not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    # Read one byte past the limit to detect oversize files without buffering them whole
+    file_content = await file.read(settings.MAX_IMAGE_SIZE + 1)
+    if len(file_content) > settings.MAX_IMAGE_SIZE:
+        raise HTTPException(status_code=413, detail=f"File exceeds {settings.MAX_IMAGE_SIZE} bytes")
+    
     try:
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
+        user_id = current_user["id"]
         
         # Create a unique ID for this upload
         upload_id = str(uuid.uuid4())
         
-        # Upload file to Google Cloud Storage
-        file_content = await file.read()
-        file_path = cloud_storage.generate_upload_path(
-            user_id=str(current_user.id),
-            filename=file.filename
+        # Upload file to Google Cloud Storage (a blocking client, so off the event loop)
+        file_path = storage_client.generate_upload_path(
+            user_id=user_id,
+            filename=file.filename,
+            unique_id=upload_id[:8]
         )
-        
-        public_url = cloud_storage.upload_file(
-            file_content=file_content,
-            file_path=file_path,
-            content_type=file.content_type
+        public_url = await run_in_threadpool(
+            storage_client.upload_file,
+            file_content,
+            file_path,
+            file.content_type
         )
         
         # Prepare response
@@ -59,47 +88,38 @@ async def upload_image(
             "file_name": file.filename,
             "file_path": file_path,
             "public_url": public_url,
-            "analysis": None,
-            "similar_products": None
+            "job_id": None,
+            "status": None
         }
         
         # Save to database
-        await db.images.insert_one({
+        await postgrest.insert("images", {
             "id": upload_id,
-            "user_id": str(current_user.id),
+            "user_id": user_id,
             "file_name": file.filename,
             "file_path": file_path,
-            "public_url": public_url,
-            "created_at": datetime.utcnow()
-        })
+            "public_url": public_url
+        }, returning=False)
+        await adjust_cached_count(IMAGE_COUNT_KEY.format(user_id=user_id), 1)
         
-        # Analyze image if requested
+        # Queue analysis and product search for the worker pool
         if analyze:
-            # Analyze with Vision AI
-            clothing_items = vision_ai.analyze_clothing(file_content)
-            response_data["analysis"] = clothing_items
-            
-            # Find similar products (if any clothing items were detected)
-            if clothing_items and len(clothing_items) > 0:
-                # Use the primary detected item for product search
-                primary_item = clothing_items[0]
-                query = f"{primary_item['category']} {primary_item['color']} {primary_item['pattern']} {primary_item['style']}"
-                
-                # Search for similar products
-                products = await shopping_api.search_products(
-                    query=query.strip(),
-                    max_results=5
-                )
-                response_data["similar_products"] = products
-                
-                # Update database record with analysis
-                await db.images.update_one(
-                    {"id": upload_id},
-                    {"$set": {
-                        "analysis": clothing_items,
-                        "similar_products": products
-                    }}
-                )
+            job_id = analysis_job_id(upload_id)
+            # Publish before enqueueing so "stored" is always the first event
+            await job_queue.publish(job_id, "stored", {"public_url": public_url})
+            await job_queue.enqueue(
+                ANALYZE_IMAGE_JOB,
+                {
+                    "upload_id": upload_id,
+                    "user_id": user_id,
+                    "file_path": file_path,
+                    "per_garment": per_garment,
+                    "profile": profile
+                },
+                job_id=job_id
+            )
+            response_data["job_id"] = job_id
+            response_data["status"] = job_queue.QUEUED
         
         return response_data
     
@@ -108,29 +128,252 @@ async def upload_image(
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 
+@router.post("/upload/batch/")
+async def upload_image_batch(
+    files: List[UploadFile] = File(...),
+    current_user: Dict = Depends(get_current_user),
+    analyze: bool = True
+):
+    """
+    Upload many images at once (e.g. a wardrobe import).
+    Files are stored concurrently, analysed with batched Vision requests and
+    searched with one product query per distinct detected item across the
+    whole batch. Returns one result per file, in upload order; files that
+    are not images, exceed MAX_IMAGE_SIZE or fail to store or analyse carry
+    an error instead.
+    """
+    if len(files) > settings.MAX_BATCH_UPLOAD_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.MAX_BATCH_UPLOAD_FILES} files per batch"
+        )
+    
+    try:
+        user_id = current_user["id"]
+        results = []
+        for file in files:
+            upload_id = str(uuid.uuid4())
+            result = {"id": upload_id, "file_name": file.filename}
+            if not file.content_type or not file.content_type.startswith('image/'):
+                result["error"] = "File must be an image"
+            else:
+                result["file_path"] = storage_client.generate_upload_path(
+                    user_id=user_id,
+                    filename=file.filename,
+                    unique_id=upload_id[:8]
+                )
+            results.append(result)
+        
+        # Read and upload each file inside its slot, so at most
+        # UPLOAD_CONCURRENCY files are held in memory at once (the parsed
+        # parts themselves are spooled to disk by the multipart parser)
+        upload_slots = asyncio.Semaphore(settings.UPLOAD_CONCURRENCY)
+        
+        async def store(result: dict, file: UploadFile):
+            async with upload_slots:
+                try:
+                    content = await file.read(settings.MAX_IMAGE_SIZE + 1)
+                    if len(content) > settings.MAX_IMAGE_SIZE:
+                        result["error"] = f"File exceeds {settings.MAX_IMAGE_SIZE} bytes"
+                        return
+                    result["public_url"] = await run_in_threadpool(
+                        storage_client.upload_file,
+                        content,
+                        result["file_path"],
+                        file.content_type
+                    )
+                except Exception as e:
+                    result["error"] = str(e)
+        
+        await asyncio.gather(*(
+            store(result, file)
+            for result, file in zip(results, files)
+            if "error" not in result
+        ))
+        
+        stored = [i for i, result in enumerate(results) if "public_url" in result]
+        if stored:
+            await postgrest.insert("images", [
+                {
+                    "id": results[i]["id"],
+                    "user_id": user_id,
+                    "file_name": results[i]["file_name"],
+                    "file_path": results[i]["file_path"],
+                    "public_url": results[i]["public_url"]
+                }
+                for i in stored
+            ], returning=False)
+            await adjust_cached_count(IMAGE_COUNT_KEY.format(user_id=user_id), len(stored))
+        
+        if analyze and stored:
+            # One Vision batch at a time, re-reading the spooled files, so
+            # only one chunk of images is in memory; a failed chunk is
+            # reported on its own items
+            async def read(i: int) -> bytes:
+                await files[i].seek(0)
+                return await files[i].read()
+            
+            analysed = []
+            for start in range(0, len(stored), VisionAI.BATCH_ANNOTATE_LIMIT):
+                chunk = stored[start:start + VisionAI.BATCH_ANNOTATE_LIMIT]
+                try:
+                    analyses = await run_in_threadpool(
+                        VisionAI.analyze_clothing_batch,
+                        [await read(i) for i in chunk]
+                    )
+                except Exception as e:
+                    logger.error(f"Batch analysis of {len(chunk)} images failed: {str(e)}")
+                    for i in chunk:
+                        results[i]["error"] = f"Analysis failed: {str(e)}"
+                    continue
+                for i, analysis in zip(chunk, analyses):
+                    results[i].update(analysis)
+                    if "analysis" in analysis:
+                        analysed.append(i)
+            
+            # One product search per distinct query across the whole batch
+            queries = {}
+            for i in analysed:
+                items = results[i]["analysis"]
+                if items:
+                    query = build_product_query(items[0])
+                    if query:
+                        queries.setdefault(query, []).append(i)
+            
+            products_by_query = dict(zip(queries, await asyncio.gather(*(
+                ShoppingAPI.search_products(query=query, max_results=5)
+                for query in queries
+            ))))
+            for query, indices in queries.items():
+                for i in indices:
+                    results[i]["similar_products"] = products_by_query[query]
+            
+            await asyncio.gather(*(
+                postgrest.update(
+                    "images",
+                    to_primitive({
+                        "analysis": results[i].get("analysis"),
+                        "similar_products": results[i].get("similar_products", [])
+                    }),
+                    filters={"id": results[i]["id"]},
+                    returning=False
+                )
+                for i in analysed
+            ))
+            logger.info(f"Batch of {len(files)} images: {len(stored)} stored, {len(queries)} product searches")
+        
+        return {
+            "count": len(stored),
+            "items": results
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing batch upload: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing batch upload: {str(e)}")
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(
+    job_id: str,
+    current_user: Dict = Depends(get_current_user)
+):
+    """Get the status of a background job and its result once finished"""
+    job = await job_queue.get(job_id)
+    if not job or (job["payload"] or {}).get("user_id") != current_user["id"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": job["result"],
+        "error": job["error"]
+    }
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    request: Request,
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Stream a job's progress as server-sent events.
+    Each stage (stored, labels, colors, items, products, done/failed) is sent
+    as it completes; reconnecting clients resume from Last-Event-ID.
+    """
+    job = await job_queue.get(job_id)
+    if not job or (job["payload"] or {}).get("user_id") != current_user["id"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    last_event_id = request.headers.get("last-event-id")
+    start = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+    
+    async def event_stream():
+        async for index, event in job_queue.events(job_id, start=start, idle_timeout=SSE_KEEPALIVE_SECONDS):
+            if index is None:
+                if await request.is_disconnected():
+                    return
+                # Comment line so proxies keep the connection open
+                yield ": keepalive\n\n"
+                continue
+            yield f"id: {index}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/history/")
 async def get_user_image_history(
     limit: int = 10,
-    skip: int = 0,
-    current_user: User = Depends(get_current_user),
-    db = Depends(get_database)
+    cursor: Optional[str] = None,
+    current_user: Dict = Depends(get_current_user)
 ):
-    """Get the image upload history for the current user"""
+    """
+    Get the image upload history for the current user, newest first.
+    Pages are keyed on (created_at, id); pass next_cursor to get the next one.
+    """
+    user_id = current_user["id"]
+    params = None
+    if cursor:
+        try:
+            created_at, image_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        params = {
+            "or": f'(created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{image_id}"))'
+        }
+    
     try:
-        # Query database for user's images
-        cursor = db.images.find(
-            {"user_id": str(current_user.id)}
-        ).sort("created_at", -1).skip(skip).limit(limit)
+        # Fetch one extra row to learn whether another page exists
+        images = await postgrest.select(
+            "images",
+            columns=IMAGE_HISTORY_COLUMNS,
+            filters={"user_id": user_id},
+            params=params,
+            order="created_at.desc,id.desc",
+            limit=limit + 1
+        )
         
-        images = await cursor.to_list(length=limit)
+        next_cursor = None
+        if len(images) > limit:
+            images = images[:limit]
+            next_cursor = encode_cursor(images[-1]["created_at"], images[-1]["id"])
         
-        # Convert ObjectId to string for JSON serialization
-        for image in images:
-            image["_id"] = str(image["_id"])
+        count = await get_cached_count(
+            IMAGE_COUNT_KEY.format(user_id=user_id),
+            lambda: postgrest.count("images", filters={"user_id": user_id})
+        )
         
         return {
-            "count": await db.images.count_documents({"user_id": str(current_user.id)}),
-            "images": images
+            "count": count,
+            "images": images,
+            "next_cursor": next_cursor
         }
     
     except Exception as e:
@@ -138,28 +381,40 @@ async def get_user_image_history(
         raise HTTPException(status_code=500, detail=f"Error retrieving image history: {str(e)}")
 
 
+async def _get_own_image(image_id: str, user_id: str, columns: str) -> dict:
+    """The user's image row, or 404 (also for other users' images)"""
+    try:
+        # Ids go into a uuid column; anything else cannot match
+        uuid.UUID(image_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Image not found")
+    image = await postgrest.select(
+        "images",
+        columns=columns,
+        filters={"id": image_id, "user_id": user_id},
+        single=True
+    )
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return image
+
+
 @router.delete("/{image_id}/")
 async def delete_image(
     image_id: str,
-    current_user: User = Depends(get_current_user),
-    db = Depends(get_database)
+    current_user: Dict = Depends(get_current_user)
 ):
     """Delete a user's uploaded image"""
     try:
-        # Find the image
-        image = await db.images.find_one({
-            "id": image_id,
-            "user_id": str(current_user.id)
-        })
-        
-        if not image:
-            raise HTTPException(status_code=404, detail="Image not found")
+        user_id = current_user["id"]
+        image = await _get_own_image(image_id, user_id, "id,file_path")
         
         # Delete from cloud storage
-        cloud_storage.delete_file(image["file_path"])
+        await run_in_threadpool(storage_client.delete_file, image["file_path"])
         
         # Delete from database
-        await db.images.delete_one({"id": image_id})
+        await postgrest.delete("images", filters={"id": image_id, "user_id": user_id})
+        await adjust_cached_count(IMAGE_COUNT_KEY.format(user_id=user_id), -1)
         
         return {"message": "Image deleted successfully"}
     
@@ -173,51 +428,42 @@ async def delete_image(
 @router.get("/{image_id}/analyze")
 async def analyze_existing_image(
     image_id: str,
-    current_user: User = Depends(get_current_user),
-    db = Depends(get_database)
+    current_user: Dict = Depends(get_current_user),
+    profile: Optional[str] = None
 ):
-    """Analyze an existing image with Vision AI"""
+    """Analyze an existing image with Vision AI, optionally with a feature profile"""
+    _check_profile(profile)
     try:
-        # Find the image
-        image = await db.images.find_one({
-            "id": image_id,
-            "user_id": str(current_user.id)
-        })
-        
-        if not image:
-            raise HTTPException(status_code=404, detail="Image not found")
+        image = await _get_own_image(image_id, current_user["id"], "id,file_path")
         
         # Download the image content
-        import requests
-        response = requests.get(image["public_url"])
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail="Failed to download image")
-        
-        file_content = response.content
+        file_content = await run_in_threadpool(storage_client.download_file, image["file_path"])
         
         # Analyze with Vision AI
-        clothing_items = vision_ai.analyze_clothing(file_content)
+        clothing_items = await VisionAI.analyze_clothing(file_content, profile)
         
         # Find similar products if clothing items were detected
         similar_products = []
-        if clothing_items and len(clothing_items) > 0:
+        if clothing_items:
             # Use the primary detected item for product search
-            primary_item = clothing_items[0]
-            query = f"{primary_item['category']} {primary_item['color']} {primary_item['pattern']} {primary_item['style']}"
+            query = build_product_query(clothing_items[0])
             
             # Search for similar products
-            similar_products = await shopping_api.search_products(
-                query=query.strip(),
-                max_results=5
-            )
+            if query:
+                similar_products = await ShoppingAPI.search_products(
+                    query=query,
+                    max_results=5
+                )
         
         # Update database with analysis results
-        await db.images.update_one(
-            {"id": image_id},
-            {"$set": {
+        await postgrest.update(
+            "images",
+            to_primitive({
                 "analysis": clothing_items,
                 "similar_products": similar_products
-            }}
+            }),
+            filters={"id": image_id},
+            returning=False
         )
         
         return {
@@ -240,15 +486,15 @@ async def search_similar_products(
     price_min: Optional[float] = None,
     price_max: Optional[float] = None,
     brands: Optional[List[str]] = None,
-    current_user: User = Depends(get_current_user)
+    current_user: Dict = Depends(get_current_user)
 ):
     """Search for products using the Shopping API"""
     try:
-        products = await shopping_api.search_products(
+        products = await ShoppingAPI.search_products(
             query=query,
             max_results=max_results,
-            price_min=price_min,
-            price_max=price_max,
+            min_price=price_min,
+            max_price=price_max,
             brands=brands
         )
         
@@ -262,11 +508,11 @@ async def search_similar_products(
 @router.get("/product/{product_id}/")
 async def get_product_details(
     product_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: Dict = Depends(get_current_user)
 ):
     """Get detailed information about a specific product"""
     try:
-        product = await shopping_api.get_product_details(product_id)
+        product = await ShoppingAPI.get_product_details(product_id)
         
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
@@ -1,24 +1,35 @@
 from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File
 from .schemas import ProfileUpdate, UserResponse
-from .deps import supabase, get_current_user
+from starlette.concurrency import run_in_threadpool
+from .deps import supabase, get_current_user, revoke_user_tokens
+from ..core.postgrest import postgrest
+from ..core.responses import FastJSONRoute
 from typing import Dict
 import uuid
 
-router = APIRouter(prefix="/profile", tags=["profile"])
+router = APIRouter(prefix="/profile", tags=["profile"], route_class=FastJSONRoute)
+
+# Columns needed to build a UserResponse
+PROFILE_COLUMNS = "id,email,display_name,image_url,created_at,updated_at"
 
 @router.get("/me", response_model=UserResponse)
 async def get_profile(current_user: Dict = Depends(get_current_user)):
     try:
         # Get profile from profiles table
-        profile = supabase.table("profiles").select("*").eq("id", current_user["id"]).single().execute()
+        profile = await postgrest.select(
+            "profiles",
+            columns=PROFILE_COLUMNS,
+            filters={"id": current_user["id"]},
+            single=True
+        )
         
-        if not profile.data:
+        if not profile:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Profile not found"
             )
         
-        return UserResponse(**profile.data)
+        return UserResponse(**profile)
 
     except Exception as e:
         raise HTTPException(
@@ -33,17 +44,20 @@ async def update_profile(
 ):
     try:
         # Update profile in profiles table
-        profile = supabase.table("profiles").update(
-            profile_data.dict(exclude_unset=True)
-        ).eq("id", current_user["id"]).execute()
+        rows = await postgrest.update(
+            "profiles",
+            profile_data.model_dump(mode="json", exclude_unset=True),
+            filters={"id": current_user["id"]},
+            columns=PROFILE_COLUMNS
+        )
 
-        if not profile.data:
+        if not rows:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Profile not found"
             )
 
-        return UserResponse(**profile.data[0])
+        return UserResponse(**rows[0])
 
     except Exception as e:
         raise HTTPException(
@@ -70,7 +84,8 @@ async def upload_profile_image(
 
         # Upload to Supabase Storage
         file_data = await file.read()
-        storage_response = supabase.storage.from_("profile-images").upload(
+        storage_response = await run_in_threadpool(
+            supabase.storage.from_("profile-images").upload,
             filename,
             file_data
         )
@@ -85,9 +100,12 @@ async def upload_profile_image(
         image_url = supabase.storage.from_("profile-images").get_public_url(filename)
 
         # Update profile with new image URL
-        profile = supabase.table("profiles").update({
-            "image_url": image_url
-        }).eq("id", current_user["id"]).execute()
+        await postgrest.update(
+            "profiles",
+            {"image_url": image_url},
+            filters={"id": current_user["id"]},
+            returning=False
+        )
 
         return {"image_url": image_url}
 
@@ -101,10 +119,13 @@ async def upload_profile_image(
 async def delete_account(current_user: Dict = Depends(get_current_user)):
     try:
         # Delete profile from profiles table
-        supabase.table("profiles").delete().eq("id", current_user["id"]).execute()
+        await postgrest.delete("profiles", filters={"id": current_user["id"]})
 
         # Delete user from auth
-        supabase.auth.admin.delete_user(current_user["id"])
+        await run_in_threadpool(supabase.auth.admin.delete_user, current_user["id"])
+
+        # Tokens are verified locally, so they must be revoked explicitly
+        await revoke_user_tokens(current_user["id"])
 
         return {"message": "Account deleted successfully"}
 
@@ -0,0 +1,220 @@
+"""
+Admission control for expensive routes.
+
+Each configured route (a path template such as /upload/) gets a
+ConcurrencyLimiter: at most `limit` requests run at once, and at most
+`per_user_limit` of them for one user, so a single client cannot hold all
+of the Vision and Custom Search capacity. Requests over either limit wait
+in a bounded FIFO queue (a user may also have at most per_user_limit
+requests waiting) and are admitted as slots free up, skipping waiters
+whose user is still at their limit. Requests that find the queue full or
+are not admitted within the deadline are shed with 429 and a Retry-After
+estimated from recent request durations.
+
+Limits apply per worker process.
+"""
+import asyncio
+import logging
+import math
+import time
+import weakref
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from .metrics import ADMISSION_ACTIVE, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTIONS, ADMISSION_WAIT
+from .tracing import route_template
+
+logger = logging.getLogger(__name__)
+
+# Every limiter in this process, for queue_saturation()
+_limiters: "weakref.WeakSet[ConcurrencyLimiter]" = weakref.WeakSet()
+
+class AdmissionRejected(Exception):
+    """A request was shed; retry_after is the suggested wait in seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class ConcurrencyLimiter:
+    """Global and per-key concurrency limit with a bounded, deadline-limited wait queue"""
+
+    # Weight of the latest request in the moving average of durations
+    DURATION_SMOOTHING = 0.2
+
+    def __init__(self, name: str, limit: int, per_key_limit: int, max_queue: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.per_key_limit = per_key_limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self._active_by_key: Dict[str, int] = {}
+        self._waiting_by_key: Dict[str, int] = {}
+        self._waiters: Deque[Tuple[str, asyncio.Future]] = deque()
+        self._avg_duration = 1.0
+        _limiters.add(self)
+
+    @property
+    def queued(self) -> int:
+        """Number of requests waiting for a slot"""
+        return len(self._waiters)
+
+    def _has_slot(self, key: str) -> bool:
+        return self.active < self.limit and self._active_by_key.get(key, 0) < self.per_key_limit
+
+    def _admit(self, key: str):
+        self.active += 1
+        self._active_by_key[key] = self._active_by_key.get(key, 0) + 1
+        ADMISSION_ACTIVE.labels(self.name).set(self.active)
+
+    def _dequeue(self, entry: Tuple[str, asyncio.Future]):
+        self._waiters.remove(entry)
+        key = entry[0]
+        self._waiting_by_key[key] -= 1
+        if not self._waiting_by_key[key]:
+            del self._waiting_by_key[key]
+        ADMISSION_QUEUE_DEPTH.labels(self.name).set(len(self._waiters))
+
+    def retry_after(self) -> int:
+        """Seconds until the queue ahead is likely to have drained"""
+        return max(1, math.ceil(self._avg_duration * (len(self._waiters) + 1) / self.limit))
+
+    def _reject(self, reason: str):
+        ADMISSION_REJECTIONS.labels(self.name, reason).inc()
+        raise AdmissionRejected(reason, self.retry_after())
+
+    async def acquire(self, key: str):
+        """
+        Wait for a slot
+
+        Args:
+            key: Identity the per-key limit applies to, e.g. a user id
+
+        Raises:
+            AdmissionRejected: The queue is full, the key already has
+                per_key_limit requests waiting, or no slot freed up within
+                the timeout
+        """
+        # Waiters are only left queued when their own key is at its limit
+        # or every slot is taken, so a free slot can be taken directly
+        if self._has_slot(key):
+            self._admit(key)
+            ADMISSION_WAIT.labels(self.name).observe(0.0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full")
+        if self._waiting_by_key.get(key, 0) >= self.per_key_limit:
+            self._reject("user_queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (key, future)
+        self._waiters.append(entry)
+        self._waiting_by_key[key] = self._waiting_by_key.get(key, 0) + 1
+        ADMISSION_QUEUE_DEPTH.labels(self.name).set(len(self._waiters))
+
+        started = time.perf_counter()
+        admitted = False
+        try:
+            await asyncio.wait((future,), timeout=self.timeout)
+            admitted = future.done()
+        finally:
+            if not future.done():
+                future.cancel()
+                self._dequeue(entry)
+            elif not admitted:
+                # Cancelled just after a slot was handed over
+                self.release(key)
+        if not admitted:
+            self._reject("timeout")
+        ADMISSION_WAIT.labels(self.name).observe(time.perf_counter() - started)
+
+    def release(self, key: str, duration: Optional[float] = None):
+        """
+        Free a slot and hand it to the first waiter whose key is under its limit
+
+        Args:
+            key: Key the slot was acquired for
+            duration: How long the request ran, for Retry-After estimates
+        """
+        self.active -= 1
+        self._active_by_key[key] -= 1
+        if not self._active_by_key[key]:
+            del self._active_by_key[key]
+        if duration is not None:
+            self._avg_duration += self.DURATION_SMOOTHING * (duration - self._avg_duration)
+
+        while self._waiters and self.active < self.limit:
+            entry = next((entry for entry in self._waiters if self._has_slot(entry[0])), None)
+            if entry is None:
+                break
+            self._dequeue(entry)
+            self._admit(entry[0])
+            entry[1].set_result(None)
+        ADMISSION_ACTIVE.labels(self.name).set(self.active)
+
+def queue_saturation() -> float:
+    """Fill of the fullest admission queue in this process, 0.0 (empty) to 1.0 (shedding)"""
+    return max(
+        (limiter.queued / limiter.max_queue if limiter.max_queue else float(limiter.active >= limiter.limit)
+         for limiter in _limiters),
+        default=0.0
+    )
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying a ConcurrencyLimiter to each configured route
+
+    Args:
+        routes: Path templates of the expensive routes, e.g. /search/
+        identify: Maps an ASGI scope to the key per-user limits apply to
+        limit, per_user_limit, max_queue, timeout: ConcurrencyLimiter settings
+    """
+
+    def __init__(
+        self,
+        app,
+        routes: Iterable[str],
+        identify: Callable[[dict], str],
+        limit: int,
+        per_user_limit: int,
+        max_queue: int,
+        timeout: float
+    ):
+        self.app = app
+        self.identify = identify
+        self.limiters = {
+            route: ConcurrencyLimiter(route, limit, per_user_limit, max_queue, timeout)
+            for route in routes
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limiters:
+            await self.app(scope, receive, send)
+            return
+        limiter = self.limiters.get(route_template(scope["app"], scope))
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = self.identify(scope)
+        try:
+            await limiter.acquire(key)
+        except AdmissionRejected as e:
+            logger.info(f"Shed {scope['method']} {limiter.name} for {key}: {e.reason}")
+            response = JSONResponse(
+                {"detail": "Too many requests, retry later"},
+                status_code=429,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(key, time.perf_counter() - started)
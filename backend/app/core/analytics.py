@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from .config import settings
+from .postgrest import postgrest
+
+logger = logging.getLogger(__name__)
+
+# Queued by stop(): the flush task writes what it holds and exits
+_STOP = object()
+
+class AnalyticsSink:
+    """
+    Buffered bulk writer for the analytics_events table.
+
+    Events are queued in memory and written as multi-row inserts when a
+    batch fills up or the flush interval elapses. The buffer is bounded;
+    when full, events are dropped (oldest or newest) or the caller waits,
+    depending on the overflow policy. Batches that cannot be written are
+    appended to a local JSON-lines spill file, if configured, and replayed
+    after the next successful flush.
+    """
+
+    OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        flush_interval: float = 2.0,
+        max_buffer: int = 10000,
+        overflow_policy: str = "drop_oldest",
+        spill_path: Optional[str] = None,
+        table: str = "analytics_events"
+    ):
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.overflow_policy = overflow_policy
+        self.spill_path = spill_path or None
+        self.table = table
+        self.stats = {"accepted": 0, "dropped": 0, "written": 0, "spilled": 0, "replayed": 0, "failed": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _to_row(event_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Normalize an event so every row in a bulk insert has the same keys"""
+        return {
+            "user_id": event_data.get("user_id"),
+            "event_type": event_data["event_type"],
+            "event_data": event_data.get("event_data") or {},
+            # Stamp at emit time so buffering does not skew timestamps
+            "created_at": event_data.get("created_at") or datetime.utcnow().isoformat(),
+        }
+
+    def start(self):
+        """Start the background flush task on the running loop"""
+        if self._task is None or self._task.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue(maxsize=self.max_buffer)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info("Analytics sink started")
+
+    async def stop(self):
+        """Stop the flush task and write out everything still buffered"""
+        if self._task is not None:
+            # Let the task finish its current insert rather than cancelling it
+            # mid-batch; it exits once it reaches the stop marker
+            if not self._task.done():
+                await self._queue.put(_STOP)
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.error(f"Analytics flush task failed: {str(e)}")
+            self._task = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                row = self._queue.get_nowait()
+                if row is not _STOP:
+                    self._pending.append(row)
+        while self._pending:
+            await self._flush_pending()
+        logger.info(f"Analytics sink stopped: {self.stats}")
+
+    async def emit(self, event_data: Dict[str, Any]) -> bool:
+        """
+        Queue an event for writing
+
+        Returns:
+            True if the event was buffered, False if it was dropped
+        """
+        self.start()
+        row = self._to_row(event_data)
+        if self.overflow_policy == "block":
+            await self._queue.put(row)
+        else:
+            if self._queue.full():
+                self.stats["dropped"] += 1
+                if self.overflow_policy == "drop_newest":
+                    return False
+                self._queue.get_nowait()
+            self._queue.put_nowait(row)
+        self.stats["accepted"] += 1
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            row = await self._queue.get()
+            if row is _STOP:
+                return
+            self._pending.append(row)
+            deadline = loop.time() + self.flush_interval
+            while len(self._pending) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is _STOP:
+                    # stop() writes out the rest
+                    return
+                self._pending.append(row)
+            await self._flush_pending()
+
+    async def _flush_pending(self):
+        """Write up to one batch of pending events, spilling it on failure"""
+        batch = self._pending[:self.batch_size]
+        self._pending = self._pending[self.batch_size:]
+        if not batch:
+            return
+        try:
+            await postgrest.insert(self.table, batch, returning=False)
+            self.stats["written"] += len(batch)
+        except asyncio.CancelledError:
+            # Keep the batch for stop() (or the next flush) to write
+            self._pending[:0] = batch
+            raise
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} analytics events: {str(e)}")
+            await self._spill(batch)
+            return
+        if self.spill_path:
+            await self._replay_spill()
+
+    async def _spill(self, batch: List[Dict[str, Any]]):
+        if not self.spill_path:
+            self.stats["failed"] += len(batch)
+            return
+        try:
+            await asyncio.to_thread(self._append_lines, self.spill_path, batch)
+            self.stats["spilled"] += len(batch)
+        except OSError as e:
+            logger.error(f"Failed to spill analytics events to {self.spill_path}: {str(e)}")
+            self.stats["failed"] += len(batch)
+
+    @staticmethod
+    def _append_lines(path: str, rows: List[Dict[str, Any]]):
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+
+    @staticmethod
+    def _take_lines(path: str) -> List[Dict[str, Any]]:
+        """Atomically claim the spill file and return its rows"""
+        if not os.path.exists(path):
+            return []
+        claimed = f"{path}.replay"
+        os.replace(path, claimed)
+        with open(claimed, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        os.remove(claimed)
+        return rows
+
+    async def _replay_spill(self):
+        """Re-insert spilled events now that the database is reachable again"""
+        try:
+            rows = await asyncio.to_thread(self._take_lines, self.spill_path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read analytics spill file {self.spill_path}: {str(e)}")
+            return
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            try:
+                await postgrest.insert(self.table, batch, returning=False)
+                self.stats["written"] += len(batch)
+                self.stats["replayed"] += len(batch)
+            except asyncio.CancelledError:
+                # Rows claimed from the spill file go back to it
+                self._append_lines(self.spill_path, rows[start:])
+                raise
+            except Exception as e:
+                logger.error(f"Failed to replay spilled analytics events: {str(e)}")
+                await asyncio.to_thread(self._append_lines, self.spill_path, rows[start:])
+                return
+        if rows:
+            logger.info(f"Replayed {len(rows)} spilled analytics events")
+
+# Analytics sink instance
+analytics_sink = AnalyticsSink(
+    batch_size=settings.ANALYTICS_BATCH_SIZE,
+    flush_interval=settings.ANALYTICS_FLUSH_INTERVAL,
+    max_buffer=settings.ANALYTICS_MAX_BUFFER,
+    overflow_policy=settings.ANALYTICS_OVERFLOW_POLICY,
+    spill_path=settings.ANALYTICS_SPILL_PATH
+)
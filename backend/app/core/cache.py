@@ -1,8 +1,13 @@
 import redis.asyncio as redis
 import json
 import logging
+import time
+from collections import OrderedDict
 from typing import Any, Optional, Union
 from .config import settings
+from .encoding import dumps
+from .memory_cache import InMemoryRedis
+from .metrics import InstrumentedClient, record_cache
 
 logger = logging.getLogger(__name__)
 
@@ -13,16 +18,22 @@ class RedisCache:
     
     @classmethod
     async def connect(cls):
-        """Connect to Redis cache"""
+        """Connect to Redis cache, or create the in-process backend when configured"""
+        if settings.CACHE_BACKEND == "memory":
+            logger.info("Using in-memory cache backend")
+            cls._redis = InstrumentedClient(InMemoryRedis(), "redis")
+            return cls._redis
         try:
             logger.info(f"Connecting to Redis: {settings.REDIS_HOST}:{settings.REDIS_PORT}")
             password = settings.REDIS_PASSWORD if settings.REDIS_PASSWORD else None
-            cls._redis = await redis.Redis(
+            client = await redis.Redis(
                 host=settings.REDIS_HOST,
                 port=settings.REDIS_PORT,
                 password=password,
                 decode_responses=True
             )
+            # Every command is timed as upstream "redis" (see core/metrics.py)
+            cls._redis = InstrumentedClient(client, "redis")
             # Test connection
             await cls._redis.ping()
             logger.info("Successfully connected to Redis")
@@ -36,8 +47,14 @@ class RedisCache:
         """Disconnect from Redis cache"""
         if cls._redis:
             await cls._redis.close()
+            cls._redis = None
             logger.info("Disconnected from Redis")
     
+    @classmethod
+    def set_backend(cls, client) -> None:
+        """Install a pre-built client (e.g. an InMemoryRedis) in place of the Redis connection"""
+        cls._redis = client
+    
     @classmethod
     async def get_redis(cls):
         """Get Redis instance"""
@@ -50,6 +67,8 @@ class RedisCache:
         """Get value from cache"""
         redis_client = await cls.get_redis()
         data = await redis_client.get(key)
+        # Hit ratios are tracked per key prefix, e.g. shopping_search
+        record_cache(key.split(":", 1)[0], data is not None)
         if data:
             try:
                 return json.loads(data)
@@ -62,7 +81,7 @@ class RedisCache:
         """Set value in cache with expiration time (default: 1 hour)"""
         redis_client = await cls.get_redis()
         if isinstance(value, (dict, list)):
-            value = json.dumps(value)
+            value = dumps(value)
         return await redis_client.set(key, value, ex=expire)
     
     @classmethod
@@ -89,11 +108,59 @@ class RedisCache:
         redis_client = await cls.get_redis()
         return await redis_client.hset(name, key, value)
     
+    @classmethod
+    async def get_all_hash(cls, name: str) -> dict:
+        """Get all fields and values of a hash"""
+        redis_client = await cls.get_redis()
+        return await redis_client.hgetall(name)
+    
+    @classmethod
+    async def expire(cls, key: str, seconds: int) -> bool:
+        """Set a key's time to live in seconds"""
+        redis_client = await cls.get_redis()
+        return await redis_client.expire(key, seconds)
+    
     @classmethod
     async def increment(cls, key: str, amount: int = 1) -> int:
         """Increment value in cache"""
         redis_client = await cls.get_redis()
         return await redis_client.incrby(key, amount)
 
+class LocalCache:
+    """Bounded in-process TTL cache for small, hot values (LRU eviction)"""
+    
+    def __init__(self, ttl: float, max_size: int = 10000, name: str = "local"):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.name = name
+        self._data: OrderedDict = OrderedDict()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Get value if present and not expired"""
+        entry = self._data.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._data[key]
+            entry = None
+        record_cache(self.name, entry is not None)
+        if entry is None:
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Set value, evicting the least recently used entry when full"""
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+    
+    def delete(self, key: str) -> None:
+        """Remove value if present"""
+        self._data.pop(key, None)
+    
+    def clear(self) -> None:
+        """Remove all values"""
+        self._data.clear()
+
 # Redis cache instance
 cache = RedisCache() 
\ No newline at end of file
@@ -24,16 +24,38 @@ class Settings(BaseModel):
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    # How long a worker trusts its cached revocation state for a user (seconds)
+    AUTH_USER_CACHE_TTL: int = int(os.getenv("AUTH_USER_CACHE_TTL", "30"))
     
     # Supabase
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
     SUPABASE_SERVICE_KEY: str = os.getenv("SUPABASE_SERVICE_KEY", "")
     SUPABASE_ANON_KEY: str = os.getenv("SUPABASE_ANON_KEY", "")
+    DB_TIMEOUT_SECONDS: float = float(os.getenv("DB_TIMEOUT_SECONDS", "5"))
+    DB_MAX_CONNECTIONS: int = int(os.getenv("DB_MAX_CONNECTIONS", "20"))
+    
+    # Analytics event buffering (see core/analytics.py)
+    ANALYTICS_BATCH_SIZE: int = int(os.getenv("ANALYTICS_BATCH_SIZE", "100"))
+    ANALYTICS_FLUSH_INTERVAL: float = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "2.0"))
+    ANALYTICS_MAX_BUFFER: int = int(os.getenv("ANALYTICS_MAX_BUFFER", "10000"))
+    ANALYTICS_OVERFLOW_POLICY: str = os.getenv("ANALYTICS_OVERFLOW_POLICY", "drop_oldest")
+    ANALYTICS_SPILL_PATH: str = os.getenv("ANALYTICS_SPILL_PATH", "")
     
     # Redis
     REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
     REDIS_PASSWORD: Optional[str] = os.getenv("REDIS_PASSWORD")
+    # "redis" for a real server, "memory" for the in-process backend (local/CI runs)
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "redis")
+    
+    # Background jobs (see core/jobs.py and worker.py)
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_RETRY_BACKOFF: float = float(os.getenv("JOB_RETRY_BACKOFF", "5"))  # seconds, doubled per attempt
+    JOB_RESULT_TTL: int = int(os.getenv("JOB_RESULT_TTL", "86400"))
+    # A running job whose worker stops renewing its lease for this long is re-queued (seconds)
+    JOB_VISIBILITY_TIMEOUT: float = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "60"))
+    WORKER_PROCESSES: int = int(os.getenv("WORKER_PROCESSES", "2"))
+    WORKER_CONCURRENCY: int = int(os.getenv("WORKER_CONCURRENCY", "4"))
     
     # Google Cloud
     GCP_PROJECT_ID: str = os.getenv("GCP_PROJECT_ID", "")
@@ -41,12 +63,69 @@ class Settings(BaseModel):
     GOOGLE_APPLICATION_CREDENTIALS: str = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "")
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
     GOOGLE_SEARCH_ENGINE_ID: str = os.getenv("GOOGLE_SEARCH_ENGINE_ID", "")
+    # Service clients built concurrently at startup, comma separated
+    # (vision, storage, customsearch, supabase); others are built on first use
+    SERVICES_PRELOAD: str = os.getenv("SERVICES_PRELOAD", "")
+    
+    # Diagnostics (see core/diagnostics.py); /debug endpoints need DIAGNOSTICS_TOKEN
+    DIAGNOSTICS_ENABLED: bool = os.getenv("DIAGNOSTICS_ENABLED", "false").lower() == "true"
+    DIAGNOSTICS_TOKEN: str = os.getenv("DIAGNOSTICS_TOKEN", "")
+    BLOCKING_THRESHOLD_MS: float = float(os.getenv("BLOCKING_THRESHOLD_MS", "100"))
+    PROFILE_MAX_SECONDS: float = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+    
+    # Tracing (see core/tracing.py): none, console, file or otlp
+    TRACE_EXPORTER: str = os.getenv("TRACE_EXPORTER", "none")
+    TRACE_SAMPLE_RATIO: float = float(os.getenv("TRACE_SAMPLE_RATIO", "1.0"))
+    TRACE_FILE_PATH: str = os.getenv("TRACE_FILE_PATH", "traces.jsonl")
+    TRACE_OTLP_ENDPOINT: str = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+    
+    # Responses (see core/responses.py): bodies of at least this many bytes are
+    # compressed (Brotli if installed, else gzip); 0 disables compression
+    RESPONSE_COMPRESSION_MIN_BYTES: int = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+    
+    # Admission control (see core/admission.py), per worker process: requests to
+    # these route templates (full paths including the router prefix, comma
+    # separated; empty disables) run at most ADMISSION_CONCURRENCY at a time and
+    # ADMISSION_USER_CONCURRENCY per user; the rest wait up to
+    # ADMISSION_QUEUE_TIMEOUT seconds in a queue of ADMISSION_QUEUE_SIZE, then
+    # get 429 with Retry-After. The defaults are the authenticated routes that
+    # wait on Vision, Cloud Storage, Custom Search or Supabase storage for most
+    # of the request; anonymous routes are left out, as behind a proxy every
+    # anonymous client shares one key (see api/deps.py admission_key)
+    ADMISSION_ROUTES: str = os.getenv(
+        "ADMISSION_ROUTES",
+        "/images/upload/,/images/upload/batch/,/images/{image_id}/analyze,/images/search/,/profile/me/image"
+    )
+    ADMISSION_CONCURRENCY: int = int(os.getenv("ADMISSION_CONCURRENCY", "32"))
+    ADMISSION_USER_CONCURRENCY: int = int(os.getenv("ADMISSION_USER_CONCURRENCY", "4"))
+    ADMISSION_QUEUE_SIZE: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2.0"))
+    
+    # Health probes (see core/health.py): each readiness check times out after
+    # HEALTH_CHECK_TIMEOUT seconds and results are reused for HEALTH_CACHE_TTL;
+    # a worker is not ready while its event loop lags more than
+    # READY_MAX_LOOP_LAG_MS or an admission queue is fuller than
+    # READY_MAX_QUEUE_SATURATION (a fraction of ADMISSION_QUEUE_SIZE)
+    HEALTH_CHECK_TIMEOUT: float = float(os.getenv("HEALTH_CHECK_TIMEOUT", "1.0"))
+    HEALTH_CACHE_TTL: float = float(os.getenv("HEALTH_CACHE_TTL", "2.0"))
+    READY_MAX_LOOP_LAG_MS: float = float(os.getenv("READY_MAX_LOOP_LAG_MS", "250"))
+    READY_MAX_QUEUE_SATURATION: float = float(os.getenv("READY_MAX_QUEUE_SATURATION", "0.5"))
     
     # Image Processing
     MAX_IMAGE_SIZE: int = int(os.getenv("MAX_IMAGE_SIZE", "10485760"))  # 10MB in bytes
     MIN_IMAGE_DIMENSION: int = int(os.getenv("MIN_IMAGE_DIMENSION", "800"))
     MAX_IMAGE_DIMENSION: int = int(os.getenv("MAX_IMAGE_DIMENSION", "4000"))
     ALLOWED_IMAGE_FORMATS: List[str] = ["jpeg", "jpg", "png", "webp"]
+    MAX_BATCH_UPLOAD_FILES: int = int(os.getenv("MAX_BATCH_UPLOAD_FILES", "100"))
+    UPLOAD_CONCURRENCY: int = int(os.getenv("UPLOAD_CONCURRENCY", "8"))  # parallel GCS uploads per batch
+    # "local" extracts dominant colors with NumPy, "vision" pays for IMAGE_PROPERTIES
+    COLOR_EXTRACTION: str = os.getenv("COLOR_EXTRACTION", "local")
+    # Default Vision feature profile: fast, standard, full or adaptive
+    VISION_PROFILE: str = os.getenv("VISION_PROFILE", "full")
 
 # Create settings instance
-settings = Settings() 
\ No newline at end of file
+settings = Settings()
+
+def get_settings() -> Settings:
+    """The settings instance (for modules that import it by function)"""
+    return settings 
\ No newline at end of file
@@ -1,30 +1,52 @@
-from supabase import create_client, Client
+from typing import TYPE_CHECKING
+from starlette.concurrency import run_in_threadpool
 from .config import settings
+from .postgrest import postgrest
+from .services import services
+from .analytics import analytics_sink
+from .pagination import encode_cursor, decode_cursor, get_cached_count, adjust_cached_count
 
-# Initialize Supabase client
-supabase: Client = create_client(
-    settings.SUPABASE_URL,
-    settings.SUPABASE_SERVICE_KEY
-)
+if TYPE_CHECKING:
+    from supabase import Client
+
+def _build_supabase() -> "Client":
+    # Imported here: the supabase package is a quarter of the app's import time
+    from supabase import create_client
+    return create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+
+# Supabase client (auth admin and storage APIs only; table access goes
+# through the async PostgREST client), shared by the process and
+# constructed on first use (see core/services.py)
+services.register("supabase", _build_supabase)
+supabase: "Client" = services.lazy("supabase")
 
 # Export the client for use in other modules
 db = supabase
 
+# Column projections for list queries, so rows carry only what callers use
+FAVORITE_COLUMNS = "id,user_id,item_data,created_at"
+SEARCH_HISTORY_COLUMNS = "id,query,image_url,detected_items,created_at"
+
+SEARCH_HISTORY_COUNT_KEY = "search_history_count:{user_id}"
+
 # Helper functions for common database operations
 async def get_user_by_id(user_id: str):
     """Get user by ID from Supabase auth.users table"""
     try:
-        response = db.auth.admin.get_user_by_id(user_id)
+        response = await run_in_threadpool(db.auth.admin.get_user_by_id, user_id)
         return response.user if response else None
     except Exception as e:
         print(f"Error getting user by ID: {e}")
         return None
 
-async def get_user_favorites(user_id: str):
+async def get_user_favorites(user_id: str, columns: str = FAVORITE_COLUMNS):
     """Get user's favorite items"""
     try:
-        response = db.table('favorites').select('*').eq('user_id', user_id).execute()
-        return response.data if response else []
+        return await postgrest.select(
+            'favorites',
+            columns=columns,
+            filters={'user_id': user_id}
+        )
     except Exception as e:
         print(f"Error getting user favorites: {e}")
         return []
@@ -32,11 +54,11 @@ async def get_user_favorites(user_id: str):
 async def add_to_favorites(user_id: str, item_data: dict):
     """Add an item to user's favorites"""
     try:
-        response = db.table('favorites').insert({
+        rows = await postgrest.insert('favorites', {
             'user_id': user_id,
             **item_data
-        }).execute()
-        return response.data[0] if response.data else None
+        })
+        return rows[0] if rows else None
     except Exception as e:
         print(f"Error adding to favorites: {e}")
         return None
@@ -44,10 +66,10 @@ async def add_to_favorites(user_id: str, item_data: dict):
 async def remove_from_favorites(user_id: str, item_id: str):
     """Remove an item from user's favorites"""
     try:
-        response = db.table('favorites').delete().match({
+        await postgrest.delete('favorites', filters={
             'user_id': user_id,
             'id': item_id
-        }).execute()
+        })
         return True
     except Exception as e:
         print(f"Error removing from favorites: {e}")
@@ -56,34 +78,82 @@ async def remove_from_favorites(user_id: str, item_id: str):
 async def add_search_history(user_id: str, search_data: dict):
     """Add a search query to user's history"""
     try:
-        response = db.table('search_history').insert({
+        rows = await postgrest.insert('search_history', {
             'user_id': user_id,
             **search_data
-        }).execute()
-        return response.data[0] if response.data else None
+        })
+        await adjust_cached_count(SEARCH_HISTORY_COUNT_KEY.format(user_id=user_id), 1)
+        return rows[0] if rows else None
     except Exception as e:
         print(f"Error adding search history: {e}")
         return None
 
-async def get_search_history(user_id: str, limit: int = 10):
-    """Get user's recent search history"""
+async def get_search_history_count(user_id: str) -> int:
+    """Get the number of searches in user's history (cached, updated on insert)"""
+    return await get_cached_count(
+        SEARCH_HISTORY_COUNT_KEY.format(user_id=user_id),
+        lambda: postgrest.count('search_history', filters={'user_id': user_id})
+    )
+
+async def get_search_history(
+    user_id: str,
+    limit: int = 10,
+    cursor: str = None,
+    columns: str = SEARCH_HISTORY_COLUMNS
+):
+    """
+    Get a page of user's search history, newest first
+
+    Uses keyset pagination on (created_at, id): pass the returned
+    next_cursor to fetch the following page.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    params = None
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        params = {
+            'or': f'(created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{item_id}"))'
+        }
+    if 'created_at' not in columns.split(',') or 'id' not in columns.split(','):
+        columns = f'{columns},id,created_at'
+
     try:
-        response = db.table('search_history')\
-            .select('*')\
-            .eq('user_id', user_id)\
-            .order('created_at', desc=True)\
-            .limit(limit)\
-            .execute()
-        return response.data if response else []
+        # Fetch one extra row to learn whether another page exists
+        rows = await postgrest.select(
+            'search_history',
+            columns=columns,
+            filters={'user_id': user_id},
+            params=params,
+            order='created_at.desc,id.desc',
+            limit=limit + 1
+        )
     except Exception as e:
         print(f"Error getting search history: {e}")
-        return []
+        rows = []
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+
+    try:
+        count = await get_search_history_count(user_id)
+    except Exception as e:
+        print(f"Error counting search history: {e}")
+        count = None
+
+    return {
+        'items': rows,
+        'next_cursor': next_cursor,
+        'count': count
+    }
 
 async def log_analytics_event(event_data: dict):
-    """Log an analytics event"""
+    """Log an analytics event (buffered and written in batches by the analytics sink)"""
     try:
-        response = db.table('analytics_events').insert(event_data).execute()
-        return response.data[0] if response.data else None
+        return await analytics_sink.emit(event_data)
     except Exception as e:
         print(f"Error logging analytics event: {e}")
-        return None 
\ No newline at end of file
+        return False
@@ -0,0 +1,208 @@
+"""
+Event-loop diagnostics.
+
+BlockingDetector finds code that blocks the event loop (sync HTTP calls,
+sync Supabase/GCS clients, CPU-heavy work) without asyncio debug mode: a
+task on the loop bumps a heartbeat, and a watchdog thread that sees the
+heartbeat go stale samples the loop thread's stack until it resumes. Each
+stall is recorded with its duration and the stacks seen during it, so the
+blocking call is attributed to an exact function and line.
+
+SamplingProfiler samples thread stacks for a time window and returns them
+in the collapsed ("folded") format read by flamegraph.pl, speedscope and
+inferno, as py-spy record --format raw does.
+
+Both only read sys._current_frames() from a background thread; when the
+loop is healthy the cost is two wakeups per check interval.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Stack frames kept per sample, innermost first
+MAX_STACK_DEPTH = 64
+
+# Leaf frames of threads that are waiting for work: the loop polling for
+# I/O and idle threadpool workers. Skipped unless idle samples are asked for
+IDLE_FRAMES = {("select", "selectors.py"), ("poll", "selectors.py"), ("wait", "threading.py")}
+
+def _idle(frame) -> bool:
+    return (frame.f_code.co_name, frame.f_code.co_filename.rsplit("/", 1)[-1]) in IDLE_FRAMES
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{frame.f_lineno})"
+
+def folded_stack(frame) -> str:
+    """A thread's stack as one collapsed-stack line, outermost frame first"""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+def _culprit(frame) -> str:
+    """The innermost frame in application code, where the blocking call was made"""
+    innermost = frame
+    while frame is not None:
+        if "/app/" in frame.f_code.co_filename.replace("\\", "/"):
+            return _frame_label(frame)
+        frame = frame.f_back
+    return _frame_label(innermost) if innermost is not None else "<unknown>"
+
+class BlockingDetector:
+    """Records stalls of the event loop longer than a threshold, with the stacks that caused them"""
+
+    def __init__(self, threshold: float = 0.1, history: int = 100):
+        self.threshold = threshold
+        self.events = deque(maxlen=history)
+        # Total blocked seconds per culprit function since start
+        self.hotspots: Counter = Counter()
+        self._heartbeat = 0.0
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def interval(self) -> float:
+        return self.threshold / 2
+
+    def start(self):
+        """Start watching the running loop"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._watchdog.join(timeout=self.interval * 2)
+        self._watchdog = None
+
+    async def _beat(self):
+        while True:
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self):
+        stall = None
+        while not self._stopped.wait(self.interval / 2):
+            # A beat is due every interval; allow one more before calling it a stall
+            stalled_for = time.monotonic() - self._heartbeat - self.interval
+            if stalled_for >= self.threshold:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                if stall is None:
+                    stall = {"detected_at": time.time(), "culprit": _culprit(frame), "samples": Counter()}
+                stall["samples"][folded_stack(frame)] += 1
+                stall["duration"] = stalled_for
+                del frame
+            elif stall is not None:
+                self._record(stall)
+                stall = None
+
+    def _record(self, stall: Dict):
+        stack, _ = stall["samples"].most_common(1)[0]
+        event = {
+            "detected_at": stall["detected_at"],
+            "duration_ms": round(stall["duration"] * 1000, 1),
+            "culprit": stall["culprit"],
+            "stack": stack.split(";"),
+            "samples": dict(stall["samples"]),
+        }
+        self.events.append(event)
+        self.hotspots[stall["culprit"]] += stall["duration"]
+        logger.warning(f"Event loop blocked for at least {event['duration_ms']}ms in {event['culprit']}")
+
+    def report(self) -> Dict:
+        """Recent stalls, newest first, and blocked time per culprit"""
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "running": self._task is not None,
+            "hotspots": [
+                {"culprit": culprit, "blocked_ms": round(seconds * 1000, 1)}
+                for culprit, seconds in self.hotspots.most_common()
+            ],
+            "events": list(reversed(self.events)),
+        }
+
+class SamplingProfiler:
+    """On-demand wall-clock sampling profiler with collapsed-stack output"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, seconds: float, interval: float = 0.005, thread_id: Optional[int] = None,
+                idle: bool = False) -> str:
+        """
+        Sample stacks for a time window (blocking; run in a worker thread)
+
+        Args:
+            seconds: Length of the window
+            interval: Time between samples
+            thread_id: Only sample this thread (e.g. the event loop); all other threads when None
+            idle: Also keep samples of threads waiting for work
+
+        Returns:
+            Collapsed stacks, one "frame;frame;... count" line per distinct stack
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            own = threading.get_ident()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            samples: Counter = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own or (thread_id is not None and ident != thread_id):
+                        continue
+                    if not idle and _idle(frame):
+                        continue
+                    samples[f"{names.get(ident, ident)};{folded_stack(frame)}"] += 1
+                time.sleep(interval)
+            return "\n".join(f"{stack} {count}" for stack, count in samples.most_common())
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def top(collapsed: str, limit: int = 20) -> List[Dict]:
+        """Functions with the most samples at the top of the stack ("self" time)"""
+        leaves: Counter = Counter()
+        for line in collapsed.splitlines():
+            stack, _, count = line.rpartition(" ")
+            leaves[stack.rsplit(";", 1)[-1]] += int(count)
+        total = sum(leaves.values()) or 1
+        return [
+            {"function": function, "samples": count, "share": round(count / total, 4)}
+            for function, count in leaves.most_common(limit)
+        ]
+
+# Diagnostics instances
+blocking_detector = BlockingDetector(threshold=settings.BLOCKING_THRESHOLD_MS / 1000)
+profiler = SamplingProfiler()
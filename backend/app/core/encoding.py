@@ -0,0 +1,51 @@
+"""
+Encoding of result objects for the cache, job records and API responses.
+
+Result types (see services/results.py) are slotted dataclasses whose field
+names match the JSON keys they are served under. They are converted to
+plain data only when they leave the process: dumps() for Redis values,
+to_primitive() for API responses and database documents.
+"""
+from typing import Any, Dict
+
+import orjson
+
+class Result:
+    """Base class of the slotted result types"""
+
+    __slots__ = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Fields as a dict; nested results are converted as well"""
+        return {name: to_primitive(getattr(self, name)) for name in self.__slots__}
+
+def to_primitive(value: Any) -> Any:
+    """
+    Convert results, and dicts and lists containing them, to plain data
+
+    Args:
+        value: Any value; anything that is not a result, dict, list or
+            tuple is returned unchanged
+
+    Returns:
+        The value with every result replaced by its to_dict()
+    """
+    if isinstance(value, Result):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {key: to_primitive(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_primitive(item) for item in value]
+    return value
+
+def json_default(value: Any) -> Any:
+    """
+    default= hook for orjson.dumps: types it does not encode natively become
+    strings (results are dataclasses, which orjson encodes field by field
+    without converting the whole document first)
+    """
+    return str(value)
+
+def dumps(value: Any) -> str:
+    """JSON-encode a value that may contain results"""
+    return orjson.dumps(value, default=json_default, option=orjson.OPT_NON_STR_KEYS).decode()
@@ -0,0 +1,144 @@
+"""
+Liveness and readiness probes.
+
+Liveness (/health, /health/live) only shows that the process is serving
+requests. It never looks at dependencies, so an outage of Redis or
+Supabase does not get every worker restarted at once.
+
+Readiness (/health/ready) runs every registered dependency check
+concurrently, each bounded by HEALTH_CHECK_TIMEOUT, and caches the outcome
+for HEALTH_CACHE_TTL seconds. Frequent probes from several load balancers
+therefore cost one round of checks, and probes arriving while a round is
+running wait for it rather than starting another. A worker also reports
+not ready while its own event loop lags more than READY_MAX_LOOP_LAG_MS or
+its admission queues (see core/admission.py) are more than
+READY_MAX_QUEUE_SATURATION full, so an overloaded worker is drained
+instead of being sent more requests that would only wait in line.
+
+Redis, Supabase and the job queue are checked here; service modules
+register checks for the clients they own (see services/storage.py).
+Vision and Custom Search have no unbilled request to probe with, so they
+are not checked: their failures show in the upstream metrics (see
+core/metrics.py) rather than as a readiness check that cannot fail. The
+job queue is shared by every worker, so its depth is reported but does
+not fail readiness: a backlog would otherwise take the whole fleet out of
+rotation at once.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .admission import queue_saturation
+from .cache import cache
+from .config import settings
+from .jobs import job_queue
+from .metrics import loop_lag_monitor
+from .postgrest import postgrest
+
+logger = logging.getLogger(__name__)
+
+class HealthChecker:
+    """Registry of dependency checks and the cached readiness state of this worker"""
+
+    _checks: Dict[str, Callable[[], Awaitable[Any]]] = {}
+    _results: Optional[Dict[str, Dict[str, Any]]] = None
+    _checked_at: float = 0.0
+    _running: Optional[asyncio.Task] = None
+
+    @classmethod
+    def register(cls, name: str, check: Callable[[], Awaitable[Any]]):
+        """
+        Register a dependency check
+
+        Args:
+            name: Name the check is reported under, e.g. "redis"
+            check: Coroutine function raising when the dependency is
+                unusable; a non-None return value is reported as detail
+        """
+        cls._checks[name] = check
+
+    @classmethod
+    async def _run_check(cls, name: str, check: Callable[[], Awaitable[Any]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(check(), timeout=settings.HEALTH_CHECK_TIMEOUT)
+            result = {"ok": True}
+            if detail is not None:
+                result["detail"] = detail
+        except asyncio.TimeoutError:
+            result = {"ok": False, "error": f"timed out after {settings.HEALTH_CHECK_TIMEOUT}s"}
+        except Exception as e:
+            result = {"ok": False, "error": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if not result["ok"]:
+            logger.warning(f"Health check {name} failed: {result['error']}")
+        return result
+
+    @classmethod
+    async def _check_all(cls) -> Dict[str, Dict[str, Any]]:
+        try:
+            names = list(cls._checks)
+            results = await asyncio.gather(*(cls._run_check(name, cls._checks[name]) for name in names))
+            cls._results = dict(zip(names, results))
+            cls._checked_at = time.monotonic()
+            return cls._results
+        finally:
+            cls._running = None
+
+    @classmethod
+    async def check_dependencies(cls) -> Dict[str, Dict[str, Any]]:
+        """
+        Results of every registered check, at most HEALTH_CACHE_TTL seconds old
+
+        Returns:
+            Check name -> {"ok", "latency_ms", and "detail" or "error"}
+        """
+        if cls._results is not None and time.monotonic() - cls._checked_at < settings.HEALTH_CACHE_TTL:
+            return cls._results
+        if cls._running is None:
+            cls._running = asyncio.get_running_loop().create_task(cls._check_all())
+        # A probe that disconnects must not cancel the round other probes wait on
+        return await asyncio.shield(cls._running)
+
+    @staticmethod
+    def load() -> Dict[str, Any]:
+        """Event-loop lag and admission queue fill of this worker, against the readiness limits"""
+        lag_ms = loop_lag_monitor.lag * 1000
+        saturation = queue_saturation()
+        return {
+            "ok": lag_ms <= settings.READY_MAX_LOOP_LAG_MS and saturation <= settings.READY_MAX_QUEUE_SATURATION,
+            "loop_lag_ms": round(lag_ms, 1),
+            "queue_saturation": round(saturation, 2),
+        }
+
+    @classmethod
+    async def readiness(cls) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Whether this worker should receive traffic
+
+        Returns:
+            (ready, report), the report listing every check and the load
+        """
+        checks = await cls.check_dependencies()
+        load = cls.load()
+        ready = load["ok"] and all(result["ok"] for result in checks.values())
+        return ready, {"status": "ready" if ready else "not_ready", "checks": checks, "load": load}
+
+async def _check_redis():
+    redis_client = await cache.get_redis()
+    await redis_client.ping()
+
+async def _check_supabase():
+    # A one-row select exercises the connection pool, auth and the database
+    await postgrest.select("profiles", columns="id", limit=1)
+
+async def _check_job_queue():
+    return {"depth": await job_queue.queue_depth()}
+
+HealthChecker.register("redis", _check_redis)
+HealthChecker.register("supabase", _check_supabase)
+HealthChecker.register("job_queue", _check_job_queue)
+
+# Health checker instance
+health = HealthChecker()
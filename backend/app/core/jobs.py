@@ -0,0 +1,311 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+from opentelemetry.trace import SpanKind
+from redis.exceptions import WatchError
+from .cache import cache
+from .config import settings
+from .encoding import dumps
+from .tracing import extract, inject, span
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """
+    Redis-backed work queue for background jobs.
+
+    Each job is a hash at job:{id} holding its type, payload, status,
+    attempt count and result. Ready job ids sit in a list; jobs waiting to
+    be retried sit in a sorted set scored by the time they become ready.
+    Enqueueing is idempotent and atomic: a job id that already exists is
+    not queued again, so callers can derive ids from the work they
+    describe.
+
+    A worker takes a job by moving its id from the ready list to a
+    processing list (BRPOPLPUSH) and holds a lease on it, renewed while
+    the handler runs. Jobs whose lease lapses because their worker died
+    are put back on the ready list by a periodic sweep, so delivery is at
+    least once and handlers must be idempotent. A job lost on its last
+    attempt is marked failed.
+
+    Handlers are called as handler(payload, report) and may await
+    report(event, data) to publish progress; events are appended to a
+    per-job list that clients can follow (see events()).
+
+    A job records the trace context it was queued under; the handler runs
+    in a consumer span continuing that trace.
+    """
+
+    JOB_KEY = "job:{job_id}"
+    EVENTS_KEY = "job:{job_id}:events"
+    QUEUE_KEY = "jobs:queue"
+    DELAYED_KEY = "jobs:delayed"
+    PROCESSING_KEY = "jobs:processing"
+    LEASES_KEY = "jobs:leases"
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    # Events after which no more progress is published for a job
+    TERMINAL_EVENTS = ("done", "failed")
+
+    _handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+    _next_reclaim: float = 0.0
+
+    @classmethod
+    def handler(cls, job_type: str):
+        """Register a coroutine function as the handler for a job type"""
+        def register(func):
+            cls._handlers[job_type] = func
+            return func
+        return register
+
+    @classmethod
+    async def enqueue(cls, job_type: str, payload: Dict[str, Any], job_id: str) -> bool:
+        """
+        Queue a job unless one with the same id already exists
+
+        Returns:
+            True if the job was queued, False if it already existed
+        """
+        redis_client = await cache.get_redis()
+        key = cls.JOB_KEY.format(job_id=job_id)
+        # Created, given its TTL and queued in one transaction, so a crash
+        # cannot leave a job that exists but is never run
+        async with redis_client.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                if await pipe.exists(key):
+                    return False
+                pipe.multi()
+                pipe.hset(key, mapping={
+                    "status": cls.QUEUED,
+                    "type": job_type,
+                    "payload": json.dumps(payload),
+                    "attempts": 0,
+                    "trace": json.dumps(inject()),
+                    "updated_at": time.time(),
+                })
+                pipe.expire(key, settings.JOB_RESULT_TTL)
+                pipe.lpush(cls.QUEUE_KEY, job_id)
+                await pipe.execute()
+            except WatchError:
+                # Queued concurrently under the same id
+                return False
+        return True
+
+    @classmethod
+    async def get(cls, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's status, payload and (when finished) result or error"""
+        job = await cache.get_all_hash(cls.JOB_KEY.format(job_id=job_id))
+        if not job:
+            return None
+        return {
+            "id": job_id,
+            "type": job.get("type"),
+            "status": job.get("status"),
+            "attempts": int(job.get("attempts", 0)),
+            "payload": json.loads(job["payload"]) if "payload" in job else None,
+            "result": json.loads(job["result"]) if "result" in job else None,
+            "error": job.get("error"),
+            "updated_at": float(job["updated_at"]) if "updated_at" in job else None,
+        }
+
+    @classmethod
+    async def publish(cls, job_id: str, event: str, data: Any = None):
+        """Append a progress event to the job's event list"""
+        redis_client = await cache.get_redis()
+        key = cls.EVENTS_KEY.format(job_id=job_id)
+        await redis_client.rpush(key, dumps({"event": event, "data": data}))
+        await redis_client.expire(key, settings.JOB_RESULT_TTL)
+
+    @classmethod
+    async def events(
+        cls,
+        job_id: str,
+        start: int = 0,
+        poll_interval: float = 0.25,
+        idle_timeout: Optional[float] = None
+    ) -> AsyncIterator[Tuple[Optional[int], Optional[Dict[str, Any]]]]:
+        """
+        Follow a job's progress events from index start
+
+        Yields (index, event) pairs, polling for new events, and stops
+        after a terminal event. If idle_timeout is set, (None, None) is
+        yielded whenever that long passes without an event, so callers
+        can send keepalives or check for disconnects.
+        """
+        redis_client = await cache.get_redis()
+        key = cls.EVENTS_KEY.format(job_id=job_id)
+        index = start
+        idle = 0.0
+        while True:
+            raw_events = await redis_client.lrange(key, index, -1)
+            for raw in raw_events:
+                event = json.loads(raw)
+                yield index, event
+                index += 1
+                if event["event"] in cls.TERMINAL_EVENTS:
+                    return
+            idle = 0.0 if raw_events else idle + poll_interval
+            if idle_timeout is not None and idle >= idle_timeout:
+                idle = 0.0
+                yield None, None
+            await asyncio.sleep(poll_interval)
+
+    @classmethod
+    async def queue_depth(cls) -> int:
+        """Number of jobs ready to run"""
+        redis_client = await cache.get_redis()
+        return await redis_client.llen(cls.QUEUE_KEY)
+
+    @classmethod
+    async def _promote_delayed(cls, redis_client):
+        """Move retries whose backoff has elapsed back onto the ready queue"""
+        for job_id in await redis_client.zrangebyscore(cls.DELAYED_KEY, 0, time.time(), start=0, num=100):
+            # Only the worker whose ZREM succeeds re-queues the job
+            if await redis_client.zrem(cls.DELAYED_KEY, job_id):
+                await redis_client.lpush(cls.QUEUE_KEY, job_id)
+
+    @classmethod
+    async def _reclaim_expired(cls, redis_client):
+        """Put jobs whose worker stopped renewing their lease back on the ready queue"""
+        now = time.time()
+        for job_id in await redis_client.lrange(cls.PROCESSING_KEY, 0, -1):
+            deadline = await redis_client.zscore(cls.LEASES_KEY, job_id)
+            if deadline is None:
+                # Taken by a worker that has not leased it yet, or died before
+                # it could: start the clock on its behalf
+                await redis_client.zadd(cls.LEASES_KEY, {job_id: now + settings.JOB_VISIBILITY_TIMEOUT}, nx=True)
+            elif deadline <= now and await redis_client.zrem(cls.LEASES_KEY, job_id):
+                # Only the worker whose ZREM succeeds re-queues the job, at the
+                # head of the queue since it has waited the longest
+                async with redis_client.pipeline(transaction=True) as pipe:
+                    pipe.lrem(cls.PROCESSING_KEY, 1, job_id)
+                    pipe.rpush(cls.QUEUE_KEY, job_id)
+                    await pipe.execute()
+                logger.warning(f"Job {job_id} lease expired, re-queued")
+
+    @classmethod
+    async def _renew_lease(cls, redis_client, job_id: str):
+        """Keep a running job's lease from lapsing"""
+        while True:
+            await asyncio.sleep(settings.JOB_VISIBILITY_TIMEOUT / 3)
+            try:
+                await redis_client.zadd(
+                    cls.LEASES_KEY, {job_id: time.time() + settings.JOB_VISIBILITY_TIMEOUT}, xx=True
+                )
+            except Exception as e:
+                logger.error(f"Failed to renew lease of job {job_id}: {str(e)}")
+
+    @classmethod
+    async def _finish(
+        cls,
+        redis_client,
+        job_id: str,
+        fields: Optional[Dict[str, Any]] = None,
+        retry_at: Optional[float] = None
+    ):
+        """Record a job's outcome (if given) and release it from the processing list in one transaction"""
+        key = cls.JOB_KEY.format(job_id=job_id)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            if fields:
+                pipe.hset(key, mapping={**fields, "updated_at": time.time()})
+                if fields.get("status") == cls.SUCCEEDED:
+                    pipe.hdel(key, "error")
+            if retry_at is not None:
+                pipe.zadd(cls.DELAYED_KEY, {job_id: retry_at})
+            pipe.lrem(cls.PROCESSING_KEY, 1, job_id)
+            pipe.zrem(cls.LEASES_KEY, job_id)
+            await pipe.execute()
+
+    @classmethod
+    async def run_next(cls, timeout: float = 1.0) -> bool:
+        """
+        Run one job, waiting up to timeout seconds for one to become ready
+
+        Returns:
+            True if a job was run
+        """
+        redis_client = await cache.get_redis()
+        await cls._promote_delayed(redis_client)
+        if time.monotonic() >= cls._next_reclaim:
+            cls._next_reclaim = time.monotonic() + settings.JOB_VISIBILITY_TIMEOUT / 2
+            await cls._reclaim_expired(redis_client)
+
+        job_id = await redis_client.brpoplpush(cls.QUEUE_KEY, cls.PROCESSING_KEY, timeout=timeout)
+        if not job_id:
+            return False
+        await redis_client.zadd(cls.LEASES_KEY, {job_id: time.time() + settings.JOB_VISIBILITY_TIMEOUT})
+        key = cls.JOB_KEY.format(job_id=job_id)
+
+        job = await redis_client.hgetall(key)
+        if not job or job.get("status") not in (cls.QUEUED, cls.RUNNING):
+            # Expired, or already finished by a worker whose lease had lapsed
+            await cls._finish(redis_client, job_id)
+            return False
+        handler = cls._handlers.get(job.get("type"))
+        attempts = await redis_client.hincrby(key, "attempts", 1)
+        if attempts > settings.JOB_MAX_ATTEMPTS:
+            # Re-queued after the worker running its last attempt was lost
+            logger.error(f"Job {job_id} failed: worker lost on the last attempt")
+            await cls._finish(redis_client, job_id, {"status": cls.FAILED, "error": "Worker lost"})
+            await cls.publish(job_id, "failed", {"error": "Worker lost"})
+            return True
+        await redis_client.hset(key, mapping={"status": cls.RUNNING, "updated_at": time.time()})
+
+        async def report(event: str, data: Any = None):
+            await cls.publish(job_id, event, data)
+
+        lease = asyncio.get_running_loop().create_task(cls._renew_lease(redis_client, job_id))
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job type {job.get('type')}")
+            with span(
+                f"job {job.get('type')}",
+                kind=SpanKind.CONSUMER,
+                context=extract(json.loads(job.get("trace", "{}"))),
+                **{"job.id": job_id, "job.attempt": attempts}
+            ):
+                result = await handler(json.loads(job["payload"]), report)
+        except Exception as e:
+            if attempts < settings.JOB_MAX_ATTEMPTS and not isinstance(e, LookupError):
+                delay = settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1)
+                logger.warning(f"Job {job_id} failed (attempt {attempts}), retrying in {delay}s: {str(e)}")
+                await cls._finish(
+                    redis_client, job_id, {"status": cls.QUEUED, "error": str(e)}, retry_at=time.time() + delay
+                )
+                await cls.publish(job_id, "retrying", {"attempt": attempts, "error": str(e)})
+            else:
+                logger.error(f"Job {job_id} failed after {attempts} attempts: {str(e)}")
+                await cls._finish(redis_client, job_id, {"status": cls.FAILED, "error": str(e)})
+                await cls.publish(job_id, "failed", {"error": str(e)})
+            return True
+        finally:
+            lease.cancel()
+
+        await cls._finish(redis_client, job_id, {"status": cls.SUCCEEDED, "result": dumps(result)})
+        await cls.publish(job_id, "done", {"status": cls.SUCCEEDED})
+        return True
+
+    @classmethod
+    async def work(cls, concurrency: int = 1, stop: Optional[asyncio.Event] = None):
+        """Process jobs with the given number of concurrent consumers until stopped"""
+        stop = stop or asyncio.Event()
+
+        async def consume():
+            while not stop.is_set():
+                try:
+                    await cls.run_next()
+                except Exception as e:
+                    logger.error(f"Job worker error: {str(e)}")
+                    await asyncio.sleep(1)
+
+        await asyncio.gather(*(consume() for _ in range(concurrency)))
+
+# Job queue instance
+job_queue = JobQueue()
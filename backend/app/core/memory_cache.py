@@ -0,0 +1,388 @@
+import copy
+import time
+import asyncio
+import fnmatch
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from redis.exceptions import ResponseError, WatchError
+
+class _Hash(dict):
+    """Fields of a hash"""
+
+class _SortedSet(dict):
+    """Members of a sorted set and their scores"""
+
+class InMemoryRedis:
+    """
+    In-process stand-in for the redis.asyncio client.
+
+    Implements the subset of commands used by RedisCache with the same
+    semantics as a server started with decode_responses=True: values are
+    stored as strings, keys expire lazily on access, and commands against
+    a key holding the wrong type raise a WRONGTYPE ResponseError (hashes
+    and sorted sets are told apart by their dict subclass). pipeline()
+    supports WATCH/MULTI/EXEC transactions (see InMemoryPipeline).
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._pushed: Optional[asyncio.Event] = None
+
+    # Internal helpers
+
+    def _alive(self, key: str) -> bool:
+        """Drop the key if its TTL has passed and report whether it still exists"""
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= self._clock():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def _typed(self, key: str, kind: type, create: bool = False):
+        """Return the value at key, checking it holds the expected type"""
+        if not self._alive(key):
+            if not create:
+                return None
+            self._data[key] = kind()
+        value = self._data[key]
+        if not isinstance(value, kind):
+            raise ResponseError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def _snapshot(self, key: str) -> Any:
+        """Value and expiry of a key, for detecting changes to WATCHed keys"""
+        if not self._alive(key):
+            return None
+        return copy.deepcopy(self._data[key]), self._expires.get(key)
+
+    async def _wait_pushed(self, deadline: Optional[float]) -> bool:
+        """Wait until a list is pushed to; False once the deadline has passed"""
+        if self._pushed is None:
+            self._pushed = asyncio.Event()
+        self._pushed.clear()
+        remaining = None if deadline is None else deadline - self._clock()
+        if remaining is not None and remaining <= 0:
+            return False
+        try:
+            await asyncio.wait_for(self._pushed.wait(), remaining)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    @staticmethod
+    def _encode(value: Any) -> str:
+        if isinstance(value, bytes):
+            return value.decode()
+        return str(value)
+
+    # Connection
+
+    async def ping(self) -> bool:
+        return True
+
+    async def close(self) -> None:
+        return None
+
+    def pipeline(self, transaction: bool = True) -> "InMemoryPipeline":
+        return InMemoryPipeline(self)
+
+    async def flushdb(self) -> bool:
+        self._data.clear()
+        self._expires.clear()
+        return True
+
+    # Keys
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._typed(key, str)
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ex: Optional[int] = None,
+        px: Optional[int] = None,
+        nx: bool = False,
+        xx: bool = False
+    ) -> Optional[bool]:
+        exists = self._alive(key)
+        if (nx and exists) or (xx and not exists):
+            return None
+        self._data[key] = self._encode(value)
+        self._expires.pop(key, None)
+        if ex is not None:
+            self._expires[key] = self._clock() + ex
+        elif px is not None:
+            self._expires[key] = self._clock() + px / 1000
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                del self._data[key]
+                self._expires.pop(key, None)
+                removed += 1
+        return removed
+
+    async def exists(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._alive(key))
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        if not self._alive(key):
+            return False
+        self._expires[key] = self._clock() + seconds
+        return True
+
+    async def ttl(self, key: str) -> int:
+        if not self._alive(key):
+            return -2
+        deadline = self._expires.get(key)
+        if deadline is None:
+            return -1
+        return max(0, round(deadline - self._clock()))
+
+    async def keys(self, pattern: str = "*") -> List[str]:
+        return [key for key in list(self._data) if self._alive(key) and fnmatch.fnmatchcase(key, pattern)]
+
+    async def incrby(self, key: str, amount: int = 1) -> int:
+        current = self._typed(key, str)
+        try:
+            value = int(current or 0) + amount
+        except ValueError:
+            raise ValueError("value is not an integer or out of range")
+        self._data[key] = str(value)
+        return value
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        return await self.incrby(key, amount)
+
+    # Hashes
+
+    async def hget(self, name: str, key: str) -> Optional[str]:
+        hash_ = self._typed(name, _Hash)
+        return hash_.get(key) if hash_ else None
+
+    async def hset(
+        self,
+        name: str,
+        key: Optional[str] = None,
+        value: Any = None,
+        mapping: Optional[Dict[str, Any]] = None
+    ) -> int:
+        hash_ = self._typed(name, _Hash, create=True)
+        items: List[Tuple[str, Any]] = []
+        if key is not None:
+            items.append((key, value))
+        if mapping:
+            items.extend(mapping.items())
+        added = 0
+        for field, field_value in items:
+            if field not in hash_:
+                added += 1
+            hash_[field] = self._encode(field_value)
+        return added
+
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        return dict(self._typed(name, _Hash) or {})
+
+    async def hdel(self, name: str, *keys: str) -> int:
+        hash_ = self._typed(name, _Hash)
+        if not hash_:
+            return 0
+        removed = sum(1 for key in keys if hash_.pop(key, None) is not None)
+        if not hash_:
+            await self.delete(name)
+        return removed
+
+    async def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        hash_ = self._typed(name, _Hash, create=True)
+        try:
+            value = int(hash_.get(key, 0)) + amount
+        except ValueError:
+            raise ValueError("hash value is not an integer")
+        hash_[key] = str(value)
+        return value
+
+    async def hsetnx(self, name: str, key: str, value: Any) -> int:
+        hash_ = self._typed(name, _Hash, create=True)
+        if key in hash_:
+            return 0
+        hash_[key] = self._encode(value)
+        return 1
+
+    # Lists
+
+    def _push(self, key: str, values: Tuple[Any, ...], left: bool) -> int:
+        list_ = self._typed(key, list, create=True)
+        for value in values:
+            if left:
+                list_.insert(0, self._encode(value))
+            else:
+                list_.append(self._encode(value))
+        if self._pushed is not None:
+            self._pushed.set()
+        return len(list_)
+
+    async def lpush(self, key: str, *values: Any) -> int:
+        return self._push(key, values, left=True)
+
+    async def rpush(self, key: str, *values: Any) -> int:
+        return self._push(key, values, left=False)
+
+    async def rpop(self, key: str) -> Optional[str]:
+        list_ = self._typed(key, list)
+        if not list_:
+            return None
+        value = list_.pop()
+        if not list_:
+            await self.delete(key)
+        return value
+
+    async def lrange(self, key: str, start: int, end: int) -> List[str]:
+        list_ = self._typed(key, list) or []
+        end = len(list_) if end == -1 else end + 1
+        return list_[start:end]
+
+    async def llen(self, key: str) -> int:
+        return len(self._typed(key, list) or [])
+
+    async def lrem(self, key: str, count: int, value: Any) -> int:
+        list_ = self._typed(key, list)
+        if not list_:
+            return 0
+        value = self._encode(value)
+        indices = [i for i, item in enumerate(list_) if item == value]
+        if count < 0:
+            indices = indices[::-1][:-count]
+        elif count > 0:
+            indices = indices[:count]
+        for i in sorted(indices, reverse=True):
+            del list_[i]
+        if not list_:
+            await self.delete(key)
+        return len(indices)
+
+    async def brpop(self, keys: Any, timeout: float = 0) -> Optional[Tuple[str, str]]:
+        """Pop from the first non-empty list, waiting up to timeout seconds (0 = forever)"""
+        if isinstance(keys, str):
+            keys = [keys]
+        deadline = None if not timeout else self._clock() + timeout
+        while True:
+            for key in keys:
+                value = await self.rpop(key)
+                if value is not None:
+                    return key, value
+            if not await self._wait_pushed(deadline):
+                return None
+
+    async def brpoplpush(self, src: str, dst: str, timeout: float = 0) -> Optional[str]:
+        """Move the last element of src to the head of dst, waiting up to timeout seconds (0 = forever)"""
+        deadline = None if not timeout else self._clock() + timeout
+        # Checked first, as by Redis, so a value is never popped and then lost
+        self._typed(dst, list)
+        while True:
+            value = await self.rpop(src)
+            if value is not None:
+                self._push(dst, (value,), left=True)
+                return value
+            if not await self._wait_pushed(deadline):
+                return None
+
+    # Sorted sets
+
+    async def zadd(self, name: str, mapping: Dict[str, float], nx: bool = False, xx: bool = False) -> int:
+        zset = self._typed(name, _SortedSet, create=True)
+        added = 0
+        for member, score in mapping.items():
+            exists = member in zset
+            if (nx and exists) or (xx and not exists):
+                continue
+            added += not exists
+            zset[member] = float(score)
+        if not zset:
+            await self.delete(name)
+        return added
+
+    async def zscore(self, name: str, member: str) -> Optional[float]:
+        zset = self._typed(name, _SortedSet)
+        return zset.get(member) if zset else None
+
+    async def zrangebyscore(
+        self,
+        name: str,
+        min: float,
+        max: float,
+        start: Optional[int] = None,
+        num: Optional[int] = None
+    ) -> List[str]:
+        zset = self._typed(name, _SortedSet) or {}
+        members = [m for m, score in sorted(zset.items(), key=lambda item: (item[1], item[0]))
+                   if float(min) <= score <= float(max)]
+        if start is not None and num is not None:
+            members = members[start:start + num]
+        return members
+
+    async def zrem(self, name: str, *members: str) -> int:
+        zset = self._typed(name, _SortedSet)
+        if not zset:
+            return 0
+        removed = sum(1 for member in members if zset.pop(member, None) is not None)
+        if not zset:
+            await self.delete(name)
+        return removed
+
+class InMemoryPipeline:
+    """
+    Transaction on an InMemoryRedis, used like a redis.asyncio pipeline
+
+    Commands issued after watch() and before multi() run immediately;
+    the rest are queued and run together by execute(), which raises
+    WatchError if a watched key changed in the meantime. No queued
+    command waits, so other tasks never see a transaction half applied.
+    """
+
+    def __init__(self, client: InMemoryRedis):
+        self._client = client
+        self._commands: List[Tuple[Callable, tuple, dict]] = []
+        self._watched: Dict[str, Any] = {}
+        self._multi = False
+
+    async def __aenter__(self) -> "InMemoryPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.reset()
+
+    async def reset(self) -> None:
+        self._commands = []
+        self._watched = {}
+        self._multi = False
+
+    async def watch(self, *keys: str) -> bool:
+        for key in keys:
+            self._watched[key] = self._client._snapshot(key)
+        return True
+
+    def multi(self) -> None:
+        self._multi = True
+
+    def __getattr__(self, name: str) -> Any:
+        command = getattr(self._client, name)
+        if self._watched and not self._multi:
+            return command
+
+        def queue(*args, **kwargs) -> "InMemoryPipeline":
+            self._commands.append((command, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self) -> List[Any]:
+        try:
+            if any(self._client._snapshot(key) != value for key, value in self._watched.items()):
+                raise WatchError("Watched variable changed.")
+            return [await command(*args, **kwargs) for command, args, kwargs in self._commands]
+        finally:
+            await self.reset()
@@ -0,0 +1,283 @@
+"""
+Prometheus instrumentation.
+
+Exposes request latency per route, latency and error counts per upstream
+(Vision, Custom Search, GCS, Supabase, Redis), cache hit ratios,
+admission-control queues and rejections, and event-loop lag. Recording a
+sample costs a label lookup and a counter increment (a few microseconds),
+cheap enough to leave on in production; label values are route templates,
+operation names and key prefixes, never raw paths or keys.
+
+When PROMETHEUS_MULTIPROC_DIR is set (several uvicorn workers), /metrics
+aggregates the samples of every worker process.
+"""
+import asyncio
+import functools
+import inspect
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from opentelemetry.trace import SpanKind, get_current_span
+
+from .tracing import route_template, tracer
+
+logger = logging.getLogger(__name__)
+
+# Buckets (seconds) spanning cache hits to slow Vision calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Buckets (seconds) for how late the event loop wakes up
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of calls to external services",
+    ["upstream", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total",
+    "Failed calls to external services",
+    ["upstream", "operation"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"],
+)
+CACHE_HIT_RATIO = Gauge(
+    "cache_hit_ratio",
+    "Share of cache lookups that hit since startup",
+    ["cache"],
+    multiprocess_mode="livemax",
+)
+VISION_COST = Counter(
+    "vision_estimated_cost_usd_total",
+    "Estimated Vision list-price spend by feature profile",
+    ["profile"],
+)
+ADMISSION_ACTIVE = Gauge(
+    "admission_active_requests",
+    "Requests holding an admission slot by route template",
+    ["route"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth",
+    "Requests waiting for an admission slot by route template",
+    ["route"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds",
+    "Time admitted requests waited for a slot",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total",
+    "Requests shed with 429 by route template and reason",
+    ["route", "reason"],
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a timer scheduled on it",
+    buckets=LOOP_LAG_BUCKETS,
+)
+
+# Lookups per cache as [hits, total], for the ratio gauge
+_cache_counts = {}
+
+class observe:
+    """
+    Time a call to an upstream service, as a context manager (sync or
+    async) or a decorator for sync or async functions
+
+    Within a trace, the call is also a client span named
+    "{upstream} {operation}"; calls outside one (e.g. the job worker
+    polling Redis) do not start traces of their own. Exceptions are
+    counted as errors and re-raised.
+    """
+
+    __slots__ = ("upstream", "operation", "_started", "_span")
+
+    def __init__(self, upstream: str, operation: str):
+        self.upstream = upstream
+        self.operation = operation
+
+    def __enter__(self):
+        self._span = None
+        if get_current_span().get_span_context().is_valid:
+            self._span = tracer.start_as_current_span(
+                f"{self.upstream} {self.operation}",
+                kind=SpanKind.CLIENT,
+                attributes={"peer.service": self.upstream},
+            )
+            self._span.__enter__()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        UPSTREAM_LATENCY.labels(self.upstream, self.operation).observe(time.perf_counter() - self._started)
+        if exc_type is not None:
+            UPSTREAM_ERRORS.labels(self.upstream, self.operation).inc()
+        if self._span is not None:
+            self._span.__exit__(exc_type, exc, tb)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+    def __call__(self, func: Callable) -> Callable:
+        upstream, operation = self.upstream, self.operation
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with observe(upstream, operation):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with observe(upstream, operation):
+                return func(*args, **kwargs)
+        return wrapper
+
+def record_error(upstream: str, operation: str):
+    """Count a failed upstream call that did not raise (e.g. an error status)"""
+    UPSTREAM_ERRORS.labels(upstream, operation).inc()
+
+def record_cache(cache: str, hit: bool):
+    """Count a cache lookup"""
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+    counts = _cache_counts.setdefault(cache, [0, 0])
+    counts[0] += int(hit)
+    counts[1] += 1
+    CACHE_HIT_RATIO.labels(cache).set(counts[0] / counts[1])
+
+class InstrumentedClient:
+    """
+    Proxy that times every command of a client (e.g. a Redis connection)
+    as an upstream operation named after the method
+
+    redis-py's command methods are plain functions returning a coroutine
+    (only execute_command is itself a coroutine function), so every method
+    is wrapped and the coroutines they return are timed when awaited.
+    Anything else they return, such as a pipeline, is passed back as is.
+    Blocking waits (BRPOP and friends) are passed through untimed, since
+    their latency is queue idle time rather than server time.
+    """
+
+    UNTIMED = frozenset({"brpop", "blpop", "brpoplpush", "blmove", "bzpopmin", "bzpopmax", "close"})
+
+    def __init__(self, client: Any, upstream: str):
+        self._client = client
+        self._upstream = upstream
+        self._wrapped = {}
+
+    def __getattr__(self, name: str) -> Any:
+        wrapped = self._wrapped.get(name)
+        if wrapped is not None:
+            return wrapped
+        attr = getattr(self._client, name)
+        if name in self.UNTIMED or not callable(attr):
+            return attr
+        upstream = self._upstream
+
+        async def timed(command: Awaitable) -> Any:
+            with observe(upstream, name):
+                return await command
+
+        @functools.wraps(attr)
+        def wrapper(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            # Coroutines only: a pipeline is awaitable too, but is used as an object
+            return timed(result) if inspect.iscoroutine(result) else result
+
+        self._wrapped[name] = wrapper
+        return wrapper
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency of every HTTP request by route"""
+
+    def __init__(self, app, excluded_paths=("/metrics",)):
+        self.app = app
+        self.excluded_paths = frozenset(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(
+                scope["method"], route_template(scope["app"], scope), str(status)
+            ).observe(time.perf_counter() - started)
+
+class LoopLagMonitor:
+    """Samples event-loop lag by timing how late a periodic sleep wakes up"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        # Latest sample in seconds, read by the readiness probe (core/health.py)
+        self.lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - scheduled)
+            EVENT_LOOP_LAG.observe(self.lag)
+
+def render() -> tuple:
+    """Metrics in the Prometheus text format, as (body, content type)"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+# Event-loop lag monitor instance
+loop_lag_monitor = LoopLagMonitor()
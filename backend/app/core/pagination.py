@@ -0,0 +1,94 @@
+import base64
+import json
+import logging
+import re
+import uuid
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from redis.exceptions import WatchError
+from .cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Cached counts are kept up to date incrementally and re-derived from the
+# database after this long, so any drift self-heals (seconds)
+COUNT_CACHE_EXPIRATION = 86400
+
+# Transactions tried by adjust_cached_count before it drops a contended count
+COUNT_UPDATE_ATTEMPTS = 5
+
+# ISO 8601 timestamps as written by isoformat() and returned by PostgREST
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(\.\d{1,6})?(Z|[+-]\d{2}(:?\d{2})?)?")
+
+def encode_cursor(created_at: Any, item_id: Any) -> str:
+    """Encode the (created_at, id) of the last row on a page as an opaque cursor"""
+    if hasattr(created_at, "isoformat"):
+        created_at = created_at.isoformat()
+    raw = json.dumps([created_at, str(item_id)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Both parts are validated, as they end up in database filters.
+
+    Returns:
+        (created_at, id): an ISO 8601 timestamp and a UUID, as strings
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(created_at, str) or not _TIMESTAMP.fullmatch(created_at):
+            raise ValueError("bad timestamp")
+        return created_at, str(uuid.UUID(str(item_id)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+async def get_cached_count(key: str, loader: Callable[[], Awaitable[int]]) -> int:
+    """Get a count from the cache, loading and caching it on a miss"""
+    try:
+        cached = await cache.get(key)
+        if cached is not None:
+            return int(cached)
+    except Exception as e:
+        logger.error(f"Failed to read cached count {key}: {str(e)}")
+    count = await loader()
+    try:
+        # NX so a concurrent incremental update is not overwritten
+        redis_client = await cache.get_redis()
+        await redis_client.set(key, count, ex=COUNT_CACHE_EXPIRATION, nx=True)
+    except Exception as e:
+        logger.error(f"Failed to cache count {key}: {str(e)}")
+    return count
+
+async def adjust_cached_count(key: str, delta: int) -> Optional[int]:
+    """
+    Apply an insert/delete to a cached count
+
+    Counts that are not cached are left alone; the next read loads them.
+    The check and the increment run in one WATCH/MULTI transaction, so a
+    count that expires in between is not recreated without a TTL. A count
+    that keeps changing under the transaction is dropped instead.
+    """
+    try:
+        redis_client = await cache.get_redis()
+        for _ in range(COUNT_UPDATE_ATTEMPTS):
+            async with redis_client.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(key)
+                    if not await pipe.exists(key):
+                        return None
+                    pipe.multi()
+                    pipe.incrby(key, delta)
+                    (count,) = await pipe.execute()
+                    return count
+                except WatchError:
+                    # Adjusted, expired or reloaded concurrently; try again
+                    continue
+        await redis_client.delete(key)
+    except Exception as e:
+        logger.error(f"Failed to update cached count {key}: {str(e)}")
+    return None
@@ -0,0 +1,209 @@
+import httpx
+import logging
+from typing import Any, Dict, List, Optional, Union
+from .config import settings
+from .metrics import observe, record_error
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 multiplexes concurrent queries over one connection, but needs the
+# optional h2 package; fall back to pooled HTTP/1.1 without it.
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+class PostgrestError(Exception):
+    """Error returned by the PostgREST API"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"PostgREST error {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+class PostgrestClient:
+    """
+    Async PostgREST client for the Supabase database.
+
+    Shares one pooled httpx.AsyncClient per process so queries reuse
+    connections instead of blocking the event loop in supabase-py's
+    synchronous .execute().
+    """
+
+    _client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        """Get or create the shared HTTP client"""
+        if cls._client is None:
+            cls._client = httpx.AsyncClient(
+                base_url=f"{settings.SUPABASE_URL}/rest/v1",
+                headers={
+                    "apikey": settings.SUPABASE_SERVICE_KEY,
+                    "Authorization": f"Bearer {settings.SUPABASE_SERVICE_KEY}",
+                },
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(settings.DB_TIMEOUT_SECONDS),
+                limits=httpx.Limits(
+                    max_connections=settings.DB_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.DB_MAX_CONNECTIONS,
+                ),
+            )
+            logger.info(f"PostgREST client initialized (http2={HTTP2_AVAILABLE})")
+        return cls._client
+
+    @classmethod
+    async def close(cls):
+        """Close the shared HTTP client"""
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+            logger.info("PostgREST client closed")
+
+    @staticmethod
+    def _filter_params(filters: Optional[Dict[str, Any]], params: Optional[Dict[str, str]]) -> Dict[str, str]:
+        """Build query params from equality filters plus raw PostgREST operators"""
+        query = {column: f"eq.{value}" for column, value in (filters or {}).items()}
+        if params:
+            query.update(params)
+        return query
+
+    @classmethod
+    async def _request(cls, method: str, table: str, **kwargs) -> httpx.Response:
+        """Send a request for a table, recording its latency and failures"""
+        operation = f"{method.lower()}:{table}"
+        with observe("supabase", operation):
+            response = await cls.get_client().request(method, f"/{table}", **kwargs)
+        # 406 is the "no row" answer to single-object selects
+        if response.status_code >= 400 and response.status_code != 406:
+            record_error("supabase", operation)
+        return response
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response):
+        if response.status_code >= 400:
+            try:
+                message = response.json().get("message", response.text)
+            except ValueError:
+                message = response.text
+            raise PostgrestError(response.status_code, message)
+
+    @classmethod
+    async def select(
+        cls,
+        table: str,
+        columns: str = "*",
+        filters: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, str]] = None,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        single: bool = False
+    ) -> Union[List[Dict[str, Any]], Dict[str, Any], None]:
+        """
+        Select rows from a table
+
+        Args:
+            table: Table name
+            columns: Comma-separated column projection
+            filters: Equality filters, column -> value
+            params: Raw PostgREST query params (e.g. {"created_at": "lt.2024-01-01"})
+            order: PostgREST order clause (e.g. "created_at.desc,id.desc")
+            limit: Maximum number of rows
+            single: Return one object, or None when no row matches
+
+        Returns:
+            List of rows, or a single row when single=True
+        """
+        query = cls._filter_params(filters, params)
+        query["select"] = columns
+        if order:
+            query["order"] = order
+        if limit is not None:
+            query["limit"] = str(limit)
+
+        headers = {"Accept": "application/vnd.pgrst.object+json"} if single else None
+        response = await cls._request("GET", table, params=query, headers=headers)
+        if single and response.status_code == 406:
+            return None
+        cls._raise_for_status(response)
+        return response.json()
+
+    @classmethod
+    async def count(
+        cls,
+        table: str,
+        filters: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, str]] = None
+    ) -> int:
+        """Count rows matching the filters without transferring them"""
+        response = await cls._request(
+            "HEAD",
+            table,
+            params=cls._filter_params(filters, params),
+            headers={"Prefer": "count=exact"},
+        )
+        cls._raise_for_status(response)
+        # Content-Range looks like "0-24/3573" or "*/0"
+        return int(response.headers.get("content-range", "*/0").rsplit("/", 1)[1])
+
+    @classmethod
+    async def insert(
+        cls,
+        table: str,
+        rows: Union[Dict[str, Any], List[Dict[str, Any]]],
+        returning: bool = True,
+        columns: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Insert one row, or many rows (with the same keys) in a single request"""
+        prefer = "return=representation" if returning else "return=minimal"
+        query = {"select": columns} if returning and columns else None
+        response = await cls._request("POST", table, params=query, json=rows, headers={"Prefer": prefer})
+        cls._raise_for_status(response)
+        return response.json() if returning else []
+
+    @classmethod
+    async def update(
+        cls,
+        table: str,
+        values: Dict[str, Any],
+        filters: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, str]] = None,
+        returning: bool = True,
+        columns: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Update rows matching the filters"""
+        prefer = "return=representation" if returning else "return=minimal"
+        query = cls._filter_params(filters, params)
+        if returning and columns:
+            query["select"] = columns
+        response = await cls._request(
+            "PATCH",
+            table,
+            params=query,
+            json=values,
+            headers={"Prefer": prefer},
+        )
+        cls._raise_for_status(response)
+        return response.json() if returning else []
+
+    @classmethod
+    async def delete(
+        cls,
+        table: str,
+        filters: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, str]] = None
+    ) -> None:
+        """Delete rows matching the filters"""
+        if not filters and not params:
+            raise ValueError("Refusing to delete without filters")
+        response = await cls._request(
+            "DELETE",
+            table,
+            params=cls._filter_params(filters, params),
+            headers={"Prefer": "return=minimal"},
+        )
+        cls._raise_for_status(response)
+
+# PostgREST client instance
+postgrest = PostgrestClient()
@@ -0,0 +1,216 @@
+"""
+Fast JSON response rendering.
+
+FastJSONResponse, the app's default response class, serializes with
+orjson, which encodes dicts, lists, datetimes and the result dataclasses
+(see services/results.py) natively, several times faster than
+jsonable_encoder followed by json.dumps. FastAPI still runs
+jsonable_encoder over an endpoint's return value before handing it to the
+response class, so routers are created with route_class=FastJSONRoute,
+which renders the return value of routes without a response_model
+directly.
+
+Any JSON endpoint accepts fields=, a comma separated list of dotted paths
+(lists are traversed), to return only part of the document, e.g.
+fields=products.title,products.price. CompressionMiddleware compresses
+large bodies with Brotli (if the brotli package is installed) or gzip.
+"""
+import asyncio
+import functools
+import gzip
+from contextvars import ContextVar
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi import Query
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from fastapi.utils import is_body_allowed_for_status_code
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+from .encoding import Result
+
+try:
+    import brotli
+except ImportError:  # Optional; responses are gzipped without it
+    brotli = None
+
+# Field projection of the current request, set by response_fields
+_projection: ContextVar[Optional[Dict[str, Any]]] = ContextVar("response_projection", default=None)
+
+async def response_fields(
+    fields: Optional[str] = Query(
+        None,
+        description="Comma separated fields to return, dotted for nested fields (e.g. products.title)"
+    )
+):
+    """App-wide dependency recording the fields= projection of the request"""
+    _projection.set(parse_fields(fields) if fields else None)
+
+def parse_fields(fields: str) -> Dict[str, Any]:
+    """
+    Parse a fields= value into a projection tree
+
+    Args:
+        fields: e.g. "count,items.id,items.analysis.type"
+
+    Returns:
+        Nested dicts of field names, an empty dict meaning the whole field,
+        e.g. {"count": {}, "items": {"id": {}, "analysis": {"type": {}}}}
+    """
+    tree: Dict[str, Any] = {}
+    for path in fields.split(","):
+        node = tree
+        parts = [part for part in path.strip().split(".") if part]
+        for index, part in enumerate(parts):
+            # A shorter path already selects the whole field
+            if part in node and not node[part]:
+                break
+            node = node.setdefault(part, {})
+            if index == len(parts) - 1:
+                node.clear()
+    return tree
+
+def project(value: Any, tree: Dict[str, Any]) -> Any:
+    """Keep only the fields of a projection tree; lists are projected item by item"""
+    if not tree:
+        return value
+    if isinstance(value, dict):
+        return {key: project(value[key], subtree) for key, subtree in tree.items() if key in value}
+    if isinstance(value, Result):
+        return {key: project(getattr(value, key), subtree) for key, subtree in tree.items() if key in value.__slots__}
+    if isinstance(value, (list, tuple)):
+        return [project(item, tree) for item in value]
+    return value
+
+def _default(value: Any) -> Any:
+    """Types orjson does not encode natively, converted as jsonable_encoder would"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode()
+    return str(value)
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, honouring the fields= projection"""
+
+    def render(self, content: Any) -> bytes:
+        tree = _projection.get()
+        if tree:
+            content = project(content, tree)
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+class FastJSONRoute(APIRoute):
+    """
+    Route rendering the return value of endpoints without a response_model
+    with FastJSONResponse directly, skipping jsonable_encoder
+
+    Routes with a response_model, a Response parameter (its headers would be
+    lost) or another response class are handled as usual.
+    """
+
+    def get_route_handler(self):
+        response_class = getattr(self.response_class, "value", self.response_class)
+        status_code = self.status_code or 200
+        if (
+            self.response_field is None
+            and self.dependant.response_param_name is None
+            and issubclass(response_class, FastJSONResponse)
+            and is_body_allowed_for_status_code(status_code)
+        ):
+            call = self.dependant.call
+            is_coroutine = asyncio.iscoroutinefunction(call)
+
+            @functools.wraps(call)
+            async def render_endpoint(**values):
+                # Sync endpoints still run in the threadpool; rendering stays on the loop
+                content = await call(**values) if is_coroutine else await run_in_threadpool(call, **values)
+                if isinstance(content, Response):
+                    return content
+                return response_class(content, status_code=status_code)
+
+            self.dependant.call = render_endpoint
+        return super().get_route_handler()
+
+# Bodies worth compressing; event streams and binary formats are left alone
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "text/csv", "application/javascript")
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing response bodies of at least minimum_size bytes
+
+    Brotli is used when the brotli package is installed and the client
+    accepts it, gzip otherwise. Streaming responses (e.g. job event streams)
+    are passed through unchanged so every chunk reaches the client at once.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _encoding(self, scope) -> Optional[str]:
+        accepted = {
+            token.split(";")[0].strip()
+            for token in Headers(scope=scope).get("accept-encoding", "").lower().split(",")
+        }
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        encoding = self._encoding(scope) if scope["type"] == "http" and self.minimum_size > 0 else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        pending_start = None
+
+        async def send_wrapper(message):
+            nonlocal pending_start
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether to compress
+                pending_start = message
+                return
+            if message["type"] != "http.response.body" or pending_start is None:
+                await send(message)
+                return
+
+            start, pending_start = pending_start, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=list(start["headers"]))
+            content_type = headers.get("content-type", "").split(";")[0].strip()
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or content_type not in COMPRESSIBLE_TYPES
+            ):
+                await send(start)
+                await send(message)
+                return
+
+            compressed = self._compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send({**start, "headers": headers.raw})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,103 @@
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+class ServiceContainer:
+    """
+    Per-process registry of external service clients.
+
+    Modules register a factory (and optionally a close function) for each
+    client at import; nothing is constructed until the client is first
+    used, so importing the app or forking a worker does not load
+    credentials or fetch discovery documents. Each client is built at most
+    once per process, even when first used from several threads at once.
+
+    start() can build clients concurrently ahead of the first request and
+    close() releases them on shutdown (see the lifespan in main.py).
+    """
+
+    _factories: Dict[str, Callable[[], Any]] = {}
+    _closers: Dict[str, Optional[Callable[[Any], Any]]] = {}
+    _instances: Dict[str, Any] = {}
+    _locks: Dict[str, threading.Lock] = {}
+
+    @classmethod
+    def register(cls, name: str, factory: Callable[[], Any], close: Optional[Callable[[Any], Any]] = None):
+        """Register how to build (and close) a service"""
+        cls._factories[name] = factory
+        cls._closers[name] = close
+        cls._locks.setdefault(name, threading.Lock())
+
+    @classmethod
+    def get(cls, name: str) -> Any:
+        """Get a service, building it on first use"""
+        instance = cls._instances.get(name)
+        if instance is not None:
+            return instance
+        if name not in cls._factories:
+            raise LookupError(f"No service registered as {name}")
+        with cls._locks[name]:
+            if name not in cls._instances:
+                started = time.perf_counter()
+                cls._instances[name] = cls._factories[name]()
+                logger.info(f"Service {name} ready in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return cls._instances[name]
+
+    @classmethod
+    def lazy(cls, name: str) -> "LazyService":
+        """A stand-in that builds the service when one of its attributes is first used"""
+        return LazyService(cls, name)
+
+    @classmethod
+    def built(cls) -> Iterable[str]:
+        """Names of the services constructed so far in this process"""
+        return list(cls._instances)
+
+    @classmethod
+    async def start(cls, names: Iterable[str]):
+        """Build services concurrently in worker threads; failures are logged, not raised"""
+        names = [name for name in names if name]
+
+        async def build(name: str):
+            try:
+                await run_in_threadpool(cls.get, name)
+            except Exception as e:
+                logger.error(f"Failed to start service {name}: {str(e)}")
+
+        await asyncio.gather(*(build(name) for name in names))
+
+    @classmethod
+    async def close(cls):
+        """Close every constructed service; they are rebuilt if used again"""
+        for name, instance in list(cls._instances.items()):
+            close = cls._closers.get(name)
+            try:
+                if close is not None:
+                    result = close(instance)
+                    if inspect.isawaitable(result):
+                        await result
+            except Exception as e:
+                logger.error(f"Failed to close service {name}: {str(e)}")
+            cls._instances.pop(name, None)
+
+class LazyService:
+    """Proxy for a registered service, resolved on attribute access"""
+
+    def __init__(self, container, name: str):
+        object.__setattr__(self, "_container", container)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._container.get(self._name), attr)
+
+    def __repr__(self) -> str:
+        return f"<LazyService {self._name}>"
+
+# Service container instance
+services = ServiceContainer()
@@ -0,0 +1,210 @@
+"""
+Distributed tracing (OpenTelemetry).
+
+Every call timed by metrics.observe (Vision, Custom Search, GCS, Supabase,
+Redis) is also a client span, service methods decorated with @traced are
+internal spans, and TracingMiddleware opens a server span per request
+that continues a W3C traceparent sent by the caller. Jobs carry the trace
+context of the request that queued them, so an /upload/ and its
+background analysis form one trace.
+
+Spans are exported according to TRACE_EXPORTER: "none" (tracing off; the
+no-op tracer costs about a microsecond per span), "console", "file" (OTLP
+JSON, one export batch per line, readable by the collector's otlpjsonfile
+receiver) or "otlp" (OTLP/HTTP to TRACE_OTLP_ENDPOINT). TRACE_SAMPLE_RATIO
+sets the share of new traces recorded; callers' sampling decisions are
+honoured.
+"""
+import base64
+import functools
+import inspect
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from opentelemetry import context as otel_context, propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from starlette.routing import Match
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("fashionai")
+
+_provider = None
+
+class FileSpanExporter:
+    """Appends finished spans to a file as OTLP JSON, one export batch per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans) -> Any:
+        from google.protobuf.json_format import MessageToDict
+        from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+        from opentelemetry.sdk.trace.export import SpanExportResult
+
+        request = MessageToDict(encode_spans(spans))
+        for resource_spans in request.get("resourceSpans", []):
+            for scope_spans in resource_spans.get("scopeSpans", []):
+                for span_data in scope_spans.get("spans", []):
+                    _hex_ids(span_data)
+                    for link in span_data.get("links", []):
+                        _hex_ids(link)
+        line = json.dumps(request, separators=(",", ":"))
+        try:
+            with self._lock, open(self.path, "a") as file:
+                file.write(line + "\n")
+        except OSError as e:
+            logger.error(f"Failed to write spans to {self.path}: {str(e)}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+def _hex_ids(span_data: Dict[str, Any]):
+    """OTLP JSON writes trace and span ids as hex, where protobuf JSON uses base64"""
+    for key in ("traceId", "spanId", "parentSpanId"):
+        if span_data.get(key):
+            span_data[key] = base64.b64decode(span_data[key]).hex()
+
+def _exporter(name: str):
+    if name == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return ConsoleSpanExporter()
+    if name == "file":
+        return FileSpanExporter(settings.TRACE_FILE_PATH)
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=settings.TRACE_OTLP_ENDPOINT)
+    raise ValueError(f"Unknown TRACE_EXPORTER {name}")
+
+def setup_tracing(service_name: str):
+    """
+    Install the tracer provider for this process (no-op when TRACE_EXPORTER is "none")
+
+    Args:
+        service_name: Reported as service.name, e.g. fashionai-api or fashionai-worker
+    """
+    global _provider
+    if _provider is not None or settings.TRACE_EXPORTER == "none":
+        return
+    # The SDK is only imported when tracing is on
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    try:
+        exporter = _exporter(settings.TRACE_EXPORTER)
+    except Exception as e:
+        logger.error(f"Tracing disabled: {str(e)}")
+        return
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACE_SAMPLE_RATIO)),
+    )
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    logger.info(f"Tracing to {settings.TRACE_EXPORTER} (sample ratio {settings.TRACE_SAMPLE_RATIO})")
+
+def shutdown_tracing():
+    """Flush buffered spans"""
+    if _provider is not None:
+        _provider.shutdown()
+
+def span(name: str, kind: SpanKind = SpanKind.INTERNAL, context: Optional[otel_context.Context] = None, **attributes):
+    """Context manager for a span that is current while it is open"""
+    return tracer.start_as_current_span(name, context=context, kind=kind, attributes=attributes)
+
+def traced(name: Optional[str] = None, **attributes):
+    """
+    Decorator running a sync or async function in a span
+
+    Args:
+        name: Span name, by default the function's qualified name (e.g. VisionAI.detect_labels)
+        attributes: Attributes set on every span
+    """
+    def decorate(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def set_attributes(attributes: Dict[str, Any]):
+    """Set attributes on the current span, e.g. {"cache.hit": True}"""
+    current = trace.get_current_span()
+    if current.is_recording():
+        current.set_attributes(attributes)
+
+def inject() -> Dict[str, str]:
+    """The current trace context as W3C headers, for handing to another process"""
+    carrier: Dict[str, str] = {}
+    propagate.inject(carrier)
+    return carrier
+
+def extract(carrier: Dict[str, str]) -> otel_context.Context:
+    """A trace context from headers produced by inject() or sent by a caller"""
+    return propagate.extract(carrier)
+
+def route_template(app, scope) -> str:
+    """The path template of the route that handled a request, e.g. /jobs/{job_id}"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "<unmatched>")
+    return "<unmatched>"
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span per HTTP request"""
+
+    def __init__(self, app, excluded_paths=("/metrics",)):
+        self.app = app
+        self.excluded_paths = frozenset(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        with span(
+            scope["method"],
+            kind=SpanKind.SERVER,
+            context=extract(headers),
+            **{"http.method": scope["method"], "http.target": scope["path"]}
+        ) as server_span:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    server_span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        server_span.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                if server_span.is_recording():
+                    route = route_template(scope["app"], scope)
+                    server_span.set_attribute("http.route", route)
+                    server_span.update_name(f"{scope['method']} {route}")
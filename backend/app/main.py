@@ -1,20 +1,60 @@
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import uvicorn
 import os
 from dotenv import load_dotenv
-from .api import auth, profile
+from .api import auth, profile, diagnostics
+from .api.endpoints import images
+from .api.deps import admission_key
+from .core.cache import cache
+from .core.config import settings
+from .core.postgrest import postgrest
+from .core.analytics import analytics_sink
+from .core.services import services
+from .core.metrics import MetricsMiddleware, loop_lag_monitor, render as render_metrics
+from .core.diagnostics import blocking_detector
+from .core.tracing import TracingMiddleware, setup_tracing, shutdown_tracing
+from .core.responses import CompressionMiddleware, FastJSONResponse, FastJSONRoute, response_fields
+from .core.admission import AdmissionMiddleware
+from .core.health import health
+from .services.color_names import ColorNamer
 
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start background writers, load lookup tables and build preloaded clients
+    setup_tracing("fashionai-api")
+    analytics_sink.start()
+    loop_lag_monitor.start()
+    if settings.DIAGNOSTICS_ENABLED:
+        blocking_detector.start()
+    ColorNamer.load()
+    await services.start(settings.SERVICES_PRELOAD.split(","))
+    yield
+    # Flush buffered events, then release clients and pooled connections
+    await analytics_sink.stop()
+    await loop_lag_monitor.stop()
+    await blocking_detector.stop()
+    await services.close()
+    await postgrest.close()
+    await cache.disconnect()
+    shutdown_tracing()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Fashion Finder AI API",
     description="API for Fashion Finder AI - Clothing detection and product search",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+    # orjson rendering and the fields= projection for every JSON endpoint
+    default_response_class=FastJSONResponse,
+    dependencies=[Depends(response_fields)]
 )
+app.router.route_class = FastJSONRoute
 
 # Configure CORS
 origins = [
@@ -23,6 +63,21 @@ origins = [
     "http://localhost:8000",
 ]
 
+# Compress large bodies (innermost, so the other middleware see the final body size)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES)
+
+# Concurrency limits and load shedding on expensive routes (inside CORS, so
+# 429s carry CORS headers and browsers can read Retry-After)
+app.add_middleware(
+    AdmissionMiddleware,
+    routes=[route for route in settings.ADMISSION_ROUTES.split(",") if route],
+    identify=admission_key,
+    limit=settings.ADMISSION_CONCURRENCY,
+    per_user_limit=settings.ADMISSION_USER_CONCURRENCY,
+    max_queue=settings.ADMISSION_QUEUE_SIZE,
+    timeout=settings.ADMISSION_QUEUE_TIMEOUT
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -31,20 +86,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency by route and a server span per request (outermost, so
+# they include CORS handling)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(profile.router)
+app.include_router(images.router)
+if settings.DIAGNOSTICS_ENABLED:
+    app.include_router(diagnostics.router)
 
 # Root endpoint for health check
 @app.get("/")
 async def root():
     return {"message": "Welcome to Fashion Finder AI API"}
 
-# Health check endpoint
+# Liveness: the process is up and serving; dependencies are not checked,
+# so their outages do not get workers restarted
 @app.get("/health")
+@app.get("/health/live")
 async def health_check():
     return {"status": "healthy"}
 
+# Readiness: dependencies reachable and the worker not overloaded (see core/health.py)
+@app.get("/health/ready")
+async def readiness_check():
+    ready, report = await health.readiness()
+    return FastJSONResponse(
+        report,
+        status_code=200 if ready else 503,
+        headers={"Cache-Control": "no-store"}
+    )
+
+# Prometheus metrics
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    # content_type already names the charset, which media_type would append again
+    return Response(content=body, headers={"Content-Type": content_type})
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -0,0 +1,281 @@
+"""
+Offline bulk re-analysis of stored images.
+
+Recomputes stored analyses after changes to the Vision post-processing
+(CLOTHING_CATEGORIES, PATTERN_TYPES, _process_vision_response, ...).
+Walks the bucket lazily in name order, annotates images in batches and
+re-runs the post-processing in a process pool, then writes the results
+back to the images table through PostgREST, several rows at a time.
+
+Two annotation modes:
+    local  batch_annotate_images on downloaded bytes, 16 images per RPC
+    async  async_batch_annotate_images reading gs:// URIs and writing the
+           responses to GCS under --output-prefix (large backfills)
+
+Progress is checkpointed after every batch; rerunning with the same
+checkpoint file resumes after the last written image. Images that could
+not be annotated or written are recorded in the checkpoint; --retry-failed
+runs them again instead of walking the bucket.
+
+Usage (from backend/):
+    python -m app.reanalyze --prefix uploads/ --mode local --max-rps 5
+    python -m app.reanalyze --prefix uploads/ --retry-failed
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from google.cloud import vision
+
+from .core.encoding import to_primitive
+from .core.postgrest import postgrest
+from .services.storage import storage_client
+from .services.vision import VisionAI
+
+logger = logging.getLogger(__name__)
+
+REANALYZE_FEATURES = [
+    vision.Feature(type_=vision.Feature.Type.LABEL_DETECTION, max_results=10),
+    vision.Feature(type_=vision.Feature.Type.WEB_DETECTION, max_results=10),
+    vision.Feature(type_=vision.Feature.Type.OBJECT_LOCALIZATION, max_results=10),
+    vision.Feature(type_=vision.Feature.Type.IMAGE_PROPERTIES),
+]
+
+# Images per async_batch_annotate_images operation (the API allows 2000)
+ASYNC_OPERATION_SIZE = 500
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+# Concurrent row updates while writing a batch back
+WRITE_CONCURRENCY = 8
+
+def process_response(serialized: bytes) -> Dict[str, Any]:
+    """Re-run Vision post-processing on a serialized AnnotateImageResponse, as plain data (process pool entry point)"""
+    response = vision.AnnotateImageResponse.deserialize(serialized)
+    if response.error.message:
+        return {"error": response.error.message}
+    labels = VisionAI._labels_from_response(response)
+    objects = VisionAI._objects_from_response(response)
+    return to_primitive({
+        "analysis": VisionAI.build_clothing_items(labels, objects),
+        "vision_analysis": VisionAI._process_vision_response(response),
+    })
+
+class RateLimiter:
+    """Spaces out calls so no more than rate happen per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        if self._next > now:
+            await asyncio.sleep(self._next - now)
+        self._next = max(now, self._next) + self.interval
+
+class Checkpoint:
+    """Progress of a re-analysis run, persisted atomically as JSON"""
+
+    def __init__(self, path: str, prefix: str):
+        self.path = path
+        self.state = {"prefix": prefix, "last_file": None, "processed": 0, "failed": 0, "failed_files": []}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("prefix") != prefix:
+                raise SystemExit(f"Checkpoint {path} belongs to prefix {saved.get('prefix')!r}")
+            self.state.update(saved)
+
+    def save(self, last_file: Optional[str], paths: List[str], failed: List[str]):
+        """
+        Record a finished batch
+
+        Args:
+            last_file: Walk position, or None for retry batches
+            paths: Images attempted in the batch
+            failed: Those that failed; they replace any earlier failure
+                records of the batch's images
+        """
+        attempted = set(paths)
+        failed_files = [path for path in self.state["failed_files"] if path not in attempted] + failed
+        self.state.update({
+            "last_file": last_file or self.state["last_file"],
+            "processed": self.state["processed"] + len(paths) - len(failed),
+            "failed": len(failed_files),
+            "failed_files": failed_files,
+            "updated_at": datetime.utcnow().isoformat(),
+        })
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+def iter_images(prefix: str, after: Optional[str]) -> Iterator[str]:
+    """Lazily yield image paths under prefix that sort after the checkpoint"""
+    for name in storage_client.iter_files(prefix=prefix, start_offset=after):
+        if name == after or not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        yield name
+
+def chunked(iterator: Iterator[str], size: int) -> Iterator[List[str]]:
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def annotate_local(paths: List[str]) -> List[bytes]:
+    """Download images and annotate them with synchronous batch requests"""
+    contents = [storage_client.download_file(path) for path in paths]
+    responses = VisionAI.batch_annotate(contents, REANALYZE_FEATURES)
+    return [vision.AnnotateImageResponse.serialize(response) for response in responses]
+
+def annotate_async(paths: List[str], output_prefix: str, timeout: float) -> List[bytes]:
+    """Annotate images in place on GCS with an async batch operation and read back the output"""
+    client = VisionAI.get_client()
+    output_path = f"{output_prefix.rstrip('/')}/{uuid.uuid4().hex}/"
+    requests = [
+        {
+            "image": {"source": {"image_uri": storage_client.get_gcs_uri(path)}},
+            "features": REANALYZE_FEATURES,
+        }
+        for path in paths
+    ]
+    operation = client.async_batch_annotate_images(
+        requests=requests,
+        output_config={
+            "gcs_destination": {"uri": storage_client.get_gcs_uri(output_path)},
+            "batch_size": VisionAI.BATCH_ANNOTATE_LIMIT,
+        },
+    )
+    operation.result(timeout=timeout)
+
+    # Output files hold BatchAnnotateImagesResponse JSON; match responses back by URI
+    by_uri = {}
+    for name in storage_client.iter_files(prefix=output_path):
+        batch = vision.BatchAnnotateImagesResponse.from_json(
+            storage_client.download_file(name).decode("utf-8"), ignore_unknown_fields=True
+        )
+        for response in batch.responses:
+            by_uri[response.context.uri] = vision.AnnotateImageResponse.serialize(response)
+        storage_client.delete_file(name)
+
+    missing = vision.AnnotateImageResponse(error={"message": "No response in async batch output"})
+    return [
+        by_uri.get(storage_client.get_gcs_uri(path), vision.AnnotateImageResponse.serialize(missing))
+        for path in paths
+    ]
+
+async def write_results(paths: List[str], results: List[Dict[str, Any]]) -> List[str]:
+    """Write successful results back, a few rows at a time; returns the paths that failed"""
+    now = datetime.utcnow().isoformat()
+    write_slots = asyncio.Semaphore(WRITE_CONCURRENCY)
+
+    async def write(path: str, result: Dict[str, Any]) -> Optional[str]:
+        if "error" in result:
+            logger.warning(f"Failed to analyse {path}: {result['error']}")
+            return path
+        async with write_slots:
+            try:
+                await postgrest.update(
+                    "images",
+                    {
+                        "analysis": result["analysis"],
+                        "vision_analysis": result["vision_analysis"],
+                        "analyzed_at": now,
+                    },
+                    filters={"file_path": path},
+                    returning=False
+                )
+            except Exception as e:
+                logger.warning(f"Failed to write analysis of {path}: {str(e)}")
+                return path
+        return None
+
+    failed = await asyncio.gather(*(write(path, result) for path, result in zip(paths, results)))
+    return [path for path in failed if path is not None]
+
+async def reanalyze_batch(paths: List[str], args, limiter: RateLimiter, pool: ProcessPoolExecutor) -> List[str]:
+    """Annotate, post-process and write back a batch of images; returns the paths that failed"""
+    loop = asyncio.get_running_loop()
+    try:
+        if args.mode == "async":
+            await limiter.wait()
+            serialized = await loop.run_in_executor(
+                None, annotate_async, paths, args.output_prefix, args.timeout
+            )
+        else:
+            serialized = []
+            # Every batch_annotate_images RPC counts against the rate limit
+            for rpc_paths in chunked(iter(paths), VisionAI.BATCH_ANNOTATE_LIMIT):
+                await limiter.wait()
+                serialized.extend(await loop.run_in_executor(None, annotate_local, rpc_paths))
+    except Exception as e:
+        logger.error(f"Failed to annotate {len(paths)} images from {paths[0]}: {str(e)}")
+        return list(paths)
+
+    results = await asyncio.gather(*(
+        loop.run_in_executor(pool, process_response, response) for response in serialized
+    ))
+    return await write_results(paths, results)
+
+async def reanalyze(args):
+    checkpoint = Checkpoint(args.checkpoint, args.prefix)
+    limiter = RateLimiter(args.max_rps)
+    batch_size = ASYNC_OPERATION_SIZE if args.mode == "async" else args.batch_size
+
+    if args.retry_failed:
+        images = iter(list(checkpoint.state["failed_files"]))
+        logger.info(f"Retrying {checkpoint.state['failed']} failed images")
+    else:
+        images = iter_images(args.prefix, checkpoint.state["last_file"])
+        if checkpoint.state["last_file"]:
+            logger.info(f"Resuming after {checkpoint.state['last_file']} ({checkpoint.state['processed']} done)")
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            for paths in chunked(images, batch_size):
+                failed = await reanalyze_batch(paths, args, limiter, pool)
+                checkpoint.save(None if args.retry_failed else paths[-1], paths, failed)
+                logger.info(
+                    f"Reanalysed {checkpoint.state['processed']} images "
+                    f"({checkpoint.state['failed']} failed), last: {paths[-1]}"
+                )
+    finally:
+        await postgrest.close()
+
+    logger.info(
+        f"Re-analysis complete: {checkpoint.state['processed']} processed, "
+        f"{checkpoint.state['failed']} failed (rerun with --retry-failed)"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run Vision analysis over stored images")
+    parser.add_argument("--prefix", default="uploads/", help="bucket prefix to walk")
+    parser.add_argument("--mode", choices=("local", "async"), default="local")
+    parser.add_argument("--batch-size", type=int, default=VisionAI.BATCH_ANNOTATE_LIMIT * 4,
+                        help="images per checkpointed batch in local mode")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-rps", type=float, default=5.0, help="Vision requests per second")
+    parser.add_argument("--checkpoint", default=".reanalyze_checkpoint.json")
+    parser.add_argument("--output-prefix", default="vision-output/reanalyze",
+                        help="bucket prefix for async batch output")
+    parser.add_argument("--timeout", type=float, default=1800, help="async operation timeout (s)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="re-run the images recorded as failed in the checkpoint")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(reanalyze(args))
+
+if __name__ == "__main__":
+    main()
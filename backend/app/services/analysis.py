@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List
+from starlette.concurrency import run_in_threadpool
+
+from ..core.encoding import to_primitive
+from ..core.jobs import job_queue
+from ..core.postgrest import postgrest
+from .storage import storage_client
+from .vision import VisionAI
+from .shopping import ShoppingAPI
+from .garments import analyze_garments
+
+logger = logging.getLogger(__name__)
+
+ANALYZE_IMAGE_JOB = "analyze_image"
+
+# Distinct product queries searched per upload (one per detected item)
+MAX_PRODUCT_QUERIES = 3
+
+# Garments cropped and searched individually in per-garment mode
+MAX_GARMENTS = 6
+
+ProgressReporter = Callable[[str, Any], Awaitable[None]]
+
+def analysis_job_id(upload_id: str) -> str:
+    """Job id for analysing an upload; one analysis job per upload"""
+    return f"{ANALYZE_IMAGE_JOB}:{upload_id}"
+
+def build_product_query(item: Dict[str, Any]) -> str:
+    """Build a product search query from a clothing item returned by analyze_clothing"""
+    attributes = item.get("attributes", {})
+    colors = attributes.get("colors") or []
+    parts = [
+        colors[0] if colors else "",
+        attributes.get("pattern") or "",
+        attributes.get("style") or "",
+        item.get("type", ""),
+    ]
+    return " ".join(part for part in parts if part).strip()
+
+@job_queue.handler(ANALYZE_IMAGE_JOB)
+async def analyze_image_job(payload: Dict[str, Any], report: ProgressReporter) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Analyse a stored upload and find similar products
+
+    Publishes progress as each stage completes: "labels" (labels and
+    objects), "colors", "items" (clothing items), then one "products"
+    event per product search.
+
+    In per-garment mode each detected garment is cropped, its colors and
+    pattern are measured on the crop, and it gets its own product search
+    (attached to the item as similar_products).
+
+    Payload:
+        upload_id: Image record id
+        file_path: Path of the image in Cloud Storage
+        per_garment: Optional, enable per-garment crop-and-search
+        profile: Optional Vision feature profile (see VisionAI.PROFILES);
+            without one labels, objects and colors are detected separately
+    """
+    per_garment = payload.get("per_garment", False)
+    profile = payload.get("profile")
+    file_content = await run_in_threadpool(storage_client.download_file, payload["file_path"])
+
+    if profile:
+        # One annotate request with the profile's features, colors included
+        annotation = await VisionAI.annotate(file_content, profile)
+        labels, objects = annotation["labels"], annotation["objects"]
+        await report("labels", {
+            "labels": labels,
+            "objects": objects,
+            "web_entities": annotation["web_entities"],
+            "vision_profile": annotation["vision_profile"]
+        })
+        dominant_colors = annotation["dominant_colors"]
+    else:
+        labels, objects = await asyncio.gather(
+            VisionAI.detect_labels(file_content),
+            VisionAI.detect_objects(file_content)
+        )
+        await report("labels", {"labels": labels, "objects": objects})
+        dominant_colors = await VisionAI.detect_dominant_colors(file_content)
+    await report("colors", {"dominant_colors": dominant_colors})
+
+    clothing_items = VisionAI.build_clothing_items(labels, objects)
+    if per_garment:
+        clothing_items = await run_in_threadpool(
+            analyze_garments, file_content, clothing_items[:MAX_GARMENTS]
+        )
+    await report("items", {"analysis": clothing_items})
+
+    # Items with the same query share one search
+    queries = {}
+    for index, item in enumerate(clothing_items):
+        query = build_product_query(item)
+        if query:
+            queries.setdefault(query, []).append(index)
+    queries = dict(list(queries.items())[:MAX_GARMENTS if per_garment else MAX_PRODUCT_QUERIES])
+
+    async def search(query: str):
+        return query, await ShoppingAPI.search_products(query=query, max_results=5)
+
+    # Search concurrently, reporting each batch as it lands
+    similar_products = []
+    seen_ids = set()
+    for next_batch in asyncio.as_completed([search(query) for query in queries]):
+        query, products = await next_batch
+        await report("products", {"query": query, "items": queries[query], "products": products})
+        if per_garment:
+            for index in queries[query]:
+                clothing_items[index]["similar_products"] = products
+        for product in products:
+            if product.id not in seen_ids:
+                seen_ids.add(product.id)
+                similar_products.append(product)
+
+    await postgrest.update(
+        "images",
+        to_primitive({
+            "analysis": clothing_items,
+            "dominant_colors": dominant_colors,
+            "similar_products": similar_products
+        }),
+        filters={"id": payload["upload_id"]},
+        returning=False
+    )
+
+    logger.info(f"Analysed upload {payload['upload_id']}: {len(clothing_items)} items")
+    return {
+        "analysis": clothing_items,
+        "dominant_colors": dominant_colors,
+        "similar_products": similar_products
+    }
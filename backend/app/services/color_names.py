@@ -0,0 +1,215 @@
+"""
+Perceptual color naming.
+
+Colors are named after the closest entry of FASHION_PALETTE by CIEDE2000.
+Rather than computing distances per request, every color of a 32x32x32
+quantized RGB grid is named once and the result is stored as a lookup
+table (data/color_names.npz, ~32 KB uncompressed), so naming a color is a
+single array index.
+
+Regenerate the table after editing the palette (from backend/):
+    python -m app.services.color_names
+"""
+import logging
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .palette import rgb_to_lab
+
+logger = logging.getLogger(__name__)
+
+# Bits kept per RGB channel; 5 gives a 32x32x32 table
+LUT_BITS = 5
+
+LUT_PATH = os.path.join(os.path.dirname(__file__), "data", "color_names.npz")
+
+# Named colors in fashion vocabulary, as (name, sRGB hex); a name may have
+# several anchors when it covers a wide region (e.g. muted and saturated navy)
+FASHION_PALETTE: List[Tuple[str, str]] = [
+    ("black", "#141414"),
+    ("charcoal", "#36454f"),
+    ("gray", "#808080"),
+    ("light gray", "#c8c8c8"),
+    ("silver", "#a9acb6"),
+    ("white", "#f8f8f6"),
+    ("ivory", "#fffff0"),
+    ("cream", "#f3e9d2"),
+    ("beige", "#d8c8a8"),
+    ("taupe", "#8b7d6b"),
+    ("tan", "#d2b48c"),
+    ("camel", "#c19a6b"),
+    ("khaki", "#bdb07f"),
+    ("brown", "#6b4226"),
+    ("chocolate", "#3f2a1e"),
+    ("rust", "#b7410e"),
+    ("burgundy", "#800020"),
+    ("maroon", "#5c1a1b"),
+    ("red", "#d91e18"),
+    ("coral", "#ff7f50"),
+    ("blush", "#e8b4b8"),
+    ("pink", "#f4a6c0"),
+    ("hot pink", "#ff3e96"),
+    ("fuchsia", "#c2185b"),
+    ("plum", "#673147"),
+    ("purple", "#6a3d9a"),
+    ("lavender", "#b9a5d6"),
+    ("navy", "#1f2a44"),
+    ("navy", "#0b1f6b"),
+    ("royal blue", "#2a52be"),
+    ("blue", "#3b6fb6"),
+    ("denim", "#4f6d8f"),
+    ("light blue", "#a7c7e7"),
+    ("teal", "#0f7c80"),
+    ("turquoise", "#30c5c0"),
+    ("mint", "#a8e6cf"),
+    ("sage", "#9caf88"),
+    ("olive", "#6b6b2a"),
+    ("khaki green", "#728c52"),
+    ("green", "#2e8b57"),
+    ("emerald", "#009b77"),
+    ("forest green", "#1f4d2b"),
+    ("mustard", "#d4a017"),
+    ("yellow", "#f5d33f"),
+    ("gold", "#c9a227"),
+    ("orange", "#fa8c00"),
+]
+
+def ciede2000(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """
+    CIEDE2000 color difference between broadcastable arrays of Lab colors
+
+    Args:
+        lab1: Array of shape (..., 3)
+        lab2: Array of shape (..., 3)
+
+    Returns:
+        Array of delta E values
+    """
+    lab1 = np.asarray(lab1, dtype=np.float64)
+    lab2 = np.asarray(lab2, dtype=np.float64)
+    L1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    L2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    c_bar = (np.hypot(a1, b1) + np.hypot(a2, b2)) / 2
+    g = 0.5 * (1 - np.sqrt(c_bar ** 7 / (c_bar ** 7 + 25.0 ** 7)))
+    a1p, a2p = (1 + g) * a1, (1 + g) * a2
+    c1p, c2p = np.hypot(a1p, b1), np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+    chroma_zero = (c1p * c2p) == 0
+
+    delta_l = L2 - L1
+    delta_c = c2p - c1p
+    delta_h = h2p - h1p
+    delta_h = np.where(delta_h > 180, delta_h - 360, np.where(delta_h < -180, delta_h + 360, delta_h))
+    delta_h = np.where(chroma_zero, 0, delta_h)
+    delta_big_h = 2 * np.sqrt(c1p * c2p) * np.sin(np.radians(delta_h / 2))
+
+    l_bar = (L1 + L2) / 2
+    c_bar_p = (c1p + c2p) / 2
+    h_sum = h1p + h2p
+    h_bar = np.where(
+        chroma_zero, h_sum,
+        np.where(np.abs(h1p - h2p) <= 180, h_sum / 2,
+                 np.where(h_sum < 360, (h_sum + 360) / 2, (h_sum - 360) / 2))
+    )
+
+    t = (1 - 0.17 * np.cos(np.radians(h_bar - 30)) + 0.24 * np.cos(np.radians(2 * h_bar))
+         + 0.32 * np.cos(np.radians(3 * h_bar + 6)) - 0.20 * np.cos(np.radians(4 * h_bar - 63)))
+    delta_theta = 30 * np.exp(-((h_bar - 275) / 25) ** 2)
+    r_c = 2 * np.sqrt(c_bar_p ** 7 / (c_bar_p ** 7 + 25.0 ** 7))
+    s_l = 1 + 0.015 * (l_bar - 50) ** 2 / np.sqrt(20 + (l_bar - 50) ** 2)
+    s_c = 1 + 0.045 * c_bar_p
+    s_h = 1 + 0.015 * c_bar_p * t
+    r_t = -np.sin(np.radians(2 * delta_theta)) * r_c
+
+    return np.sqrt(
+        (delta_l / s_l) ** 2 + (delta_c / s_c) ** 2 + (delta_big_h / s_h) ** 2
+        + r_t * (delta_c / s_c) * (delta_big_h / s_h)
+    )
+
+def _palette_rgb() -> np.ndarray:
+    return np.array([[int(code[i:i + 2], 16) for i in (1, 3, 5)] for _, code in FASHION_PALETTE])
+
+def build_lut(bits: int = LUT_BITS) -> np.ndarray:
+    """
+    Name every cell of the quantized RGB grid
+
+    Returns:
+        uint8 array of 2**(3*bits) palette indices, indexed by
+        (r >> shift) << 2*bits | (g >> shift) << bits | (b >> shift)
+    """
+    levels = 1 << bits
+    step = 256 // levels
+    centers = np.arange(levels) * step + step // 2
+    grid = np.stack(np.meshgrid(centers, centers, centers, indexing="ij"), axis=-1).reshape(-1, 3)
+    palette_lab = rgb_to_lab(_palette_rgb())
+
+    lut = np.empty(len(grid), dtype=np.uint8)
+    # Chunked to keep the (cells x palette) distance matrix small
+    for start in range(0, len(grid), 4096):
+        cells = rgb_to_lab(grid[start:start + 4096])
+        lut[start:start + 4096] = ciede2000(cells[:, None, :], palette_lab[None, :, :]).argmin(axis=1)
+    return lut
+
+class ColorNamer:
+    """Names RGB colors with the precomputed palette lookup table"""
+
+    _lut: Optional[np.ndarray] = None
+    _names: List[str] = [name for name, _ in FASHION_PALETTE]
+    _shift = 8 - LUT_BITS
+
+    @classmethod
+    def load(cls, path: str = LUT_PATH) -> np.ndarray:
+        """
+        Load the lookup table, rebuilding it in memory if the file is
+        missing or was generated from a different palette
+        """
+        try:
+            with np.load(path) as data:
+                if list(data["names"]) == cls._names and list(data["hex"]) == [c for _, c in FASHION_PALETTE]:
+                    cls._lut = data["lut"]
+                    return cls._lut
+            logger.warning(f"Color lookup table {path} is stale, rebuilding in memory")
+        except FileNotFoundError:
+            logger.warning(f"Color lookup table {path} not found, building in memory")
+        cls._lut = build_lut()
+        return cls._lut
+
+    @classmethod
+    def get_lut(cls) -> np.ndarray:
+        """Get the lookup table, loading it on first use"""
+        if cls._lut is None:
+            cls.load()
+        return cls._lut
+
+    @classmethod
+    def name(cls, red: int, green: int, blue: int) -> str:
+        """Name a single RGB color"""
+        s, bits = cls._shift, LUT_BITS
+        index = (int(red) >> s) << (2 * bits) | (int(green) >> s) << bits | (int(blue) >> s)
+        return cls._names[cls.get_lut()[index]]
+
+    @classmethod
+    def name_many(cls, rgb: np.ndarray) -> List[str]:
+        """Name an array of RGB colors of shape (n, 3)"""
+        rgb = np.asarray(rgb, dtype=np.int64) >> cls._shift
+        indices = rgb[:, 0] << (2 * LUT_BITS) | rgb[:, 1] << LUT_BITS | rgb[:, 2]
+        return [cls._names[i] for i in cls.get_lut()[indices]]
+
+def write_lut(path: str = LUT_PATH):
+    """Build the lookup table and save it with the palette it was built from"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(
+        path,
+        lut=build_lut(),
+        names=np.array([name for name, _ in FASHION_PALETTE]),
+        hex=np.array([code for _, code in FASHION_PALETTE]),
+    )
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    write_lut()
+    logger.info(f"Wrote {LUT_PATH} ({os.path.getsize(LUT_PATH)} bytes)")
@@ -0,0 +1,98 @@
+import logging
+import math
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .palette import decode_image, extract_palette, sample_pixels
+from .results import Color, Vertex
+from .vision import VisionAI
+
+logger = logging.getLogger(__name__)
+
+# Pixels sampled per crop for pattern statistics (strided view, no copy)
+MAX_SAMPLE_PIXELS = 64 * 1024
+
+# Mean gradient magnitude below which a garment is considered solid
+SOLID_EDGE_THRESHOLD = 12.0
+
+# Ratio between horizontal and vertical gradient energy indicating stripes
+STRIPE_ENERGY_RATIO = 2.5
+
+def crop_region(pixels: np.ndarray, vertices: List[Vertex]) -> Optional[np.ndarray]:
+    """
+    Crop the bounding box of a normalized bounding poly
+
+    Returns a view into pixels (no copy), or None if the region is empty.
+    """
+    if not vertices:
+        return None
+    height, width = pixels.shape[:2]
+    xs = [vertex.x for vertex in vertices]
+    ys = [vertex.y for vertex in vertices]
+    left = int(max(0.0, min(xs)) * width)
+    right = int(math.ceil(min(1.0, max(xs)) * width))
+    top = int(max(0.0, min(ys)) * height)
+    bottom = int(math.ceil(min(1.0, max(ys)) * height))
+    if right - left < 2 or bottom - top < 2:
+        return None
+    return pixels[top:bottom, left:right]
+
+def crop_colors(crop: np.ndarray, max_colors: int = 5) -> List[Color]:
+    """Dominant colors of a crop, in the same format as VisionAI colors"""
+    return extract_palette(crop, max_colors=max_colors)
+
+def crop_pattern(crop: np.ndarray, fallback: str = "solid") -> str:
+    """
+    Estimate whether a garment is solid or striped from its gradient energy,
+    deferring to the label-derived pattern otherwise
+    """
+    gray = sample_pixels(crop, MAX_SAMPLE_PIXELS).astype(np.float32).mean(axis=2)
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return fallback
+    horizontal = np.abs(np.diff(gray, axis=1)).mean()
+    vertical = np.abs(np.diff(gray, axis=0)).mean()
+    if max(horizontal, vertical) < SOLID_EDGE_THRESHOLD:
+        return "solid"
+    if max(horizontal, vertical) > STRIPE_ENERGY_RATIO * max(min(horizontal, vertical), 1e-6):
+        return "striped"
+    return fallback if fallback != "solid" else "graphic"
+
+def analyze_garments(image_content: bytes, clothing_items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Replace the image-wide color and pattern attributes of each clothing item
+    with values measured on its own crop
+
+    The image is decoded once and every garment is cropped as a view of the
+    same array, so additional garments cost no extra decoding. This is CPU
+    bound; run it in a thread from async code.
+
+    Args:
+        image_content: Encoded image bytes
+        clothing_items: Output of VisionAI.build_clothing_items
+
+    Returns:
+        The clothing items, each with per-garment attributes and dominant_colors
+    """
+    pixels = decode_image(image_content)
+    garments = []
+
+    for item in clothing_items:
+        crop = crop_region(pixels, item.get("bounding_box"))
+        if crop is None:
+            garments.append(item)
+            continue
+        dominant_colors = VisionAI._extract_dominant_colors(crop_colors(crop))
+        color_names = list(dict.fromkeys(color.name for color in dominant_colors))
+        garments.append({
+            **item,
+            "attributes": {
+                **item["attributes"],
+                "colors": color_names,
+                "pattern": crop_pattern(crop, fallback=item["attributes"].get("pattern") or "solid")
+            },
+            "dominant_colors": dominant_colors,
+        })
+
+    logger.info(f"Analysed {len(garments)} garment crops")
+    return garments
@@ -0,0 +1,159 @@
+import io
+import logging
+import math
+from typing import List
+
+import numpy as np
+from PIL import Image
+
+from .results import Color, RGB
+
+logger = logging.getLogger(__name__)
+
+# Longest side the image is decoded at; JPEGs are scaled during decoding
+DECODE_MAX_DIMENSION = 1024
+
+# Pixels clustered per palette (strided sample, no copy)
+PALETTE_SAMPLE_PIXELS = 16 * 1024
+
+# Colors returned per palette, matching what Vision IMAGE_PROPERTIES returns
+PALETTE_MAX_COLORS = 10
+
+# Lloyd iterations after median-cut seeding; more rarely moves the centroids
+KMEANS_ITERATIONS = 8
+
+# D65 reference white and the sRGB -> XYZ matrix
+_WHITE = np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+], dtype=np.float32)
+
+def decode_image(image_content: bytes, max_dimension: int = DECODE_MAX_DIMENSION) -> np.ndarray:
+    """
+    Decode an image once into an RGB uint8 array of shape (height, width, 3)
+
+    Args:
+        image_content: Encoded image bytes
+        max_dimension: Approximate longest side to decode at
+
+    Returns:
+        RGB pixel array
+    """
+    with Image.open(io.BytesIO(image_content)) as image:
+        # JPEG draft mode downscales in the DCT domain, far cheaper than decode + resize
+        image.draft("RGB", (max_dimension, max_dimension))
+        if max(image.size) > max_dimension:
+            image.thumbnail((max_dimension, max_dimension))
+        return np.asarray(image.convert("RGB"))
+
+def sample_pixels(pixels: np.ndarray, max_pixels: int = PALETTE_SAMPLE_PIXELS) -> np.ndarray:
+    """Strided view of an image with at most about max_pixels pixels"""
+    step = max(1, int(math.ceil(math.sqrt(pixels.shape[0] * pixels.shape[1] / max_pixels))))
+    return pixels[::step, ::step]
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """
+    Convert sRGB values in 0-255 to CIE Lab (D65)
+
+    Args:
+        rgb: Array of shape (..., 3)
+
+    Returns:
+        Float32 array of the same shape with L, a, b
+    """
+    srgb = np.asarray(rgb, dtype=np.float32) / 255.0
+    linear = np.where(srgb > 0.04045, ((srgb + 0.055) / 1.055) ** 2.4, srgb / 12.92)
+    xyz = (linear @ _RGB_TO_XYZ.T) / _WHITE
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+def _median_cut(lab: np.ndarray, k: int) -> np.ndarray:
+    """Seed centroids by repeatedly splitting the widest box at its median"""
+    boxes = [lab]
+    while len(boxes) < k:
+        # Split the box whose widest channel spans furthest, weighted by population
+        spans = [np.ptp(box, axis=0) if len(box) > 1 else np.zeros(3) for box in boxes]
+        index = max(range(len(boxes)), key=lambda i: spans[i].max() * math.sqrt(len(boxes[i])))
+        if spans[index].max() == 0:
+            break
+        box = boxes.pop(index)
+        channel = int(spans[index].argmax())
+        order = np.argsort(box[:, channel], kind="stable")
+        middle = len(box) // 2
+        boxes.extend([box[order[:middle]], box[order[middle:]]])
+    return np.stack([box.mean(axis=0) for box in boxes])
+
+def extract_palette(
+    pixels: np.ndarray,
+    max_colors: int = PALETTE_MAX_COLORS,
+    iterations: int = KMEANS_ITERATIONS
+) -> List[Color]:
+    """
+    Dominant colors of an image or crop, clustered in Lab space
+
+    Pixels are sampled, seeded with median cut and refined with a few
+    k-means iterations. Each cluster is reported with the mean RGB of its
+    pixels in the format of VisionAI._process_colors, so the result can be
+    passed straight to VisionAI._extract_dominant_colors. Scores are pixel
+    fractions (Vision weighs in saliency, which is not available locally).
+
+    Args:
+        pixels: RGB uint8 array of shape (height, width, 3)
+        max_colors: Maximum number of colors
+        iterations: Number of k-means iterations
+
+    Returns:
+        Colors, most prominent first
+    """
+    rgb = sample_pixels(pixels).reshape(-1, 3)
+    if not len(rgb):
+        return []
+    lab = rgb_to_lab(rgb)
+
+    centroids = _median_cut(lab, min(max_colors, len(lab)))
+    for _ in range(iterations):
+        distances = ((lab[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+        assignment = distances.argmin(axis=1)
+        counts = np.bincount(assignment, minlength=len(centroids))
+        sums = np.stack([
+            np.bincount(assignment, weights=lab[:, c], minlength=len(centroids)) for c in range(3)
+        ], axis=1)
+        # Empty clusters keep their previous centroid
+        updated = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centroids)
+        if np.allclose(updated, centroids, atol=0.5):
+            break
+        centroids = updated.astype(np.float32)
+
+    assignment = ((lab[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+    counts = np.bincount(assignment, minlength=len(centroids))
+    clusters = np.nonzero(counts)[0]
+    clusters = clusters[np.argsort(counts[clusters], kind="stable")[::-1]]
+    means = np.stack([
+        np.bincount(assignment, weights=rgb[:, c], minlength=len(centroids)) for c in range(3)
+    ], axis=1)[clusters] / counts[clusters, None]
+    means = np.clip(np.rint(means), 0, 255).astype(int)
+    fractions = counts[clusters] / len(rgb)
+
+    return [
+        Color(
+            RGB(int(r), int(g), int(b)),
+            round(float(fraction) * 100, 2),
+            round(float(fraction) * 100, 2),
+            "#{:02x}{:02x}{:02x}".format(r, g, b)
+        )
+        for (r, g, b), fraction in zip(means, fractions)
+    ]
+
+def image_palette(image_content: bytes, max_colors: int = PALETTE_MAX_COLORS) -> List[Color]:
+    """
+    Decode an image and extract its palette
+
+    This is CPU bound; run it in a thread from async code.
+    """
+    return extract_palette(decode_image(image_content), max_colors=max_colors)
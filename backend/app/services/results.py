@@ -0,0 +1,114 @@
+"""
+Compact result types for Vision and Shopping data.
+
+Labels, objects, colors, fashion items and products are slotted
+dataclasses instead of dicts: they are built straight from the protobuf
+messages or search results, take a fraction of the memory of the
+equivalent dicts, and later stages read attributes rather than hashing
+keys. Field names are the JSON keys the API returned when these were
+dicts, so to_dict() (and the orjson encoders) produce the same documents
+with one difference: every FashionItem has a location, null for label
+items, where label items used to have no location key.
+
+Results are converted to plain data only when they leave the process
+(see core/encoding.py).
+
+Classes declare __slots__ by hand rather than using dataclass(slots=True),
+which needs Python 3.10; fields therefore have no defaults.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from ..core.encoding import Result
+
+@dataclass
+class Vertex(Result):
+    """A normalized bounding-poly vertex"""
+
+    __slots__ = ("x", "y")
+    x: float
+    y: float
+
+@dataclass
+class Label(Result):
+    """A label annotation"""
+
+    __slots__ = ("description", "score", "topicality")
+    description: str
+    score: float
+    topicality: float
+
+@dataclass
+class WebEntity(Result):
+    """A web detection entity"""
+
+    __slots__ = ("description", "score")
+    description: str
+    score: Optional[float]
+
+@dataclass
+class DetectedObject(Result):
+    """A localized object with its normalized bounding poly"""
+
+    __slots__ = ("name", "score", "bounding_poly")
+    name: str
+    score: float
+    bounding_poly: List[Vertex]
+
+@dataclass
+class RGB(Result):
+    """An sRGB color, channels 0-255"""
+
+    __slots__ = ("red", "green", "blue")
+    red: float
+    green: float
+    blue: float
+
+@dataclass
+class Color(Result):
+    """A palette color; score and pixel_fraction are percentages"""
+
+    __slots__ = ("color", "score", "pixel_fraction", "hex")
+    color: RGB
+    score: float
+    pixel_fraction: float
+    hex: str
+
+@dataclass
+class NamedColor(Result):
+    """A dominant color with its fashion color name"""
+
+    __slots__ = ("name", "hex", "score")
+    name: str
+    hex: str
+    score: float
+
+@dataclass
+class FashionItem(Result):
+    """A fashion label or object; location is set for objects only"""
+
+    __slots__ = ("type", "name", "confidence", "location")
+    type: str
+    name: str
+    confidence: float
+    location: Optional[List[Vertex]]
+
+@dataclass
+class Product(Result):
+    """A product search result"""
+
+    __slots__ = ("id", "title", "link", "image", "price", "currency", "brand", "description", "source")
+    id: str
+    title: str
+    link: str
+    image: Optional[str]
+    price: Optional[float]
+    currency: str
+    brand: Optional[str]
+    description: Optional[str]
+    source: Optional[str]
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Product":
+        """Rebuild a product from its to_dict() form, e.g. a cached search"""
+        return cls(**data)
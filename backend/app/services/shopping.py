@@ -1,33 +1,42 @@
-from googleapiclient.discovery import build
 import logging
 from typing import List, Dict, Any, Optional
 import json
+from starlette.concurrency import run_in_threadpool
 from app.core.config import settings
 from app.core.cache import cache
+from app.core.services import services
+from app.core.metrics import observe
+from app.core.tracing import set_attributes, traced
+from app.services.results import Product
 
 logger = logging.getLogger(__name__)
 
 class ShoppingAPI:
     """Google Shopping API service for product search"""
     
-    _service = None
-    
     # Cache expiration time in seconds (1 day)
     CACHE_EXPIRATION = 86400
     
     @classmethod
     def get_service(cls):
-        """Get or create Shopping API service"""
-        if cls._service is None:
-            try:
-                cls._service = build('customsearch', 'v1', developerKey=settings.GOOGLE_API_KEY)
-                logger.info("Google Shopping API service initialized")
-            except Exception as e:
-                logger.error(f"Failed to initialize Google Shopping API service: {str(e)}")
-                raise
-        return cls._service
+        """Get the Shopping API service, creating the shared instance on first use"""
+        return services.get("customsearch")
+    
+    @staticmethod
+    def build_service():
+        """Build the Custom Search service (fetches its discovery document)"""
+        # Imported here: googleapiclient is only needed once the service is built
+        from googleapiclient.discovery import build
+        try:
+            service = build('customsearch', 'v1', developerKey=settings.GOOGLE_API_KEY)
+            logger.info("Google Shopping API service initialized")
+            return service
+        except Exception as e:
+            logger.error(f"Failed to initialize Google Shopping API service: {str(e)}")
+            raise
     
     @classmethod
+    @traced()
     async def search_products(
         cls, 
         query: str, 
@@ -35,7 +44,7 @@ class ShoppingAPI:
         min_price: Optional[float] = None,
         max_price: Optional[float] = None,
         brands: Optional[List[str]] = None
-    ) -> List[Dict[str, Any]]:
+    ) -> List[Product]:
         """
         Search for products using Google Shopping
         
@@ -54,9 +63,10 @@ class ShoppingAPI:
         
         # Check cache first
         cached_results = await cache.get(cache_key)
+        set_attributes({"cache.hit": bool(cached_results)})
         if cached_results:
             logger.info(f"Retrieved cached shopping results for query: {query}")
-            return cached_results
+            return [Product.from_dict(item) for item in cached_results]
         
         # Build search query with filters
         search_query = query
@@ -72,34 +82,23 @@ class ShoppingAPI:
             brand_filter = " OR ".join([f"brand:{brand}" for brand in brands])
             search_query += f" ({brand_filter})"
         
-        # Get service
-        service = cls.get_service()
+        # Building the service and executing a search both block on HTTP, so
+        # they run in the threadpool and concurrent searches overlap
+        service = await run_in_threadpool(cls.get_service)
         
         try:
             # Execute search
-            result = service.cse().list(
+            request = service.cse().list(
                 q=search_query,
                 cx=settings.GOOGLE_SEARCH_ENGINE_ID,
                 searchType='shopping',
                 num=max_results
-            ).execute()
+            )
+            with observe("customsearch", "search"):
+                result = await run_in_threadpool(request.execute)
             
             # Parse results
-            items = []
-            if 'items' in result:
-                for item in result['items']:
-                    product = {
-                        "id": item['cacheId'] if 'cacheId' in item else item['link'],
-                        "title": item['title'],
-                        "link": item['link'],
-                        "image": item['pagemap']['cse_image'][0]['src'] if 'pagemap' in item and 'cse_image' in item['pagemap'] else None,
-                        "price": cls._extract_price(item),
-                        "currency": cls._extract_currency(item),
-                        "brand": cls._extract_brand(item),
-                        "description": item['snippet'] if 'snippet' in item else None,
-                        "source": item['displayLink'] if 'displayLink' in item else None
-                    }
-                    items.append(product)
+            items = cls._parse_results(result)
             
             logger.info(f"Found {len(items)} products for query: {query}")
             
@@ -159,6 +158,25 @@ class ShoppingAPI:
         
         return product_details
     
+    @classmethod
+    def _parse_results(cls, result: Dict[str, Any]) -> List[Product]:
+        """Convert a Custom Search response into products"""
+        items = []
+        for item in result.get('items', []):
+            pagemap = item.get('pagemap', {})
+            items.append(Product(
+                item['cacheId'] if 'cacheId' in item else item['link'],
+                item['title'],
+                item['link'],
+                pagemap['cse_image'][0]['src'] if 'cse_image' in pagemap else None,
+                cls._extract_price(item),
+                cls._extract_currency(item),
+                cls._extract_brand(item),
+                item.get('snippet'),
+                item.get('displayLink')
+            ))
+        return items
+    
     @classmethod
     def _extract_price(cls, item: Dict[str, Any]) -> Optional[float]:
         """Extract price from item data"""
@@ -201,5 +219,8 @@ class ShoppingAPI:
             
         return None
 
+# Shared service, constructed on first use (see core/services.py)
+services.register("customsearch", ShoppingAPI.build_service, close=lambda service: service.close())
+
 # Create instance
 shopping_api = ShoppingAPI() 
\ No newline at end of file
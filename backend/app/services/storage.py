@@ -1,11 +1,15 @@
-from google.cloud import storage
-from google.oauth2 import service_account
 import os
 import datetime
 import logging
 from pathlib import Path
+from typing import Iterator
+from starlette.concurrency import run_in_threadpool
 
 from ..core.config import get_settings
+from ..core.metrics import observe
+from ..core.tracing import traced
+from ..core.services import services
+from ..core.health import health
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -13,6 +17,10 @@ logger = logging.getLogger(__name__)
 class CloudStorage:
     def __init__(self):
         """Initialize Google Cloud Storage client"""
+        # Imported here: the storage SDK is a sizeable slice of the app's
+        # import time and only the built client needs it
+        from google.cloud import storage
+        from google.oauth2 import service_account
         try:
             # Check if we have service account credentials
             if hasattr(settings, "GCP_SERVICE_ACCOUNT_KEY_PATH") and settings.GCP_SERVICE_ACCOUNT_KEY_PATH:
@@ -37,8 +45,11 @@ class CloudStorage:
             logger.error(f"Failed to initialize Cloud Storage client: {str(e)}")
             raise Exception(f"Cloud Storage initialization error: {str(e)}")
     
-    def generate_upload_path(self, user_id: str, filename: str) -> str:
-        """Generate a path for the uploaded file based on user ID and timestamp"""
+    def generate_upload_path(self, user_id: str, filename: str, unique_id: str = None) -> str:
+        """
+        Generate a path for the uploaded file based on user ID and timestamp.
+        Pass unique_id when several files may be uploaded within the same second.
+        """
         # Create a timestamp-based directory structure
         today = datetime.datetime.now()
         year_month = today.strftime("%Y/%m")
@@ -50,13 +61,14 @@ class CloudStorage:
         
         # Generate a timestamp-based filename with original extension
         timestamp = today.strftime("%Y%m%d_%H%M%S")
-        new_filename = f"{timestamp}{extension}"
+        new_filename = f"{timestamp}_{unique_id}{extension}" if unique_id else f"{timestamp}{extension}"
         
         # Construct the full path: uploads/user_id/YYYY/MM/timestamp.ext
         upload_path = f"uploads/{user_id}/{year_month}/{new_filename}"
         
         return upload_path
     
+    @traced()
     def upload_file(self, file_content: bytes, file_path: str, content_type: str = None) -> str:
         """
         Upload a file to Google Cloud Storage
@@ -67,13 +79,15 @@ class CloudStorage:
             blob = self.bucket.blob(file_path)
             
             # Upload the file
-            blob.upload_from_string(
-                file_content,
-                content_type=content_type
-            )
+            with observe("gcs", "upload"):
+                blob.upload_from_string(
+                    file_content,
+                    content_type=content_type
+                )
             
             # Make the blob publicly accessible
-            blob.make_public()
+            with observe("gcs", "make_public"):
+                blob.make_public()
             
             # Return the public URL
             return blob.public_url
@@ -86,7 +100,8 @@ class CloudStorage:
         """Delete a file from Google Cloud Storage"""
         try:
             blob = self.bucket.blob(file_path)
-            blob.delete()
+            with observe("gcs", "delete"):
+                blob.delete()
             return True
         
         except Exception as e:
@@ -98,11 +113,13 @@ class CloudStorage:
         blob = self.bucket.blob(file_path)
         return blob.public_url
     
+    @traced()
     def download_file(self, file_path: str) -> bytes:
         """Download a file from Google Cloud Storage"""
         try:
             blob = self.bucket.blob(file_path)
-            return blob.download_as_bytes()
+            with observe("gcs", "download"):
+                return blob.download_as_bytes()
         
         except Exception as e:
             logger.error(f"Failed to download file {file_path}: {str(e)}")
@@ -111,16 +128,49 @@ class CloudStorage:
     def list_files(self, prefix: str = None, delimiter: str = None) -> list:
         """List files in the bucket with the given prefix"""
         try:
-            blobs = self.client.list_blobs(
-                self.bucket,
-                prefix=prefix,
-                delimiter=delimiter
-            )
-            return [blob.name for blob in blobs]
+            return list(self.iter_files(prefix=prefix, delimiter=delimiter))
         
         except Exception as e:
             logger.error(f"Failed to list files with prefix {prefix}: {str(e)}")
             return []
+    
+    def iter_files(self, prefix: str = None, delimiter: str = None, start_offset: str = None) -> Iterator[str]:
+        """
+        Lazily iterate over file names in the bucket, in lexicographic order.
+        Pages are fetched as the iterator advances; start_offset skips names
+        that sort before it, which lets long walks resume where they stopped.
+        """
+        blobs = self.client.list_blobs(
+            self.bucket,
+            prefix=prefix,
+            delimiter=delimiter,
+            start_offset=start_offset
+        )
+        for page in blobs.pages:
+            # Time each page fetch, not the caller's work between pages
+            with observe("gcs", "list_page"):
+                names = [blob.name for blob in page]
+            yield from names
+    
+    def get_gcs_uri(self, file_path: str) -> str:
+        """Get the gs:// URI for a file"""
+        return f"gs://{self.bucket.name}/{file_path}"
+    
+    def check(self):
+        """Fetch at most one object name, confirming the credentials can read the bucket"""
+        with observe("gcs", "health"):
+            blobs = self.client.list_blobs(self.bucket, max_results=1, timeout=settings.HEALTH_CHECK_TIMEOUT)
+            next(iter(blobs), None)
+    
+    def close(self):
+        """Release the client's HTTP session"""
+        self.client.close()
+
+# Shared instance, constructed on first use (see core/services.py)
+services.register("storage", CloudStorage, close=CloudStorage.close)
+storage_client = services.lazy("storage") 
+
+async def _check_storage():
+    await run_in_threadpool(storage_client.check)
 
-# Create instance
-storage_client = CloudStorage() 
\ No newline at end of file
+health.register("gcs", _check_storage)
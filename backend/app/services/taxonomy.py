@@ -0,0 +1,200 @@
+"""
+Fashion taxonomy and keyword matcher.
+
+Holds the clothing categories, patterns, styles, colors and their synonyms,
+compiled once at import into a single Aho-Corasick automaton. Scanning a
+label finds every taxonomy term in it in one pass over its characters,
+regardless of how many terms there are.
+
+Terms match as substrings (so "shirt" matches "T-shirt"), except those
+marked whole_word, which must not touch other letters or digits (so
+"redwood" does not mention red).
+"""
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .color_names import FASHION_PALETTE
+
+CATEGORY = "category"
+PATTERN = "pattern"
+STYLE = "style"
+COLOR = "color"
+FASHION = "fashion"
+
+# Clothing item categories
+CLOTHING_CATEGORIES = [
+    "shirt", "t-shirt", "dress", "pants", "jeans", "shorts", "skirt",
+    "jacket", "coat", "sweater", "hoodie", "blazer", "suit", "tie",
+    "shoes", "sneakers", "heels", "boots", "sandals", "hat", "cap",
+    "sunglasses", "glasses", "watch", "bracelet", "necklace", "earrings",
+    "ring", "bag", "handbag", "backpack", "wallet", "belt", "scarf"
+]
+
+# Pattern types
+PATTERN_TYPES = [
+    "solid", "striped", "plaid", "checkered", "dotted", "floral",
+    "geometric", "animal_print", "camouflage", "logo", "graphic"
+]
+
+# Style categories
+STYLE_CATEGORIES = [
+    "casual", "formal", "business", "sporty", "athletic", "streetwear",
+    "vintage", "bohemian", "preppy", "punk", "minimalist", "luxury"
+]
+
+# Garment words beyond the categories that mark a label as fashion related
+FASHION_TERMS = ["apparel", "clothing", "footwear", "shoe", "sneaker", "accessory", "jewelry"]
+
+# Alternative spellings and related words, matched as whole words
+CATEGORY_SYNONYMS = {
+    "tee": "t-shirt", "trousers": "pants", "chinos": "pants", "leggings": "pants",
+    "cardigan": "sweater", "jumper": "sweater", "pullover": "sweater",
+    "parka": "coat", "trench": "coat", "purse": "handbag", "tote": "bag",
+    "loafers": "shoes", "trainers": "sneakers", "blouse": "shirt",
+}
+PATTERN_SYNONYMS = {
+    "stripe": "striped", "stripes": "striped", "pinstripe": "striped",
+    "tartan": "plaid", "gingham": "checkered", "houndstooth": "checkered",
+    "polka dot": "dotted", "polka dots": "dotted", "paisley": "floral",
+    "leopard": "animal_print", "zebra": "animal_print", "snakeskin": "animal_print",
+    "camo": "camouflage",
+}
+STYLE_SYNONYMS = {
+    "sportswear": "sporty", "activewear": "athletic", "boho": "bohemian",
+    "retro": "vintage", "elegant": "formal", "office": "business",
+}
+COLOR_SYNONYMS = {"navy blue": "navy", "grey": "gray", "violet": "purple", "magenta": "fuchsia"}
+
+COLORS = list(dict.fromkeys(name for name, _ in FASHION_PALETTE))
+
+class Term(NamedTuple):
+    kind: str
+    value: str
+    # Position of the canonical value in its list; lower wins ties
+    priority: int
+    whole_word: bool
+
+class Match(NamedTuple):
+    kind: str
+    value: str
+    priority: int
+    start: int
+    end: int
+
+class TaxonomyMatcher:
+    """Aho-Corasick automaton over lowercase keywords"""
+
+    def __init__(self, terms: Iterable[Tuple[str, Term]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per state: (keyword length, term) for every keyword ending there
+        self._out: List[List[Tuple[int, Term]]] = [[]]
+
+        for keyword, term in terms:
+            state = 0
+            for char in keyword.lower():
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].append((len(keyword), term))
+
+        # Breadth-first failure links (depth-1 states fail to the root);
+        # outputs of the failure state are inherited
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def scan(self, text: str) -> List[Match]:
+        """Every taxonomy term occurring in text, in order of where it ends"""
+        text = text.lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if not out[state]:
+                continue
+            end = index + 1
+            for length, term in out[state]:
+                start = end - length
+                if term.whole_word and not _bounded(text, start, end):
+                    continue
+                matches.append(Match(term.kind, term.value, term.priority, start, end))
+        return matches
+
+def _bounded(text: str, start: int, end: int) -> bool:
+    """Whether text[start:end] is not adjoined by letters or digits"""
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+def _terms() -> Iterable[Tuple[str, Term]]:
+    for priority, category in enumerate(CLOTHING_CATEGORIES):
+        yield category, Term(CATEGORY, category, priority, False)
+        yield category, Term(FASHION, category, priority, False)
+    for word, category in CATEGORY_SYNONYMS.items():
+        priority = CLOTHING_CATEGORIES.index(category)
+        yield word, Term(CATEGORY, category, priority, True)
+        yield word, Term(FASHION, category, priority, True)
+    for priority, word in enumerate(FASHION_TERMS):
+        yield word, Term(FASHION, word, len(CLOTHING_CATEGORIES) + priority, False)
+    for priority, pattern in enumerate(PATTERN_TYPES):
+        yield pattern.replace("_", " "), Term(PATTERN, pattern, priority, False)
+    for word, pattern in PATTERN_SYNONYMS.items():
+        yield word, Term(PATTERN, pattern, PATTERN_TYPES.index(pattern), True)
+    for priority, style in enumerate(STYLE_CATEGORIES):
+        yield style, Term(STYLE, style, priority, False)
+    for word, style in STYLE_SYNONYMS.items():
+        yield word, Term(STYLE, style, STYLE_CATEGORIES.index(style), True)
+    for priority, color in enumerate(COLORS):
+        yield color, Term(COLOR, color, priority, True)
+    for word, color in COLOR_SYNONYMS.items():
+        yield word, Term(COLOR, color, COLORS.index(color), True)
+
+# Built once at import
+matcher = TaxonomyMatcher(_terms())
+
+# Vision draws labels from a limited vocabulary, so most texts repeat
+@lru_cache(maxsize=4096)
+def scan(text: str) -> Tuple[Match, ...]:
+    """Every taxonomy term in text (cached)"""
+    return tuple(matcher.scan(text))
+
+def values(matches: Sequence[Match], kind: str) -> List[str]:
+    """
+    Distinct values of one kind, in order of appearance
+
+    Matches inside a longer match of the same kind are dropped, so
+    "navy blue" yields navy rather than navy and blue.
+    """
+    of_kind = [match for match in matches if match.kind == kind]
+    return list(dict.fromkeys(
+        match.value for match in of_kind
+        if not any(
+            other.start <= match.start and match.end <= other.end and other.end - other.start > match.end - match.start
+            for other in of_kind
+        )
+    ))
+
+def first(matches: Sequence[Match], kind: str) -> Optional[str]:
+    """The highest priority value of one kind, or None"""
+    candidates = [match for match in matches if match.kind == kind]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda match: match.priority).value
+
+def has(matches: Sequence[Match], kind: str) -> bool:
+    return any(match.kind == kind for match in matches)
@@ -1,11 +1,22 @@
-from google.cloud import vision
-from google.oauth2 import service_account
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import logging
 import io
-from typing import List, Dict, Any, Optional, Tuple
+import time
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Set, Tuple
 import os
 
 from ..core.config import get_settings
+from ..core.services import services
+from ..core.metrics import observe, VISION_COST
+from ..core.tracing import set_attributes, traced
+from .palette import image_palette
+from .color_names import ColorNamer
+from .results import Color, DetectedObject, FashionItem, Label, NamedColor, RGB, Vertex, WebEntity
+from . import taxonomy
+
+if TYPE_CHECKING:
+    from google.cloud import vision
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -15,29 +26,45 @@ class VisionAI:
     
     _client = None
     
-    # Clothing item categories
-    CLOTHING_CATEGORIES = [
-        "shirt", "t-shirt", "dress", "pants", "jeans", "shorts", "skirt",
-        "jacket", "coat", "sweater", "hoodie", "blazer", "suit", "tie",
-        "shoes", "sneakers", "heels", "boots", "sandals", "hat", "cap",
-        "sunglasses", "glasses", "watch", "bracelet", "necklace", "earrings",
-        "ring", "bag", "handbag", "backpack", "wallet", "belt", "scarf"
-    ]
-    
-    # Pattern types
-    PATTERN_TYPES = [
-        "solid", "striped", "plaid", "checkered", "dotted", "floral",
-        "geometric", "animal_print", "camouflage", "logo", "graphic"
-    ]
-    
-    # Style categories
-    STYLE_CATEGORIES = [
-        "casual", "formal", "business", "sporty", "athletic", "streetwear",
-        "vintage", "bohemian", "preppy", "punk", "minimalist", "luxury"
-    ]
+    # Maximum images per batch_annotate_images request
+    BATCH_ANNOTATE_LIMIT = 16
+    
+    # Clothing item categories, pattern types and style categories (see taxonomy.py)
+    CLOTHING_CATEGORIES = taxonomy.CLOTHING_CATEGORIES
+    PATTERN_TYPES = taxonomy.PATTERN_TYPES
+    STYLE_CATEGORIES = taxonomy.STYLE_CATEGORIES
+    
+    # Vision list prices per 1000 units (USD, first paid tier), for cost estimates
+    FEATURE_COSTS_PER_1000 = {
+        "LABEL_DETECTION": 1.50,
+        "OBJECT_LOCALIZATION": 2.25,
+        "IMAGE_PROPERTIES": 1.50,
+        "WEB_DETECTION": 3.50,
+        "PRODUCT_SEARCH": 4.50,
+    }
+    
+    # Feature profiles for analyze_image, as {feature: max_results}
+    FEATURE_PROFILES = {
+        "fast": {"LABEL_DETECTION": 10, "OBJECT_LOCALIZATION": 10},
+        "standard": {"LABEL_DETECTION": 10, "OBJECT_LOCALIZATION": 10, "WEB_DETECTION": 10},
+        "full": {"LABEL_DETECTION": 10, "WEB_DETECTION": 10, "OBJECT_LOCALIZATION": 10, "PRODUCT_SEARCH": 10},
+    }
+    
+    # Features the adaptive profile adds when the fast ones find no fashion items
+    ADAPTIVE_ESCALATION = {"WEB_DETECTION": 10, "PRODUCT_SEARCH": 10}
+    
+    PROFILES = (*FEATURE_PROFILES, "adaptive")
+    
+    # Per-profile request counts, latency and estimated cost (see profile_stats)
+    _profile_stats: Dict[str, Dict[str, float]] = {}
     
     def __init__(self):
         """Initialize Google Vision AI client"""
+        # Imported here, as with every use of the SDK in this module: the
+        # Vision client library and grpc are a large slice of the app's
+        # import time and only calls to the API need them
+        from google.cloud import vision
+        from google.oauth2 import service_account
         try:
             # Check if we have service account credentials
             if hasattr(settings, "GCP_SERVICE_ACCOUNT_KEY_PATH") and settings.GCP_SERVICE_ACCOUNT_KEY_PATH:
@@ -58,18 +85,21 @@ class VisionAI:
     
     @classmethod
     def get_client(cls):
-        """Get or create Vision AI client"""
+        """Get the Vision AI client, creating the shared instance on first use"""
         if cls._client is None:
-            try:
-                cls._client = vision.ImageAnnotatorClient()
-                logger.info("Vision AI client initialized")
-            except Exception as e:
-                logger.error(f"Failed to initialize Vision AI client: {str(e)}")
-                raise
+            services.get("vision")
         return cls._client
     
     @classmethod
-    async def detect_labels(cls, image_content: bytes) -> List[Dict[str, Any]]:
+    def close_client(cls, instance=None):
+        """Close the Vision AI client's channel"""
+        if cls._client is not None:
+            cls._client.transport.close()
+            cls._client = None
+    
+    @classmethod
+    @traced()
+    async def detect_labels(cls, image_content: bytes) -> List[Label]:
         """
         Detect labels in an image
         
@@ -79,19 +109,14 @@ class VisionAI:
         Returns:
             List of detected labels with scores
         """
+        from google.cloud import vision
         client = cls.get_client()
         image = vision.Image(content=image_content)
         
         try:
-            response = client.label_detection(image=image)
-            labels = []
-            
-            for label in response.label_annotations:
-                labels.append({
-                    "description": label.description,
-                    "score": label.score,
-                    "topicality": label.topicality
-                })
+            with observe("vision", "label_detection"):
+                response = await run_in_threadpool(client.label_detection, image=image)
+            labels = cls._labels_from_response(response)
             
             logger.info(f"Detected {len(labels)} labels in image")
             return labels
@@ -100,7 +125,8 @@ class VisionAI:
             raise
     
     @classmethod
-    async def detect_objects(cls, image_content: bytes) -> List[Dict[str, Any]]:
+    @traced()
+    async def detect_objects(cls, image_content: bytes) -> List[DetectedObject]:
         """
         Detect objects in an image
         
@@ -110,28 +136,14 @@ class VisionAI:
         Returns:
             List of detected objects with bounding boxes
         """
+        from google.cloud import vision
         client = cls.get_client()
         image = vision.Image(content=image_content)
         
         try:
-            response = client.object_localization(image=image)
-            objects = []
-            
-            for obj in response.localized_object_annotations:
-                # Convert normalized vertices to pixel coordinates
-                # Note: In a real app, you'd use the actual image dimensions
-                vertices = []
-                for vertex in obj.bounding_poly.normalized_vertices:
-                    vertices.append({
-                        "x": vertex.x,
-                        "y": vertex.y
-                    })
-                
-                objects.append({
-                    "name": obj.name,
-                    "score": obj.score,
-                    "vertices": vertices
-                })
+            with observe("vision", "object_localization"):
+                response = await run_in_threadpool(client.object_localization, image=image)
+            objects = cls._objects_from_response(response)
             
             logger.info(f"Detected {len(objects)} objects in image")
             return objects
@@ -139,57 +151,199 @@ class VisionAI:
             logger.error(f"Failed to detect objects: {str(e)}")
             raise
     
+    @staticmethod
+    def _pb(response):
+        """
+        The protobuf message behind a proto-plus AnnotateImageResponse
+        
+        Fields of the raw message are read by the C extension, an order of
+        magnitude faster than through the proto-plus wrapper.
+        """
+        from google.cloud import vision
+        return vision.AnnotateImageResponse.pb(response, coerce=True)
+    
     @classmethod
-    async def analyze_clothing(cls, image_content: bytes) -> List[Dict[str, Any]]:
+    def _labels_from_response(cls, response, scale: float = 1.0) -> List[Label]:
+        """
+        Convert the label annotations of an AnnotateImageResponse to labels
+        
+        Args:
+            response: AnnotateImageResponse
+            scale: Score multiplier; 100 reports scores as percentages
+        """
+        annotations = cls._pb(response).label_annotations
+        if scale == 1.0:
+            return [Label(label.description, label.score, label.topicality) for label in annotations]
+        return [
+            Label(label.description, round(label.score * scale, 2), round(label.topicality * scale, 2))
+            for label in annotations
+        ]
+    
+    @classmethod
+    def _objects_from_response(cls, response, scale: float = 1.0) -> List[DetectedObject]:
+        """
+        Convert the localized objects of an AnnotateImageResponse to objects
+        
+        Vertices are normalized to the image size (0-1).
+        
+        Args:
+            response: AnnotateImageResponse
+            scale: Score multiplier; 100 reports scores as percentages
+        """
+        return [
+            DetectedObject(
+                obj.name,
+                obj.score if scale == 1.0 else round(obj.score * scale, 2),
+                [Vertex(vertex.x, vertex.y) for vertex in obj.bounding_poly.normalized_vertices]
+            )
+            for obj in cls._pb(response).localized_object_annotations
+        ]
+    
+    @classmethod
+    def batch_annotate(cls, image_contents: List[bytes], features: List["vision.Feature"]) -> List[Any]:
+        """
+        Annotate many images with as few RPCs as possible
+        
+        Images are sent in chunks of BATCH_ANNOTATE_LIMIT, the most the
+        Vision API accepts per batch_annotate_images call. This is a
+        blocking call; run it in a thread from async code.
+        
+        Args:
+            image_contents: Images as bytes
+            features: Features to request for every image
+            
+        Returns:
+            One AnnotateImageResponse per image, in input order
+        """
+        from google.cloud import vision
+        client = cls.get_client()
+        responses = []
+        
+        for start in range(0, len(image_contents), cls.BATCH_ANNOTATE_LIMIT):
+            chunk = image_contents[start:start + cls.BATCH_ANNOTATE_LIMIT]
+            with observe("vision", "batch_annotate"):
+                batch = client.batch_annotate_images(requests=[
+                    {"image": vision.Image(content=content), "features": features}
+                    for content in chunk
+                ])
+            responses.extend(batch.responses)
+        
+        logger.info(f"Annotated {len(image_contents)} images in batches of {cls.BATCH_ANNOTATE_LIMIT}")
+        return responses
+    
+    @classmethod
+    @traced()
+    def analyze_clothing_batch(cls, image_contents: List[bytes]) -> List[Dict[str, Any]]:
+        """
+        Analyze clothing items in many images using batched annotation
+        
+        This is a blocking call; run it in a thread from async code.
+        
+        Args:
+            image_contents: Images as bytes
+            
+        Returns:
+            Per image, in input order: {"analysis": [...]} with the clothing
+            items, or {"error": message} if that image failed
+        """
+        from google.cloud import vision
+        features = [
+            vision.Feature(type_=vision.Feature.Type.LABEL_DETECTION),
+            vision.Feature(type_=vision.Feature.Type.OBJECT_LOCALIZATION),
+        ]
+        results = []
+        
+        for response in cls.batch_annotate(image_contents, features):
+            if response.error.message:
+                results.append({"error": response.error.message})
+                continue
+            labels = cls._labels_from_response(response)
+            objects = cls._objects_from_response(response)
+            results.append({"analysis": cls.build_clothing_items(labels, objects)})
+        
+        return results
+    
+    @classmethod
+    @traced()
+    async def analyze_clothing(cls, image_content: bytes, profile: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Analyze clothing items in an image
         
         Args:
             image_content: Image content as bytes
+            profile: Optional feature profile (see annotate); without one
+                only labels and objects are requested
             
         Returns:
             List of detected clothing items with attributes
         """
-        # Get general labels
-        labels = await cls.detect_labels(image_content)
+        if profile:
+            results = await cls.annotate(image_content, profile)
+            return cls.build_clothing_items(results["labels"], results["objects"])
+        
+        # Get general labels and object locations concurrently
+        labels, objects = await asyncio.gather(
+            cls.detect_labels(image_content),
+            cls.detect_objects(image_content)
+        )
         
-        # Get object locations
-        objects = await cls.detect_objects(image_content)
+        return cls.build_clothing_items(labels, objects)
+    
+    @classmethod
+    def build_clothing_items(
+        cls,
+        labels: List[Label],
+        objects: List[DetectedObject]
+    ) -> List[Dict[str, Any]]:
+        """
+        Build clothing items from detected labels and objects
         
+        Args:
+            labels: Output of detect_labels
+            objects: Output of detect_objects
+            
+        Returns:
+            List of detected clothing items with attributes
+        """
         # Filter objects and labels related to clothing
         clothing_items = []
         
+        # Scan every label once; colors, pattern and style come from all labels
+        label_matches = cls._scan_labels(labels)
+        colors = cls._extract_colors(label_matches)
+        pattern = cls._extract_pattern(label_matches)
+        style = cls._extract_style(label_matches)
+        
+        # Index labels by the garment terms they mention, so each object
+        # finds its related labels with a lookup per term
+        labels_by_term: Dict[str, List[int]] = {}
+        for index, matches in enumerate(label_matches):
+            for term in cls._garment_terms(matches):
+                labels_by_term.setdefault(term, []).append(index)
+        
         # Process detected objects
         for obj in objects:
+            object_matches = taxonomy.scan(obj.name)
             # Check if object is a clothing item
-            if any(category.lower() in obj["name"].lower() for category in cls.CLOTHING_CATEGORIES):
-                # Find potential matching labels for additional info
-                matching_labels = [
-                    label for label in labels 
-                    if label["description"].lower() in obj["name"].lower() 
-                    or obj["name"].lower() in label["description"].lower()
-                ]
-                
-                # Extract color from labels (in a real app, this would be more sophisticated)
-                colors = cls._extract_colors(labels)
-                
-                # Extract patterns from labels
-                pattern = cls._extract_pattern(labels)
-                
-                # Extract style from labels
-                style = cls._extract_style(labels)
+            if taxonomy.has(object_matches, taxonomy.CATEGORY):
+                # Labels sharing a garment term with the object, in label order
+                related = sorted({
+                    index
+                    for term in cls._garment_terms(object_matches)
+                    for index in labels_by_term.get(term, ())
+                })
                 
                 # Create clothing item entry
                 item = {
-                    "type": obj["name"],
-                    "confidence": obj["score"],
-                    "bounding_box": obj["vertices"],
+                    "type": obj.name,
+                    "confidence": obj.score,
+                    "bounding_box": obj.bounding_poly,
                     "attributes": {
-                        "colors": colors,
+                        "colors": list(colors),
                         "pattern": pattern,
                         "style": style
                     },
-                    "related_labels": [label["description"] for label in matching_labels]
+                    "related_labels": [labels[index].description for index in related]
                 }
                 
                 clothing_items.append(item)
@@ -198,81 +352,234 @@ class VisionAI:
         return clothing_items
     
     @classmethod
-    def _extract_colors(cls, labels: List[Dict[str, Any]]) -> List[str]:
-        """Extract color information from labels"""
-        # Common colors - in a real app, this would be more comprehensive
-        common_colors = [
-            "red", "blue", "green", "yellow", "black", "white", "pink",
-            "purple", "orange", "brown", "gray", "navy", "teal", "gold", "silver"
-        ]
+    def local_colors(cls) -> bool:
+        """Whether dominant colors are extracted locally instead of by IMAGE_PROPERTIES"""
+        return getattr(settings, "COLOR_EXTRACTION", "local") != "vision"
+    
+    @classmethod
+    @traced()
+    async def detect_colors(cls, image_content: bytes) -> List[Color]:
+        """
+        Detect the color palette of an image
         
+        Uses the local Lab palette extractor unless COLOR_EXTRACTION is
+        "vision", in which case the paid IMAGE_PROPERTIES feature is used.
+        
+        Args:
+            image_content: Image content as bytes
+            
+        Returns:
+            Colors, in the format of _process_colors
+        """
+        if cls.local_colors():
+            return await run_in_threadpool(image_palette, image_content)
+        
+        from google.cloud import vision
+        client = cls.get_client()
+        with observe("vision", "image_properties"):
+            response = await run_in_threadpool(
+                client.image_properties, image=vision.Image(content=image_content)
+            )
+        return cls._process_colors(cls._pb(response).image_properties_annotation.dominant_colors.colors)
+    
+    @classmethod
+    @traced()
+    async def detect_dominant_colors(cls, image_content: bytes) -> List[NamedColor]:
+        """
+        Detect the dominant colors of an image
+        
+        Args:
+            image_content: Image content as bytes
+            
+        Returns:
+            Named dominant colors, most prominent first
+        """
+        try:
+            colors = await cls.detect_colors(image_content)
+            return cls._extract_dominant_colors(colors)
+        except Exception as e:
+            logger.error(f"Failed to detect dominant colors: {str(e)}")
+            raise
+    
+    @classmethod
+    def _scan_labels(cls, labels: List[Label]) -> List[Tuple[taxonomy.Match, ...]]:
+        """Find the taxonomy terms in each label, one pass per label"""
+        return [taxonomy.scan(label.description) for label in labels]
+    
+    @staticmethod
+    def _garment_terms(matches: Tuple[taxonomy.Match, ...]) -> Set[str]:
+        """Garment words (categories and terms like footwear) in scanned text, nested ones included"""
+        return {match.value for match in matches if match.kind == taxonomy.FASHION}
+    
+    @classmethod
+    def _extract_colors(cls, label_matches: List[Tuple[taxonomy.Match, ...]]) -> List[str]:
+        """Extract color names mentioned in labels"""
         colors = []
-        for label in labels:
-            description = label["description"].lower()
-            for color in common_colors:
-                if color in description:
-                    colors.append(color)
+        for matches in label_matches:
+            colors.extend(taxonomy.values(matches, taxonomy.COLOR))
         
-        return list(set(colors))  # Remove duplicates
+        return list(dict.fromkeys(colors))  # Remove duplicates, keep label order
     
     @classmethod
-    def _extract_pattern(cls, labels: List[Dict[str, Any]]) -> Optional[str]:
+    def _extract_pattern(cls, label_matches: List[Tuple[taxonomy.Match, ...]]) -> Optional[str]:
         """Extract pattern information from labels"""
-        for label in labels:
-            description = label["description"].lower()
-            for pattern in cls.PATTERN_TYPES:
-                if pattern.lower().replace("_", " ") in description:
-                    return pattern
+        for matches in label_matches:
+            pattern = taxonomy.first(matches, taxonomy.PATTERN)
+            if pattern:
+                return pattern
         
         # Default to solid if no pattern detected
         return "solid"
     
     @classmethod
-    def _extract_style(cls, labels: List[Dict[str, Any]]) -> Optional[str]:
+    def _extract_style(cls, label_matches: List[Tuple[taxonomy.Match, ...]]) -> Optional[str]:
         """Extract style information from labels"""
-        for label in labels:
-            description = label["description"].lower()
-            for style in cls.STYLE_CATEGORIES:
-                if style.lower() in description:
-                    return style
+        for matches in label_matches:
+            style = taxonomy.first(matches, taxonomy.STYLE)
+            if style:
+                return style
         
         # Default to casual if no specific style detected
         return "casual"
     
     @classmethod
-    async def analyze_image(cls, image_content: bytes) -> Dict[str, Any]:
+    def _features(cls, feature_map: Dict[str, Optional[int]]) -> List["vision.Feature"]:
+        """Build Feature messages from {feature name: max_results}"""
+        from google.cloud import vision
+        return [
+            vision.Feature(type_=getattr(vision.Feature.Type, name), max_results=max_results)
+            if max_results else vision.Feature(type_=getattr(vision.Feature.Type, name))
+            for name, max_results in feature_map.items()
+        ]
+    
+    @classmethod
+    def _estimate_cost(cls, feature_map: Dict[str, Optional[int]]) -> float:
+        """Estimated list price of one image annotated with these features (USD)"""
+        return sum(cls.FEATURE_COSTS_PER_1000.get(name, 0.0) for name in feature_map) / 1000
+    
+    @classmethod
+    def _record_profile(cls, profile: str, latency: float, cost: float, escalated: bool):
+        stats = cls._profile_stats.setdefault(profile, {
+            "requests": 0, "escalations": 0, "total_latency": 0.0, "max_latency": 0.0, "total_cost": 0.0
+        })
+        stats["requests"] += 1
+        stats["escalations"] += int(escalated)
+        stats["total_latency"] += latency
+        stats["max_latency"] = max(stats["max_latency"], latency)
+        stats["total_cost"] += cost
+        VISION_COST.labels(profile).inc(cost)
+    
+    @classmethod
+    def profile_stats(cls) -> Dict[str, Dict[str, float]]:
+        """Latency and estimated cost per feature profile since startup"""
+        return {
+            profile: {
+                "requests": stats["requests"],
+                "escalations": stats["escalations"],
+                "avg_latency_ms": round(stats["total_latency"] / stats["requests"] * 1000, 1),
+                "max_latency_ms": round(stats["max_latency"] * 1000, 1),
+                "total_cost_usd": round(stats["total_cost"], 4),
+                "avg_cost_usd": round(stats["total_cost"] / stats["requests"], 5),
+            }
+            for profile, stats in cls._profile_stats.items()
+        }
+    
+    @classmethod
+    async def _annotate(
+        cls,
+        image: "vision.Image",
+        profile: Optional[str],
+        image_content: Optional[bytes] = None,
+        scale: float = 100
+    ) -> Dict[str, Any]:
+        """
+        Annotate an image with a feature profile and process the response
+        
+        The adaptive profile requests the fast features first and makes a
+        second request for ADAPTIVE_ESCALATION only if they find no
+        fashion items. Colors are extracted locally when the image bytes
+        are available (see local_colors), otherwise IMAGE_PROPERTIES is
+        requested.
+        """
+        profile = profile or getattr(settings, "VISION_PROFILE", "full")
+        if profile not in cls.PROFILES:
+            raise ValueError(f"Unknown Vision feature profile: {profile}")
+        client = cls.get_client()
+        
+        feature_map = dict(cls.FEATURE_PROFILES["fast" if profile == "adaptive" else profile])
+        colors = None
+        if image_content is not None and cls.local_colors():
+            colors = await run_in_threadpool(image_palette, image_content)
+        else:
+            feature_map["IMAGE_PROPERTIES"] = None
+        
+        started = time.perf_counter()
+        with observe("vision", f"annotate:{profile}"):
+            response = await run_in_threadpool(
+                client.annotate_image, {"image": image, "features": cls._features(feature_map)}
+            )
+        results = cls._process_vision_response(response, colors=colors, scale=scale)
+        
+        escalated = profile == "adaptive" and not results["fashion_items"]
+        if escalated:
+            with observe("vision", "annotate:escalation"):
+                extra = await run_in_threadpool(
+                    client.annotate_image, {"image": image, "features": cls._features(cls.ADAPTIVE_ESCALATION)}
+                )
+            response.web_detection = extra.web_detection
+            response.product_search_results = extra.product_search_results
+            feature_map.update(cls.ADAPTIVE_ESCALATION)
+            results = cls._process_vision_response(response, colors=colors, scale=scale)
+        latency = time.perf_counter() - started
+        
+        cost = cls._estimate_cost(feature_map)
+        cls._record_profile(profile, latency, cost, escalated)
+        set_attributes({"vision.profile": profile, "vision.escalated": escalated, "vision.estimated_cost_usd": cost})
+        results["vision_profile"] = {
+            "profile": profile,
+            "features": list(feature_map),
+            "escalated": escalated,
+            "latency_ms": round(latency * 1000, 1),
+            "estimated_cost_usd": round(cost, 5),
+        }
+        return results
+    
+    @classmethod
+    @traced()
+    async def annotate(cls, image_content: bytes, profile: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Annotate an image with a feature profile
+        
+        Same results as analyze_image, but scores are fractions as from
+        detect_labels and detect_objects, and failures raise.
+        
+        Args:
+            image_content: Image content as bytes
+            profile: Feature profile (fast, standard, full or adaptive),
+                defaults to settings.VISION_PROFILE
+        """
+        from google.cloud import vision
+        return await cls._annotate(vision.Image(content=image_content), profile, image_content, scale=1.0)
+    
+    @classmethod
+    @traced()
+    async def analyze_image(cls, image_content: bytes, profile: Optional[str] = None) -> Dict[str, Any]:
         """
         Perform comprehensive image analysis using multiple Vision AI features
         
         Args:
             image_content: Image content as bytes
+            profile: Feature profile (fast, standard, full or adaptive),
+                defaults to settings.VISION_PROFILE
             
         Returns:
             Dictionary with analysis results from multiple vision features
         """
-        client = cls.get_client()
-        image = vision.Image(content=image_content)
-        
+        from google.cloud import vision
         try:
-            # Request features
-            features = [
-                vision.Feature(type_=vision.Feature.Type.LABEL_DETECTION, max_results=10),
-                vision.Feature(type_=vision.Feature.Type.WEB_DETECTION, max_results=10),
-                vision.Feature(type_=vision.Feature.Type.OBJECT_LOCALIZATION, max_results=10),
-                vision.Feature(type_=vision.Feature.Type.IMAGE_PROPERTIES),
-                vision.Feature(type_=vision.Feature.Type.PRODUCT_SEARCH, max_results=10),
-            ]
+            results = await cls._annotate(vision.Image(content=image_content), profile, image_content)
             
-            # Perform batch annotation
-            response = client.annotate_image({
-                'image': image,
-                'features': features,
-            })
-            
-            # Process and structure results
-            results = cls._process_vision_response(response)
-            
-            logger.info(f"Completed comprehensive image analysis")
+            logger.info(f"Completed comprehensive image analysis ({results['vision_profile']['profile']})")
             return results
             
         except Exception as e:
@@ -280,42 +587,28 @@ class VisionAI:
             return {"error": str(e)}
     
     @classmethod
-    async def analyze_image_from_url(cls, image_url: str) -> Dict[str, Any]:
+    @traced()
+    async def analyze_image_from_url(cls, image_url: str, profile: Optional[str] = None) -> Dict[str, Any]:
         """
         Analyze an image using its URL
         
         Args:
             image_url: URL of the image to analyze
+            profile: Feature profile (fast, standard, full or adaptive),
+                defaults to settings.VISION_PROFILE
             
         Returns:
             Dictionary with analysis results
         """
-        client = cls.get_client()
-        
+        from google.cloud import vision
         try:
             # Create image object from URL
             image = vision.Image()
             image.source.image_uri = image_url
             
-            # Request features
-            features = [
-                vision.Feature(type_=vision.Feature.Type.LABEL_DETECTION, max_results=10),
-                vision.Feature(type_=vision.Feature.Type.WEB_DETECTION, max_results=10),
-                vision.Feature(type_=vision.Feature.Type.OBJECT_LOCALIZATION, max_results=10),
-                vision.Feature(type_=vision.Feature.Type.IMAGE_PROPERTIES),
-                vision.Feature(type_=vision.Feature.Type.PRODUCT_SEARCH, max_results=10),
-            ]
+            results = await cls._annotate(image, profile)
             
-            # Perform batch annotation
-            response = client.annotate_image({
-                'image': image,
-                'features': features,
-            })
-            
-            # Process and structure results
-            results = cls._process_vision_response(response)
-            
-            logger.info(f"Completed image analysis from URL")
+            logger.info(f"Completed image analysis from URL ({results['vision_profile']['profile']})")
             return results
             
         except Exception as e:
@@ -323,104 +616,61 @@ class VisionAI:
             return {"error": str(e)}
     
     @classmethod
-    def _process_vision_response(cls, response) -> Dict[str, Any]:
-        """Process and structure the Vision AI batch annotation response"""
+    def _process_vision_response(
+        cls,
+        response,
+        colors: Optional[List[Color]] = None,
+        scale: float = 100
+    ) -> Dict[str, Any]:
+        """
+        Process and structure the Vision AI batch annotation response
+        
+        Args:
+            response: AnnotateImageResponse
+            colors: Locally extracted palette, used instead of image properties
+            scale: Score multiplier for labels, objects and web entities
+        """
         result = {
-            "labels": [],
+            "labels": cls._labels_from_response(response, scale=scale),
             "web_entities": [],
             "web_labels": [],
             "colors": [],
-            "objects": [],
+            "objects": cls._objects_from_response(response, scale=scale),
             "fashion_items": [],
         }
         
-        # Process label annotations
-        if response.label_annotations:
-            result["labels"] = [
-                {
-                    "description": label.description, 
-                    "score": round(label.score * 100, 2),
-                    "topicality": round(label.topicality * 100, 2)
-                } 
-                for label in response.label_annotations
-            ]
+        pb = cls._pb(response)
         
         # Process web detection
         if response.web_detection:
             # Web entities
-            if response.web_detection.web_entities:
+            if pb.web_detection.web_entities:
                 result["web_entities"] = [
-                    {
-                        "description": entity.description,
-                        "score": round(entity.score * 100, 2) if entity.score else None
-                    }
-                    for entity in response.web_detection.web_entities
+                    WebEntity(entity.description, round(entity.score * scale, 2) if entity.score else None)
+                    for entity in pb.web_detection.web_entities
                 ]
             
             # Web labels
-            if response.web_detection.best_guess_labels:
+            if pb.web_detection.best_guess_labels:
                 result["web_labels"] = [
                     {"label": label.label} 
-                    for label in response.web_detection.best_guess_labels
+                    for label in pb.web_detection.best_guess_labels
                 ]
         
         # Process color information
-        if response.image_properties:
-            colors = response.image_properties.dominant_colors.colors
-            result["colors"] = [
-                {
-                    "color": {
-                        "red": color.color.red,
-                        "green": color.color.green,
-                        "blue": color.color.blue
-                    },
-                    "score": round(color.score * 100, 2),
-                    "pixel_fraction": round(color.pixel_fraction * 100, 2),
-                    "hex": "#{:02x}{:02x}{:02x}".format(
-                        color.color.red, color.color.green, color.color.blue
-                    )
-                }
-                for color in colors
-            ]
-        
-        # Process object localization
-        if response.localized_object_annotations:
-            result["objects"] = [
-                {
-                    "name": obj.name,
-                    "score": round(obj.score * 100, 2),
-                    "bounding_poly": [
-                        {"x": vertex.x, "y": vertex.y}
-                        for vertex in obj.bounding_poly.normalized_vertices
-                    ]
-                }
-                for obj in response.localized_object_annotations
-            ]
-        
-        # Extract fashion-specific information
-        fashion_keywords = set(cls.CLOTHING_CATEGORIES) | {
-            "APPAREL", "CLOTHING", "DRESS", "SHIRT", "PANTS", "JEANS", "JACKET", 
-            "COAT", "FOOTWEAR", "SHOE", "SNEAKER", "BAG", "HANDBAG", "ACCESSORY",
-            "WATCH", "JEWELRY", "GLASSES", "SUNGLASSES", "HAT"
-        }
+        if colors is not None:
+            result["colors"] = colors
+        elif response.image_properties_annotation:
+            result["colors"] = cls._process_colors(pb.image_properties_annotation.dominant_colors.colors)
         
-        # Extract fashion items from labels and objects
+        # Extract fashion items from labels and objects (taxonomy terms, see taxonomy.py)
         for label in result["labels"]:
-            if any(keyword.upper() in label["description"].upper() for keyword in fashion_keywords):
-                result["fashion_items"].append({
-                    "type": "label",
-                    "name": label["description"],
-                    "confidence": label["score"]
-                })
+            if taxonomy.has(taxonomy.scan(label.description), taxonomy.FASHION):
+                result["fashion_items"].append(FashionItem("label", label.description, label.score, None))
         
         for obj in result["objects"]:
-            if any(keyword.upper() in obj["name"].upper() for keyword in fashion_keywords):
-                result["fashion_items"].append({
-                    "type": "object",
-                    "name": obj["name"],
-                    "confidence": obj["score"],
-                    "location": obj["bounding_poly"]
-                })
+            if taxonomy.has(taxonomy.scan(obj.name), taxonomy.FASHION):
+                result["fashion_items"].append(FashionItem("object", obj.name, obj.score, obj.bounding_poly))
         
         # Get dominant colors in more readable format
         result["dominant_colors"] = cls._extract_dominant_colors(result["colors"])
@@ -431,52 +681,33 @@ class VisionAI:
         return result
     
     @classmethod
-    def _extract_dominant_colors(cls, colors: List[Dict]) -> List[Dict]:
+    def _process_colors(cls, colors) -> List[Color]:
+        """Convert Vision ColorInfo messages (proto-plus or raw) to colors"""
+        processed = []
+        for info in colors:
+            red, green, blue = info.color.red, info.color.green, info.color.blue
+            processed.append(Color(
+                RGB(red, green, blue),
+                round(info.score * 100, 2),
+                round(info.pixel_fraction * 100, 2),
+                "#{:02x}{:02x}{:02x}".format(int(red), int(green), int(blue))
+            ))
+        return processed
+    
+    @classmethod
+    def _extract_dominant_colors(cls, colors: List[Color]) -> List[NamedColor]:
         """Extract dominant colors in a more user-friendly format"""
         if not colors:
             return []
         
         # Get the most prominent colors (top 5)
-        top_colors = sorted(colors, key=lambda x: x["score"], reverse=True)[:5]
+        top_colors = sorted(colors, key=lambda x: x.score, reverse=True)[:5]
         
-        # Map colors to common color names
-        color_names = []
-        for color in top_colors:
-            r, g, b = color["color"]["red"], color["color"]["green"], color["color"]["blue"]
-            
-            # Simple color name mapping (this could be improved with a more sophisticated algorithm)
-            if max(r, g, b) < 50:
-                name = "black"
-            elif min(r, g, b) > 200:
-                name = "white"
-            elif r > max(g, b) + 50:
-                name = "red"
-            elif g > max(r, b) + 50:
-                name = "green"
-            elif b > max(r, g) + 50:
-                name = "blue"
-            elif r > 200 and g > 150 and b < 50:
-                name = "yellow"
-            elif r > 200 and g < 100 and b > 150:
-                name = "pink"
-            elif r > 150 and g > 100 and b < 50:
-                name = "orange"
-            elif r > 100 and g < 100 and b > 100:
-                name = "purple"
-            elif r < 50 and g > 100 and b > 100:
-                name = "teal"
-            elif r > 100 and g > 100 and b < 50:
-                name = "brown"
-            else:
-                name = "gray"
-            
-            color_names.append({
-                "name": name,
-                "hex": color["hex"],
-                "score": color["score"]
-            })
-        
-        return color_names
+        # Map colors to fashion color names (CIEDE2000 lookup table)
+        return [
+            NamedColor(ColorNamer.name(color.color.red, color.color.green, color.color.blue), color.hex, color.score)
+            for color in top_colors
+        ]
     
     @classmethod
     def _generate_search_terms(cls, analysis_results: Dict) -> List[str]:
@@ -485,29 +716,30 @@ class VisionAI:
         
         # Add all fashion items
         for item in analysis_results["fashion_items"]:
-            search_terms.append(item["name"])
+            search_terms.append(item.name)
         
         # Add top 3 labels
-        top_labels = sorted(analysis_results["labels"], key=lambda x: x["score"], reverse=True)[:3]
+        top_labels = sorted(analysis_results["labels"], key=lambda x: x.score, reverse=True)[:3]
         for label in top_labels:
-            if label["description"] not in search_terms:
-                search_terms.append(label["description"])
+            if label.description not in search_terms:
+                search_terms.append(label.description)
         
         # Add top web entity
         if analysis_results["web_entities"] and len(analysis_results["web_entities"]) > 0:
-            top_entity = analysis_results["web_entities"][0]["description"]
+            top_entity = analysis_results["web_entities"][0].description
             if top_entity not in search_terms:
                 search_terms.append(top_entity)
         
         # Add top color
         if analysis_results["dominant_colors"] and len(analysis_results["dominant_colors"]) > 0:
-            top_color = analysis_results["dominant_colors"][0]["name"]
+            top_color = analysis_results["dominant_colors"][0].name
             # Combine top color with top fashion item
             if analysis_results["fashion_items"] and len(analysis_results["fashion_items"]) > 0:
-                color_term = f"{top_color} {analysis_results['fashion_items'][0]['name']}"
+                color_term = f"{top_color} {analysis_results['fashion_items'][0].name}"
                 search_terms.append(color_term)
         
         return search_terms[:5]  # Limit to 5 search terms
 
-# Create instance
-vision_client = VisionAI() 
\ No newline at end of file
+# Shared instance, constructed on first use (see core/services.py)
+services.register("vision", VisionAI, close=VisionAI.close_client)
+vision_client = services.lazy("vision") 
\ No newline at end of file
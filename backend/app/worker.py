@@ -0,0 +1,72 @@
+"""
+Background job worker.
+
+Runs a pool of worker processes, each consuming the Redis job queue with
+several concurrent consumers. Jobs are queued by the API (e.g. image
+analysis after /upload/), so the API and the workers must share a Redis
+server; the in-memory cache backend cannot be used across processes.
+
+Usage (from backend/):
+    python -m app.worker --processes 2 --concurrency 4
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+
+from .core.cache import cache
+from .core.config import settings
+from .core.jobs import job_queue
+from .core.services import services
+from .core.tracing import setup_tracing, shutdown_tracing
+
+logger = logging.getLogger(__name__)
+
+async def _work(concurrency: int):
+    # Importing the services registers their job handlers
+    from .services import analysis  # noqa: F401
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    # Clients and the tracer are set up in each worker process after the fork, never in the parent
+    setup_tracing("fashionai-worker")
+    await services.start(settings.SERVICES_PRELOAD.split(","))
+
+    logger.info(f"Worker started with {concurrency} consumers")
+    await job_queue.work(concurrency=concurrency, stop=stop)
+    await services.close()
+    await cache.disconnect()
+    shutdown_tracing()
+    logger.info("Worker stopped")
+
+def run_worker(concurrency: int):
+    """Entry point of a single worker process"""
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_work(concurrency))
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--processes", type=int, default=settings.WORKER_PROCESSES)
+    parser.add_argument("--concurrency", type=int, default=settings.WORKER_CONCURRENCY)
+    args = parser.parse_args()
+
+    if settings.CACHE_BACKEND == "memory":
+        raise SystemExit("Workers need a shared Redis server; CACHE_BACKEND=memory is per-process")
+
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(args.concurrency,), name=f"worker-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    # Children handle SIGINT/SIGTERM themselves; the parent just waits
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Dominant-color benchmark: local Lab palette vs Vision IMAGE_PROPERTIES.
+
+Times the local extractor (decode + cluster) per image and measures how
+well its palette agrees with a reference palette. Agreement is the mean
+CIE76 distance (delta E) from each reference color to the nearest local
+color, weighted by the reference pixel fraction; below ~5 is hard to tell
+apart, below ~10 names the same color. "top1" is the share of images
+whose most prominent reference color is matched within delta E 10.
+
+By default the references are synthetic outfits with a known palette. With
+--vision the same images (or --images) are sent to IMAGE_PROPERTIES and
+its colors become the reference, so this needs Google Cloud credentials.
+
+Usage (from backend/):
+    python -m benchmarks.color_palette --images 50
+    python -m benchmarks.color_palette --image-dir ./samples --vision
+"""
+import argparse
+import io
+import os
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.services.palette import image_palette, rgb_to_lab
+from app.services.results import Color, RGB
+
+def _synthetic_image(rng: np.random.Generator, size: int = 768):
+    """An image of horizontal garment bands with noise, and its true palette"""
+    n_colors = int(rng.integers(2, 6))
+    colors = rng.integers(0, 256, size=(n_colors, 3))
+    fractions = rng.dirichlet(np.ones(n_colors) * 2)
+    rows = np.repeat(np.arange(n_colors), np.maximum(1, np.round(fractions * size).astype(int)))[:size]
+    rows = np.pad(rows, (0, size - len(rows)), mode="edge")
+    pixels = colors[rows][:, None, :] + rng.normal(0, 6, size=(size, size, 3))
+    pixels = np.clip(pixels, 0, 255).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=90)
+    fractions = np.bincount(rows, minlength=n_colors) / size
+    reference = [
+        Color(RGB(int(r), int(g), int(b)), float(f) * 100, float(f) * 100, "#{:02x}{:02x}{:02x}".format(r, g, b))
+        for (r, g, b), f in zip(colors, fractions)
+    ]
+    return buffer.getvalue(), reference
+
+def _lab(colors) -> np.ndarray:
+    return rgb_to_lab(np.array([
+        [c.color.red, c.color.green, c.color.blue] for c in colors
+    ], dtype=np.float32))
+
+def _agreement(reference, palette):
+    """Weighted mean delta E from reference colors to the palette, and whether the top color matched"""
+    if not reference or not palette:
+        return float("nan"), False
+    distances = np.sqrt(((_lab(reference)[:, None, :] - _lab(palette)[None, :, :]) ** 2).sum(axis=2)).min(axis=1)
+    weights = np.array([c.pixel_fraction for c in reference])
+    top = int(np.argmax(weights))
+    return float((distances * weights).sum() / max(weights.sum(), 1e-9)), bool(distances[top] < 10)
+
+def _vision_colors(content: bytes):
+    from google.cloud import vision
+    from app.services.vision import VisionAI
+
+    client = VisionAI.get_client()
+    response = client.image_properties(image=vision.Image(content=content))
+    return VisionAI._process_colors(response.image_properties_annotation.dominant_colors.colors)
+
+def _load_images(args):
+    if args.image_dir:
+        names = sorted(os.listdir(args.image_dir))
+        for name in names[:args.images]:
+            with open(os.path.join(args.image_dir, name), "rb") as f:
+                yield name, f.read(), None
+        return
+    rng = np.random.default_rng(args.seed)
+    for index in range(args.images):
+        content, reference = _synthetic_image(rng)
+        yield f"synthetic-{index}", content, reference
+
+def main(args):
+    local_ms, vision_ms, delta_es, top_hits = [], [], [], []
+
+    for name, content, reference in _load_images(args):
+        started = time.perf_counter()
+        palette = image_palette(content)
+        local_ms.append((time.perf_counter() - started) * 1000)
+
+        if args.vision:
+            started = time.perf_counter()
+            reference = _vision_colors(content)
+            vision_ms.append((time.perf_counter() - started) * 1000)
+        if reference is None:
+            continue
+        delta_e, top_hit = _agreement(reference, palette)
+        delta_es.append(delta_e)
+        top_hits.append(top_hit)
+
+    print(f"{len(local_ms)} images, reference={'vision' if args.vision else 'synthetic'}")
+    print(f"local   median={statistics.median(local_ms):.1f}ms p95={np.percentile(local_ms, 95):.1f}ms")
+    if vision_ms:
+        print(f"vision  median={statistics.median(vision_ms):.1f}ms p95={np.percentile(vision_ms, 95):.1f}ms")
+    if delta_es:
+        print(f"agreement mean dE={statistics.mean(delta_es):.2f} median dE={statistics.median(delta_es):.2f} "
+              f"top1={100 * sum(top_hits) / len(top_hits):.0f}%")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=50, help="number of images")
+    parser.add_argument("--image-dir", default=None, help="benchmark real images instead of synthetic ones")
+    parser.add_argument("--vision", action="store_true", help="use Vision IMAGE_PROPERTIES as the reference")
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
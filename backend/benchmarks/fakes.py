@@ -0,0 +1,448 @@
+"""
+Local stand-ins for the upstream services, for offline load tests.
+
+install() swaps every external dependency of the API for an in-process
+fake with a configurable latency, so the real routes, service classes and
+middleware run unchanged:
+
+- Vision: canned AnnotateImageResponses (labels, objects, web entities)
+- Custom Search: a discovery-style service returning shopping results
+- GCS: an in-memory bucket behind the real CloudStorage methods
+- Supabase auth: password sign-in that accepts every seeded user
+- PostgREST: an httpx transport serving in-memory tables (eq filters,
+  projection, ordering, limits, exact counts)
+- Redis: the in-process InMemoryRedis backend
+
+Blocking clients (Vision, Custom Search, GCS, Supabase auth) sleep on the
+calling thread like the real ones; PostgREST sleeps asynchronously.
+Latencies are log-normal around the configured median.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+# Median latency per upstream (milliseconds)
+DEFAULT_LATENCIES_MS = {
+    "vision": 350.0,
+    "customsearch": 250.0,
+    "gcs": 60.0,
+    "postgrest": 8.0,
+    "auth": 90.0,
+}
+
+# Spread of the log-normal latency (p99 is about 2.3x the median)
+LATENCY_SIGMA = 0.35
+
+# Canned Vision results, chosen per image by content hash
+VISION_SCENES = [
+    {
+        "labels": [("Clothing", 0.97), ("Jeans", 0.93), ("Denim", 0.91), ("Sleeve", 0.88),
+                   ("Blue", 0.84), ("Street fashion", 0.8), ("T-shirt", 0.77), ("Casual wear", 0.7)],
+        "objects": [("Pants", 0.9, (0.3, 0.45, 0.7, 0.95)), ("Top", 0.86, (0.28, 0.1, 0.72, 0.48)),
+                    ("Shoe", 0.74, (0.35, 0.9, 0.5, 0.99))],
+        "web": ["Jeans", "Denim", "Levi Strauss & Co."],
+    },
+    {
+        "labels": [("Dress", 0.96), ("Day dress", 0.9), ("Floral design", 0.84), ("Pink", 0.8),
+                   ("Fashion design", 0.76), ("Pattern", 0.72), ("Sleeve", 0.7)],
+        "objects": [("Dress", 0.92, (0.25, 0.12, 0.75, 0.9)), ("Handbag", 0.7, (0.62, 0.5, 0.8, 0.7))],
+        "web": ["Day dress", "Floral", "Sundress"],
+    },
+    {
+        "labels": [("Outerwear", 0.95), ("Jacket", 0.92), ("Leather", 0.85), ("Black", 0.83),
+                   ("Leather jacket", 0.8), ("Collar", 0.7), ("Vintage clothing", 0.62)],
+        "objects": [("Jacket", 0.91, (0.2, 0.1, 0.8, 0.6)), ("Pants", 0.8, (0.3, 0.58, 0.7, 0.98))],
+        "web": ["Leather jacket", "Biker jacket"],
+    },
+    {
+        "labels": [("Footwear", 0.97), ("Shoe", 0.95), ("Sneakers", 0.92), ("White", 0.85),
+                   ("Sportswear", 0.78), ("Walking shoe", 0.74)],
+        "objects": [("Shoe", 0.94, (0.1, 0.3, 0.55, 0.8)), ("Shoe", 0.92, (0.5, 0.32, 0.92, 0.82))],
+        "web": ["Sneakers", "Running shoe"],
+    },
+]
+
+SHOPPING_BRANDS = ["Levi's", "Zara", "H&M", "Uniqlo", "Nike", "Adidas", "Mango", "COS", "Gap", "Everlane"]
+
+class Latency:
+    """Log-normal latency around a median, slept on the calling thread or the loop"""
+
+    def __init__(self, median_ms: float, sigma: float = LATENCY_SIGMA, seed: Optional[int] = None):
+        self.median = median_ms / 1000
+        self.sigma = sigma
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        with self._lock:
+            return self.median * self._random.lognormvariate(0, self.sigma)
+
+    def sleep(self):
+        time.sleep(self.sample())
+
+    async def asleep(self):
+        await asyncio.sleep(self.sample())
+
+def _scene(content: bytes) -> Dict[str, Any]:
+    digest = hashlib.blake2b(content[:65536], digest_size=2).digest()
+    return VISION_SCENES[int.from_bytes(digest, "big") % len(VISION_SCENES)]
+
+class FakeVisionClient:
+    """ImageAnnotatorClient stand-in returning canned responses"""
+
+    def __init__(self, latency: Latency):
+        from google.cloud import vision
+
+        self._vision = vision
+        self.latency = latency
+        self.transport = SimpleNamespace(close=lambda: None)
+        self.calls = 0
+
+    def _response(self, image) -> Any:
+        vision = self._vision
+        content = image.content if hasattr(image, "content") else image["content"]
+        scene = _scene(content)
+        return vision.AnnotateImageResponse(
+            label_annotations=[
+                vision.EntityAnnotation(description=name, score=score, topicality=score)
+                for name, score in scene["labels"]
+            ],
+            localized_object_annotations=[
+                vision.LocalizedObjectAnnotation(
+                    name=name,
+                    score=score,
+                    bounding_poly=vision.BoundingPoly(normalized_vertices=[
+                        vision.NormalizedVertex(x=x0, y=y0), vision.NormalizedVertex(x=x1, y=y0),
+                        vision.NormalizedVertex(x=x1, y=y1), vision.NormalizedVertex(x=x0, y=y1),
+                    ]),
+                )
+                for name, score, (x0, y0, x1, y1) in scene["objects"]
+            ],
+            web_detection=vision.WebDetection(
+                web_entities=[
+                    vision.WebDetection.WebEntity(description=name, score=1.0 - index * 0.1)
+                    for index, name in enumerate(scene["web"])
+                ],
+                best_guess_labels=[vision.WebDetection.WebLabel(label=scene["web"][0].lower())],
+            ),
+        )
+
+    def _call(self, image):
+        self.calls += 1
+        self.latency.sleep()
+        return self._response(image)
+
+    def annotate_image(self, request, **kwargs):
+        return self._call(request["image"])
+
+    def label_detection(self, image=None, **kwargs):
+        return self._call(image)
+
+    def object_localization(self, image=None, **kwargs):
+        return self._call(image)
+
+    def image_properties(self, image=None, **kwargs):
+        return self._call(image)
+
+    def batch_annotate_images(self, requests=None, **kwargs):
+        self.calls += 1
+        self.latency.sleep()
+        return self._vision.BatchAnnotateImagesResponse(
+            responses=[self._response(request["image"]) for request in requests]
+        )
+
+class _Request:
+    def __init__(self, execute):
+        self.execute = execute
+
+class FakeCustomSearch:
+    """Custom Search discovery service stand-in: service.cse().list(...).execute()"""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+
+    def cse(self):
+        return self
+
+    def list(self, q: str = "", num: int = 10, **kwargs):
+        def execute():
+            self.latency.sleep()
+            return {"items": self._items(q, num)}
+        return _Request(execute)
+
+    @staticmethod
+    def _items(query: str, count: int) -> List[Dict[str, Any]]:
+        rng = random.Random(query)
+        items = []
+        for index in range(count):
+            brand = rng.choice(SHOPPING_BRANDS)
+            product_id = hashlib.blake2b(f"{query}:{index}".encode(), digest_size=8).hexdigest()
+            items.append({
+                "cacheId": product_id,
+                "title": f"{brand} {query.title()} {index + 1}",
+                "link": f"https://shop.example.com/p/{product_id}",
+                "displayLink": "shop.example.com",
+                "snippet": f"{query} by {brand}, free returns",
+                "pagemap": {
+                    "cse_image": [{"src": f"https://img.example.com/{product_id}.jpg"}],
+                    "offer": [{"price": f"{rng.uniform(15, 250):.2f}", "pricecurrency": "USD"}],
+                    "product": [{"brand": brand}],
+                },
+            })
+        return items
+
+    def close(self):
+        pass
+
+class FakeBlob:
+    def __init__(self, bucket: "FakeBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+
+    @property
+    def public_url(self) -> str:
+        return f"https://storage.example.com/{self.bucket.name}/{self.name}"
+
+    def upload_from_string(self, data, content_type=None):
+        self.bucket.latency.sleep()
+        self.bucket.objects[self.name] = bytes(data)
+
+    def make_public(self):
+        self.bucket.latency.sleep()
+
+    def download_as_bytes(self) -> bytes:
+        self.bucket.latency.sleep()
+        return self.bucket.objects[self.name]
+
+    def delete(self):
+        self.bucket.latency.sleep()
+        self.bucket.objects.pop(self.name, None)
+
+class FakeBucket:
+    """In-memory GCS bucket"""
+
+    def __init__(self, latency: Latency, name: str = "loadtest"):
+        self.latency = latency
+        self.name = name
+        self.objects: Dict[str, bytes] = {}
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+def fake_storage(latency: Latency):
+    """A real CloudStorage whose client and bucket are in memory"""
+    from app.services.storage import CloudStorage
+
+    storage = CloudStorage.__new__(CloudStorage)
+    storage.bucket = FakeBucket(latency)
+    storage.client = SimpleNamespace(
+        list_blobs=lambda bucket, max_results=None, **kwargs: [
+            SimpleNamespace(name=name) for name in sorted(bucket.objects)[:max_results]
+        ],
+        close=lambda: None
+    )
+    return storage
+
+def user_id_for(email: str) -> str:
+    """The id a seeded user gets, derived from the email"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"loadtest:{email}"))
+
+class FakeSupabase:
+    """Supabase client stand-in covering the auth calls made by the API"""
+
+    def __init__(self, latency: Latency):
+        latency_sleep = latency.sleep
+
+        def user(email: str):
+            return SimpleNamespace(id=user_id_for(email), email=email)
+
+        def sign_in_with_password(credentials):
+            latency_sleep()
+            return SimpleNamespace(user=user(credentials["email"]), session=None)
+
+        def get_user(*args, **kwargs):
+            latency_sleep()
+            return SimpleNamespace(user=None)
+
+        def create_user(attributes):
+            latency_sleep()
+            return user(attributes["email"])
+
+        self.auth = SimpleNamespace(
+            sign_in_with_password=sign_in_with_password,
+            sign_out=latency_sleep,
+            get_user=get_user,
+            reset_password_email=lambda email: latency_sleep(),
+            admin=SimpleNamespace(
+                list_users=lambda **kwargs: (latency_sleep(), [])[1],
+                create_user=create_user,
+                get_user_by_id=lambda user_id: (latency_sleep(), SimpleNamespace(user=None))[1],
+                update_user_by_id=lambda user_id, attributes: latency_sleep(),
+            ),
+        )
+
+class FakePostgrest(httpx.AsyncBaseTransport):
+    """
+    PostgREST stand-in serving in-memory tables
+
+    Supports what PostgrestClient sends: eq. filters, select projection,
+    order, limit, single-object Accept, Prefer return/count, and
+    GET/HEAD/POST/PATCH/DELETE. Other operators (e.g. the keyset "or"
+    filter) are ignored.
+    """
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+
+    def _matching(self, table: str, params) -> List[Dict[str, Any]]:
+        rows = self.tables.setdefault(table, [])
+        filters = {
+            column: value[3:] for column, value in params.multi_items()
+            if value.startswith("eq.") and column not in ("select", "order", "limit")
+        }
+        return [row for row in rows if all(str(row.get(column)) == value for column, value in filters.items())]
+
+    @staticmethod
+    def _project(rows: List[Dict[str, Any]], columns: Optional[str]) -> List[Dict[str, Any]]:
+        if not columns or columns == "*":
+            return rows
+        names = columns.split(",")
+        return [{name: row.get(name) for name in names} for row in rows]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await self.latency.asleep()
+        table = request.url.path.rsplit("/", 1)[-1]
+        params = request.url.params
+        prefer = request.headers.get("prefer", "")
+
+        if request.method in ("GET", "HEAD"):
+            rows = self._matching(table, params)
+            for clause in reversed(params.get("order", "").split(",")):
+                if clause:
+                    column, _, direction = clause.partition(".")
+                    rows = sorted(rows, key=lambda row: str(row.get(column)), reverse=direction.startswith("desc"))
+            total = len(rows)
+            if "limit" in params:
+                rows = rows[:int(params["limit"])]
+            if request.method == "HEAD":
+                return httpx.Response(200, headers={"content-range": f"*/{total}"})
+            rows = self._project(rows, params.get("select"))
+            if request.headers.get("accept") == "application/vnd.pgrst.object+json":
+                if len(rows) != 1:
+                    return httpx.Response(406, json={"message": "JSON object requested, multiple (or no) rows returned"})
+                return httpx.Response(200, json=rows[0])
+            return httpx.Response(200, json=rows)
+
+        if request.method == "POST":
+            body = json.loads(request.content)
+            now = datetime.now(timezone.utc).isoformat()
+            inserted = [
+                {"id": str(uuid.uuid4()), "created_at": now, **row}
+                for row in (body if isinstance(body, list) else [body])
+            ]
+            self.tables.setdefault(table, []).extend(inserted)
+            if "return=representation" in prefer:
+                return httpx.Response(201, json=self._project(inserted, params.get("select")))
+            return httpx.Response(201)
+
+        if request.method == "PATCH":
+            values = json.loads(request.content)
+            rows = self._matching(table, params)
+            for row in rows:
+                row.update(values)
+            if "return=representation" in prefer:
+                return httpx.Response(200, json=self._project(rows, params.get("select")))
+            return httpx.Response(204)
+
+        if request.method == "DELETE":
+            doomed = {id(row) for row in self._matching(table, params)}
+            self.tables[table] = [row for row in self.tables.get(table, []) if id(row) not in doomed]
+            return httpx.Response(204)
+
+        return httpx.Response(405, json={"message": f"Method {request.method} not supported"})
+
+    def seed_users(self, emails: List[str], images_per_user: int):
+        """Profiles for the load-test users, each with an upload history"""
+        now = datetime.now(timezone.utc)
+        profiles = self.tables.setdefault("profiles", [])
+        images = self.tables.setdefault("images", [])
+        for email in emails:
+            user_id = user_id_for(email)
+            profiles.append({
+                "id": user_id, "email": email, "display_name": email.split("@")[0], "image_url": None,
+                "created_at": now.isoformat(), "updated_at": now.isoformat(),
+            })
+            for index in range(images_per_user):
+                created_at = (now - timedelta(hours=index)).isoformat()
+                images.append({
+                    "id": str(uuid.uuid4()), "user_id": user_id, "file_name": f"seed_{index}.jpg",
+                    "file_path": f"uploads/{user_id}/seed_{index}.jpg",
+                    "public_url": f"https://storage.example.com/loadtest/uploads/{user_id}/seed_{index}.jpg",
+                    "created_at": created_at,
+                })
+
+def install(latencies_ms: Optional[Dict[str, float]] = None, users: Optional[List[str]] = None,
+            images_per_user: int = 20) -> Dict[str, Any]:
+    """
+    Replace every upstream with its fake (call before the app starts)
+
+    Args:
+        latencies_ms: Median latency per upstream, overriding DEFAULT_LATENCIES_MS
+        users: Emails to seed profiles and upload history for
+        images_per_user: Seeded history rows per user
+
+    Returns:
+        The fakes by upstream name, for inspection
+    """
+    from app.core.config import settings
+    from app.core.postgrest import PostgrestClient
+    from app.core.services import services
+    from app.services.vision import VisionAI
+    # Import the modules that register the real services, so the fakes replace them
+    import app.core.database  # noqa: F401
+    import app.services.shopping  # noqa: F401
+
+    latencies = {**DEFAULT_LATENCIES_MS, **(latencies_ms or {})}
+    settings.CACHE_BACKEND = "memory"
+
+    vision_client = FakeVisionClient(Latency(latencies["vision"]))
+    customsearch = FakeCustomSearch(Latency(latencies["customsearch"]))
+    storage = fake_storage(Latency(latencies["gcs"]))
+    supabase = FakeSupabase(Latency(latencies["auth"]))
+    postgrest_transport = FakePostgrest(Latency(latencies["postgrest"]))
+    postgrest_transport.seed_users(users or [], images_per_user)
+
+    def build_vision():
+        VisionAI._client = vision_client
+        return vision_client
+
+    services.register("vision", build_vision)
+    services.register("customsearch", lambda: customsearch)
+    services.register("storage", lambda: storage)
+    services.register("supabase", lambda: supabase)
+
+    # Closed by the app's shutdown like the real pooled client
+    PostgrestClient._client = httpx.AsyncClient(
+        base_url="http://postgrest.invalid/rest/v1",
+        transport=postgrest_transport,
+    )
+
+    return {
+        "vision": vision_client,
+        "customsearch": customsearch,
+        "storage": storage,
+        "supabase": supabase,
+        "postgrest": postgrest_transport,
+    }
@@ -0,0 +1,83 @@
+"""
+Import-time budget check for the API and worker entry points.
+
+Imports each module in a fresh interpreter and fails (exit status 1) if
+the import takes longer than the budget or constructs any service client
+(Vision, GCS, Custom Search, Supabase): clients must be built lazily or by
+the lifespan/worker startup, never at import. The slowest imports are
+listed from python -X importtime to show where the time goes.
+
+tests/test_import_time.py runs the same check under pytest in CI.
+
+Usage (from backend/):
+    python -m benchmarks.import_time --budget 1.5
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+MODULES = ["app.main", "app.worker", "app.services.analysis"]
+
+# Seconds allowed per module import
+BUDGET = 1.5
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+from app.core.services import services
+print(json.dumps({{"seconds": elapsed, "built": services.built()}}))
+"""
+
+def _slowest(importtime_output: str, count: int):
+    """Top-level packages with the largest cumulative import time from -X importtime output"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if "." not in name and name not in ("app", "site", "encodings"):
+            rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:count]
+
+def probe(module: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+        capture_output=True,
+        text=True,
+        cwd=BACKEND,
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    stats["slowest"] = _slowest(result.stderr, 5)
+    return stats
+
+def main(args) -> int:
+    failures = 0
+    for module in args.modules or MODULES:
+        stats = probe(module)
+        if "error" in stats:
+            print(f"{module:<24} ERROR {stats['error']}")
+            failures += 1
+            continue
+        over = stats["seconds"] > args.budget
+        status = "OVER BUDGET" if over else "ok"
+        print(f"{module:<24} {stats['seconds'] * 1000:7.0f}ms  {status}")
+        for cumulative, name in stats["slowest"]:
+            print(f"    {cumulative / 1000:7.0f}ms  {name}")
+        if stats["built"]:
+            print(f"    services built at import: {', '.join(stats['built'])}")
+        failures += int(over or bool(stats["built"]))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=BUDGET, help="seconds allowed per module import")
+    parser.add_argument("modules", nargs="*", help=f"modules to check (default: {' '.join(MODULES)})")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,375 @@
+"""
+Offline load test: the API against local upstream stand-ins.
+
+Boots the FastAPI app with every external service replaced by a fake
+(see benchmarks/fakes.py), under uvicorn with each requested worker
+count, and drives it with a closed-loop mix of traffic from virtual users
+at increasing concurrency:
+
+- upload: /images/upload/, stored in GCS and queued for analysis (the
+  analysis job runs on in-process job consumers)
+- search: /images/search/ over a skewed query vocabulary (cache hits and misses)
+- history: /images/history/, a page of uploads with its cached count
+- auth: password login followed by /profile/me
+
+For every worker count and concurrency level it reports throughput,
+p50/p95/p99 latency and error rate (overall and per request type) and the
+analysis backlog, then the saturation point: the last level before
+throughput stops growing by --min-gain or p99 exceeds --slo-ms. A level
+where a virtual user could not log in, or where no request finished
+inside the recording window, is reported as failed and ends the search.
+
+The driver uses one core; run it on another machine (--url) to measure
+beyond a few thousand requests per second.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --workers 1 2 4 --concurrency 8 16 32 64 128
+    python -m benchmarks.load_test --mix upload=1,search=4,history=3,auth=2 --vision-ms 500
+    python -m benchmarks.load_test --in-process --concurrency 4 16 --duration 5
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+# Per-request client logging would swamp the report
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+CONFIG_ENV = "LOADTEST_CONFIG"
+
+DEFAULT_MIX = "upload=1,search=4,history=3,auth=2"
+
+# Product queries; searches draw from them with a Zipf-like skew, so
+# popular queries are served from the cache
+SEARCH_QUERIES = [
+    f"{color} {garment}"
+    for garment in ["jeans", "t-shirt", "dress", "jacket", "sneakers", "coat", "skirt", "hoodie", "boots", "blazer"]
+    for color in ["black", "white", "blue", "red", "beige", "green", "navy", "gray", "pink", "brown"]
+]
+
+def user_emails(count: int) -> List[str]:
+    return [f"loadtest{index}@example.com" for index in range(count)]
+
+def create_app():
+    """
+    The API app with fakes installed and analysis job consumers running
+
+    Called by uvicorn in every worker process (--factory); settings come
+    from the LOADTEST_CONFIG environment variable.
+    """
+    config = json.loads(os.environ.get(CONFIG_ENV, "{}"))
+    os.environ.setdefault("JWT_SECRET_KEY", "loadtest-signing-key-not-for-production")
+
+    from benchmarks import fakes
+    fakes.install(
+        config.get("latencies_ms"),
+        users=user_emails(config.get("users", 100)),
+        images_per_user=config.get("images_per_user", 20),
+    )
+
+    from contextlib import asynccontextmanager
+    from fastapi import APIRouter
+
+    from app.core.jobs import job_queue
+    from app.core.responses import FastJSONRoute
+    from app.main import app, lifespan
+
+    router = APIRouter(prefix="/loadtest", tags=["loadtest"], route_class=FastJSONRoute)
+
+    @router.get("/stats")
+    async def stats():
+        return {"queue_depth": await job_queue.queue_depth()}
+
+    app.include_router(router)
+
+    # Run analysis jobs on consumers inside each worker, since the
+    # in-memory Redis stand-in is per process
+    @asynccontextmanager
+    async def loadtest_lifespan(app_):
+        async with lifespan(app_):
+            stop = asyncio.Event()
+            consumers = asyncio.create_task(job_queue.work(concurrency=config.get("job_consumers", 4), stop=stop))
+            yield
+            stop.set()
+            await consumers
+
+    app.router.lifespan_context = loadtest_lifespan
+    return app
+
+def make_image(width: int = 1200, height: int = 900, seed: int = 0) -> bytes:
+    """A JPEG of a few colored garment-like shapes over noise"""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(180, 230, size=(height, width, 3), dtype=np.uint8)
+    for _ in range(4):
+        x0, y0 = rng.integers(0, width // 2), rng.integers(0, height // 2)
+        pixels[y0:y0 + height // 2, x0:x0 + width // 3] = rng.integers(0, 255, size=3)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown request type {name}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, email: str, images: List[bytes], rng: random.Random):
+        self.client = client
+        self.email = email
+        self.images = images
+        self.rng = rng
+        self.headers: Dict[str, str] = {}
+
+    async def login(self) -> httpx.Response:
+        response = await self.client.post("/auth/login", data={"username": self.email, "password": "loadtest"})
+        if response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+async def _upload(user: VirtualUser) -> httpx.Response:
+    files = {"file": ("photo.jpg", user.rng.choice(user.images), "image/jpeg")}
+    return await user.client.post("/images/upload/", files=files, headers=user.headers)
+
+async def _search(user: VirtualUser) -> httpx.Response:
+    index = min(int(user.rng.paretovariate(1.2)) - 1, len(SEARCH_QUERIES) - 1)
+    return await user.client.post("/images/search/", params={"query": SEARCH_QUERIES[index]}, headers=user.headers)
+
+async def _history(user: VirtualUser) -> httpx.Response:
+    return await user.client.get("/images/history/", params={"limit": 10}, headers=user.headers)
+
+async def _auth(user: VirtualUser) -> httpx.Response:
+    response = await user.login()
+    if response.status_code != 200:
+        return response
+    return await user.client.get("/profile/me", headers=user.headers)
+
+SCENARIOS = {"upload": _upload, "search": _search, "history": _history, "auth": _auth}
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def summarize(samples: List[tuple], seconds: float) -> Dict[str, float]:
+    latencies = [latency for _, _, latency, ok in samples if ok]
+    return {
+        "requests": len(samples),
+        "rps": len(latencies) / seconds,
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "error_rate": 1 - len(latencies) / len(samples) if samples else 0.0,
+    }
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, args, images: List[bytes]) -> Dict:
+    """Drive one concurrency level: warm up, then record for --duration seconds"""
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    emails = user_emails(args.users)
+    # (request type, start time, latency, ok); requests started during the
+    # warm-up are dropped afterwards by start time
+    samples: List[tuple] = []
+    login_failures = 0
+    record_from = time.perf_counter() + args.warmup
+    stop_at = record_from + args.duration
+
+    async def virtual_user(index: int):
+        nonlocal login_failures
+        rng = random.Random(args.seed * 100003 + index)
+        user = VirtualUser(client, emails[index % len(emails)], images, rng)
+        try:
+            logged_in = (await user.login()).status_code == 200
+        except httpx.HTTPError:
+            logged_in = False
+        if not logged_in:
+            login_failures += 1
+            return
+        while time.perf_counter() < stop_at:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await SCENARIOS[name](user)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            samples.append((name, started, time.perf_counter() - started, ok))
+            # Responses that never wait (a 429 over an ASGI transport) would
+            # otherwise let one virtual user hold the loop until stop_at
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(virtual_user(index) for index in range(concurrency)))
+    elapsed = max(time.perf_counter() - record_from, 1e-9)
+    samples = [sample for sample in samples if sample[1] >= record_from]
+
+    result = summarize(samples, elapsed)
+    result["concurrency"] = concurrency
+    result["login_failures"] = login_failures
+    result["failed"] = (
+        f"{login_failures} of {concurrency} virtual users could not log in" if login_failures
+        else "no requests recorded" if not samples
+        else None
+    )
+    result["by_type"] = {
+        name: summarize([sample for sample in samples if sample[0] == name], elapsed) for name in names
+    }
+    try:
+        result["queue_depth"] = (await client.get("/loadtest/stats")).json()["queue_depth"]
+    except (httpx.HTTPError, ValueError, KeyError):
+        result["queue_depth"] = None
+    return result
+
+def saturation_point(levels: List[Dict], min_gain: float, slo_ms: float) -> Optional[Dict]:
+    """The last level before throughput stops growing, p99 breaks the SLO or the level fails"""
+    best = None
+    for level in levels:
+        if level["failed"] or level["p99"] > slo_ms or level["error_rate"] > 0.01:
+            break
+        if best is not None and level["rps"] < best["rps"] * (1 + min_gain):
+            break
+        best = level
+    return best
+
+def print_level(level: Dict):
+    if level["failed"]:
+        print(f"  c={level['concurrency']:<5} FAILED: {level['failed']}")
+        return
+    print(f"  c={level['concurrency']:<5} {level['rps']:8.1f} rps  p50 {level['p50']:7.1f}ms  "
+          f"p95 {level['p95']:7.1f}ms  p99 {level['p99']:7.1f}ms  errors {level['error_rate']:.1%}  "
+          f"backlog {level['queue_depth']}")
+    for name, stats in level["by_type"].items():
+        print(f"      {name:<8} {stats['rps']:8.1f} rps  p50 {stats['p50']:7.1f}ms  "
+              f"p95 {stats['p95']:7.1f}ms  p99 {stats['p99']:7.1f}ms  errors {stats['error_rate']:.1%}")
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(workers: int, config: Dict) -> tuple:
+    """Start uvicorn with the fake-backed app; returns (process, base url)"""
+    port = _free_port()
+    env = {**os.environ, CONFIG_ENV: json.dumps(config)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.load_test:create_app", "--factory",
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited with status {process.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            time.sleep(0.25)
+    process.terminate()
+    raise SystemExit("Server did not become healthy within 60s")
+
+async def drive(url: Optional[str], app, args, images: List[bytes]) -> List[Dict]:
+    levels = []
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    transport = httpx.ASGITransport(app=app) if app is not None else None
+    async with httpx.AsyncClient(base_url=url or "http://loadtest", transport=transport, limits=limits,
+                                 timeout=args.timeout) as client:
+        for concurrency in args.concurrency:
+            level = await run_level(client, concurrency, args, images)
+            print_level(level)
+            levels.append(level)
+    return levels
+
+async def drive_in_process(args, images: List[bytes]) -> List[Dict]:
+    """Drive the app over an ASGI transport in this process (one worker, shared with the driver)"""
+    os.environ[CONFIG_ENV] = json.dumps(server_config(args))
+    app = create_app()
+    async with app.router.lifespan_context(app):
+        return await drive(None, app, args, images)
+
+def server_config(args) -> Dict:
+    return {
+        "latencies_ms": {
+            "vision": args.vision_ms, "customsearch": args.search_ms, "gcs": args.gcs_ms,
+            "postgrest": args.db_ms, "auth": args.auth_ms,
+        },
+        "users": args.users,
+        "job_consumers": args.job_consumers,
+    }
+
+def main(args):
+    images = [make_image(seed=seed) for seed in range(8)]
+    print(f"mix {args.mix}; {args.duration:.0f}s per level after {args.warmup:.0f}s warm-up; "
+          f"median latencies vision {args.vision_ms}ms, search {args.search_ms}ms, gcs {args.gcs_ms}ms, "
+          f"db {args.db_ms}ms, auth {args.auth_ms}ms")
+
+    results = {}
+    for workers in ([1] if args.in_process or args.url else args.workers):
+        print(f"\n{workers} worker(s)" if not args.url else f"\n{args.url}")
+        if args.in_process:
+            levels = asyncio.run(drive_in_process(args, images))
+        elif args.url:
+            levels = asyncio.run(drive(args.url, None, args, images))
+        else:
+            process, url = start_server(workers, server_config(args))
+            try:
+                levels = asyncio.run(drive(url, None, args, images))
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+        results[workers] = levels
+
+    print("\nsaturation point")
+    for workers, levels in results.items():
+        point = saturation_point(levels, args.min_gain, args.slo_ms)
+        index = next((i for i, level in enumerate(levels) if level is point), -1)
+        stopped_by = levels[index + 1] if index + 1 < len(levels) else None
+        if stopped_by is not None and stopped_by["failed"]:
+            print(f"  {workers} worker(s): concurrency {stopped_by['concurrency']} failed ({stopped_by['failed']})"
+                  + (f" after {point['rps']:.1f} rps at concurrency {point['concurrency']}" if point else ""))
+        elif point is None:
+            print(f"  {workers} worker(s): saturated at the lowest concurrency tested")
+        else:
+            saturated = point is not levels[-1]
+            print(f"  {workers} worker(s): {point['rps']:.1f} rps at concurrency {point['concurrency']} "
+                  f"(p99 {point['p99']:.0f}ms){'' if saturated else ', not yet saturated'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="uvicorn worker counts to test")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 8, 16, 32, 64, 128],
+                        help="virtual users per level")
+    parser.add_argument("--duration", type=float, default=15, help="seconds recorded per level")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds discarded at the start of each level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="request type weights")
+    parser.add_argument("--users", type=int, default=100, help="distinct seeded users")
+    parser.add_argument("--job-consumers", type=int, default=4, help="analysis job consumers per worker")
+    parser.add_argument("--vision-ms", type=float, default=350)
+    parser.add_argument("--search-ms", type=float, default=250)
+    parser.add_argument("--gcs-ms", type=float, default=60)
+    parser.add_argument("--db-ms", type=float, default=8)
+    parser.add_argument("--auth-ms", type=float, default=90)
+    parser.add_argument("--slo-ms", type=float, default=2000, help="p99 latency above which a level counts as saturated")
+    parser.add_argument("--min-gain", type=float, default=0.05, help="throughput growth below which a level counts as saturated")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--url", help="drive an already running server (started with the factory above) instead")
+    parser.add_argument("--in-process", action="store_true", help="skip uvicorn and drive the app in this process")
+    main(parser.parse_args())
@@ -0,0 +1,75 @@
+"""
+Login-storm microbenchmark for password hashing.
+
+Fires N concurrent password verifications, first calling bcrypt inline on
+the event loop and then through the async pool API, while a heartbeat task
+measures how late the loop wakes up. Inline hashing serialises the storm
+and stalls the loop for the whole duration; the pool keeps the loop
+responsive and overlaps hashes across workers.
+
+Usage (from backend/):
+    python -m benchmarks.password_hashing --logins 32 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+async def _heartbeat(stop: asyncio.Event, lags: list, interval: float = 0.01):
+    """Record how late each tick fires compared to the requested interval"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+async def _storm(verify, logins: int, password: str, hashed: str) -> dict:
+    stop = asyncio.Event()
+    lags = []
+    heartbeat = asyncio.create_task(_heartbeat(stop, lags))
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(verify(password, hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await heartbeat
+    assert all(results)
+    return {
+        "elapsed": elapsed,
+        "logins_per_sec": logins / elapsed,
+        "max_lag_ms": max(lags, default=elapsed) * 1000,
+        "median_lag_ms": statistics.median(lags) * 1000 if lags else elapsed * 1000,
+    }
+
+def _print(name: str, stats: dict):
+    print(
+        f"{name:<8} total={stats['elapsed']:.2f}s "
+        f"throughput={stats['logins_per_sec']:.1f}/s "
+        f"loop lag max={stats['max_lag_ms']:.1f}ms median={stats['median_lag_ms']:.1f}ms"
+    )
+
+async def main(logins: int):
+    from app.api import utils
+
+    password = "correct horse battery staple"
+    hashed = utils.get_password_hash(password)
+
+    async def verify_inline(plain, hashed_password):
+        return utils.verify_password(plain, hashed_password)
+
+    print(f"{logins} concurrent logins, bcrypt rounds={utils.BCRYPT_ROUNDS}, "
+          f"pool workers={utils.PASSWORD_HASH_WORKERS}")
+    _print("before", await _storm(verify_inline, logins, password, hashed))
+    _print("after", await _storm(utils.verify_password_async, logins, password, hashed))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=None, help="override BCRYPT_ROUNDS")
+    args = parser.parse_args()
+    if args.rounds is not None:
+        os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    asyncio.run(main(args.logins))
@@ -0,0 +1,255 @@
+"""
+Per-request post-processing microbenchmarks with regression thresholds.
+
+Times the CPU work done on every analysis and search, on recorded
+payloads in benchmarks/fixtures (a large Vision AnnotateImageResponse and
+a full Custom Search page):
+
+- VisionAI._labels_from_response / _objects_from_response
+- VisionAI._process_vision_response (labels, web entities, colors, fashion items)
+- VisionAI._extract_dominant_colors and _generate_search_terms
+- VisionAI.build_clothing_items (the matching behind analyze_clothing)
+- ShoppingAPI._parse_results and the _extract_price/_currency/_brand parsers
+
+Each case reports the best time per call (over --repeat rounds of
+auto-sized loops), its time relative to a reference workload (the median
+ratio of each round to a reference round run just before it) and the
+peak memory allocated by one call (tracemalloc). The peak understates
+results built from small dicts, which CPython takes from its dict free
+list without a traced allocation; check retained memory as well before
+reading a higher peak as a regression.
+
+Results are compared with the baseline in
+benchmarks/baselines/post_processing.json and the run fails (exit status
+1) when a case's relative time exceeds the baseline's by more than
+--time-tolerance plus --time-floor microseconds, or it allocates more than
+--memory-tolerance plus 1KB beyond it. The absolute floors keep the
+sub-10us parsers from failing on timer noise. Absolute times depend on the
+machine and are only printed for information; the reference workload
+(pure Python parsing and string handling of the Custom Search fixture,
+like the code under test) scales with the host, so the relative times
+hold across machines and the committed baseline applies anywhere. Use a
+higher --repeat on a shared or noisy host.
+
+Usage (from backend/):
+    python -m benchmarks.post_processing
+    python -m benchmarks.post_processing --update-baseline
+    python -m benchmarks.post_processing -k shopping --repeat 31
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from google.cloud import vision
+
+from app.services.color_names import ColorNamer
+from app.services.shopping import ShoppingAPI
+from app.services.vision import VisionAI
+
+FIXTURES = Path(__file__).parent / "fixtures"
+BASELINE = Path(__file__).parent / "baselines" / "post_processing.json"
+
+# Target wall time of one timing round
+ROUND_SECONDS = 0.01
+
+# Absolute slack on top of the tolerances, so microsecond-scale cases are
+# not failed by timer and scheduler noise a ratio alone cannot absorb
+TIME_FLOOR_US = 1.0
+MEMORY_FLOOR_KB = 1.0
+
+def load_fixtures() -> Tuple[vision.AnnotateImageResponse, Dict]:
+    response = vision.AnnotateImageResponse.from_json((FIXTURES / "vision_response.json").read_text())
+    page = json.loads((FIXTURES / "customsearch_page.json").read_text())
+    return response, page
+
+def _walk(value) -> int:
+    if isinstance(value, dict):
+        return sum(_walk(key) + _walk(item) for key, item in value.items())
+    if isinstance(value, list):
+        return sum(_walk(item) for item in value)
+    if isinstance(value, str):
+        return len(value.lower().split())
+    return 1
+
+def reference_case() -> Callable[[], object]:
+    """Host-speed reference: decode and walk the Custom Search page"""
+    text = (FIXTURES / "customsearch_page.json").read_text()
+    return lambda: _walk(json.loads(text))
+
+def cases() -> Dict[str, Callable[[], object]]:
+    """Benchmark cases by name, each a no-argument callable"""
+    response, page = load_fixtures()
+    labels = VisionAI._labels_from_response(response)
+    objects = VisionAI._objects_from_response(response)
+    processed = VisionAI._process_vision_response(response)
+    colors = processed["colors"]
+    items = page["items"]
+
+    return {
+        "vision.labels_from_response": lambda: VisionAI._labels_from_response(response),
+        "vision.objects_from_response": lambda: VisionAI._objects_from_response(response),
+        "vision.process_vision_response": lambda: VisionAI._process_vision_response(response),
+        "vision.extract_dominant_colors": lambda: VisionAI._extract_dominant_colors(colors),
+        "vision.generate_search_terms": lambda: VisionAI._generate_search_terms(processed),
+        "vision.build_clothing_items": lambda: VisionAI.build_clothing_items(labels, objects),
+        "shopping.parse_results": lambda: ShoppingAPI._parse_results(page),
+        "shopping.extract_price": lambda: [ShoppingAPI._extract_price(item) for item in items],
+        "shopping.extract_currency": lambda: [ShoppingAPI._extract_currency(item) for item in items],
+        "shopping.extract_brand": lambda: [ShoppingAPI._extract_brand(item) for item in items],
+    }
+
+def _loops(func: Callable[[], object]) -> int:
+    """Calls of func taking about ROUND_SECONDS"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= ROUND_SECONDS / 5:
+            break
+        loops *= 4
+    return max(1, int(loops * ROUND_SECONDS / elapsed))
+
+def _round(func: Callable[[], object], loops: int) -> float:
+    started = time.perf_counter()
+    for _ in range(loops):
+        func()
+    return (time.perf_counter() - started) / loops
+
+def paired_times(
+    func: Callable[[], object],
+    reference: Callable[[], object],
+    repeat: int
+) -> Tuple[float, float, float]:
+    """
+    Time func in rounds alternating with rounds of the reference workload
+
+    Returns:
+        The fastest seconds per call of func and of the reference, and the
+        median ratio of each func round to the reference round before it;
+        adjacent rounds run at the same host speed, so the ratio is far
+        steadier than either time on a shared host
+    """
+    loops, reference_loops = _loops(func), _loops(reference)
+    times, reference_times = [], []
+    for _ in range(repeat):
+        reference_times.append(_round(reference, reference_loops))
+        times.append(_round(func, loops))
+    ratios = [elapsed / reference_elapsed for elapsed, reference_elapsed in zip(times, reference_times)]
+    return min(times), min(reference_times), statistics.median(ratios)
+
+def peak_allocation(func: Callable[[], object]) -> int:
+    """Peak bytes allocated during one call"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+        del result
+    finally:
+        tracemalloc.stop()
+    return max(0, peak - baseline)
+
+def run(selected: Dict[str, Callable[[], object]], repeat: int) -> Tuple[float, Dict[str, Dict[str, float]]]:
+    """
+    Time the cases and the reference workload
+
+    Returns:
+        The reference time in microseconds and, by case, its time, its time
+        relative to the reference and its peak allocation
+    """
+    reference = reference_case()
+    reference()
+    reference_us = float("inf")
+    results = {}
+    for name, func in selected.items():
+        # Warm caches (taxonomy scans, color lookup table) as a running server would
+        func()
+        elapsed, reference_elapsed, relative = paired_times(func, reference, repeat)
+        reference_us = min(reference_us, reference_elapsed * 1e6)
+        results[name] = {
+            "us": round(elapsed * 1e6, 2),
+            "relative": round(relative, 4),
+            "peak_kb": round(peak_allocation(func) / 1024, 1),
+        }
+    return round(reference_us, 2), results
+
+def compare(
+    results: Dict,
+    baseline: Dict,
+    reference_us: float,
+    time_tolerance: float,
+    memory_tolerance: float,
+    time_floor: float = TIME_FLOOR_US
+) -> List[str]:
+    """
+    Names and reasons of the cases that regressed against the baseline
+
+    A case regresses when its time relative to the reference exceeds
+    baseline * (1 + time_tolerance) + time_floor microseconds (expressed
+    in this run's reference time), or it allocates more than baseline *
+    (1 + memory_tolerance) + MEMORY_FLOOR_KB.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result["relative"] > expected["relative"] * (1 + time_tolerance) + time_floor / reference_us:
+            regressions.append(
+                f"{name}: {result['relative']:.4f}x reference vs baseline {expected['relative']:.4f}x"
+            )
+        if result["peak_kb"] > expected["peak_kb"] * (1 + memory_tolerance) + MEMORY_FLOOR_KB:
+            regressions.append(f"{name}: {result['peak_kb']:.1f}KB vs baseline {expected['peak_kb']:.1f}KB")
+    return regressions
+
+def main(args) -> int:
+    ColorNamer.load()
+    selected = {name: func for name, func in cases().items() if not args.k or args.k in name}
+    reference_us, results = run(selected, args.repeat)
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    cases_baseline = baseline.get("cases", {})
+
+    print(f"reference workload: {reference_us:.2f}us "
+          f"(baseline {baseline.get('reference_us', float('nan')):.2f}us)\n")
+    print(f"{'case':<34} {'time':>10} {'relative':>9} {'baseline':>9} {'peak alloc':>11} {'baseline':>10}")
+    for name, result in results.items():
+        expected = cases_baseline.get(name, {})
+        print(f"{name:<34} {result['us']:>8.2f}us {result['relative']:>8.4f}x "
+              f"{expected.get('relative', float('nan')):>8.4f}x "
+              f"{result['peak_kb']:>9.1f}KB {expected.get('peak_kb', float('nan')):>8.1f}KB")
+
+    if args.update_baseline:
+        BASELINE.parent.mkdir(exist_ok=True)
+        updated = {"reference_us": reference_us, "cases": {**cases_baseline, **results}}
+        BASELINE.write_text(json.dumps(updated, indent=2, sort_keys=True) + "\n")
+        print(f"\nbaseline written to {BASELINE}")
+        return 0
+
+    regressions = compare(
+        results, cases_baseline, reference_us, args.time_tolerance, args.memory_tolerance, args.time_floor
+    )
+    if regressions:
+        print("\nregressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", help="only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=15, help="timing rounds per case")
+    parser.add_argument("--time-tolerance", type=float, default=0.3, help="allowed relative slowdown over the baseline")
+    parser.add_argument("--time-floor", type=float, default=TIME_FLOOR_US,
+                        help="allowed slowdown in microseconds on top of the tolerance")
+    parser.add_argument("--memory-tolerance", type=float, default=0.1, help="allowed extra peak allocation")
+    parser.add_argument("--update-baseline", action="store_true", help="record these results as the baseline")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,124 @@
+"""
+Keyword extraction microbenchmark: nested substring scans vs the taxonomy matcher.
+
+Replays the post-processing keyword work done per image (fashion item
+detection over labels and objects, and colors/pattern/style for every
+clothing object) on synthetic Vision-like label sets, first with the
+previous nested loops, then with the precompiled Aho-Corasick matcher, and
+then with the matcher behind its per-text cache.
+
+Usage (from backend/):
+    python -m benchmarks.taxonomy_matching --images 2000
+"""
+import argparse
+import random
+import time
+
+from app.services import taxonomy
+
+LABEL_VOCABULARY = [
+    "Clothing", "Sleeve", "Outerwear", "Denim", "Jeans", "T-shirt", "Jacket",
+    "Fashion", "Street fashion", "Footwear", "Shoe", "Sneakers", "Blue",
+    "Navy blue", "Electric blue", "Pattern", "Plaid", "Tartan", "Stripe",
+    "Collar", "Casual wear", "Vintage clothing", "Fashion design", "Textile",
+    "Standing", "Human body", "Smile", "Leg", "Waist", "Handbag", "Bag",
+    "Beige", "Black", "White", "Sportswear", "Active shirt", "Formal wear",
+    "Polka dot", "Leopard", "Dress", "Day dress", "Cocktail dress", "Grey",
+]
+OBJECT_VOCABULARY = [
+    "Person", "Shirt", "Pants", "Shoe", "Jacket", "Handbag", "Dress", "Hat",
+    "Sunglasses", "Top", "Outerwear", "Skirt", "Footwear", "Belt", "Watch",
+]
+
+COMMON_COLORS = [
+    "red", "blue", "green", "yellow", "black", "white", "pink",
+    "purple", "orange", "brown", "gray", "navy", "teal", "gold", "silver"
+]
+
+def naive(labels, objects):
+    """The keyword extraction as it was before the taxonomy matcher"""
+    def extract_colors():
+        colors = []
+        for label in labels:
+            description = label.lower()
+            for color in COMMON_COLORS:
+                if color in description:
+                    colors.append(color)
+        return list(set(colors))
+
+    def extract_first(candidates, default):
+        for label in labels:
+            description = label.lower()
+            for candidate in candidates:
+                if candidate.lower().replace("_", " ") in description:
+                    return candidate
+        return default
+
+    items = []
+    for name in objects:
+        if any(category.lower() in name.lower() for category in taxonomy.CLOTHING_CATEGORIES):
+            items.append((
+                extract_colors(),
+                extract_first(taxonomy.PATTERN_TYPES, "solid"),
+                extract_first(taxonomy.STYLE_CATEGORIES, "casual"),
+            ))
+
+    fashion_keywords = set(taxonomy.CLOTHING_CATEGORIES) | {
+        "APPAREL", "CLOTHING", "DRESS", "SHIRT", "PANTS", "JEANS", "JACKET",
+        "COAT", "FOOTWEAR", "SHOE", "SNEAKER", "BAG", "HANDBAG", "ACCESSORY",
+        "WATCH", "JEWELRY", "GLASSES", "SUNGLASSES", "HAT"
+    }
+    fashion = [text for text in labels + objects
+               if any(keyword.upper() in text.upper() for keyword in fashion_keywords)]
+    return items, fashion
+
+def matcher(labels, objects, scan=taxonomy.matcher.scan):
+    """The same extraction with one automaton pass per label and object"""
+    label_matches = [scan(label) for label in labels]
+    object_matches = [scan(name) for name in objects]
+
+    colors = list(dict.fromkeys(c for matches in label_matches for c in taxonomy.values(matches, taxonomy.COLOR)))
+    pattern = next(filter(None, (taxonomy.first(m, taxonomy.PATTERN) for m in label_matches)), "solid")
+    style = next(filter(None, (taxonomy.first(m, taxonomy.STYLE) for m in label_matches)), "casual")
+    items = [(colors, pattern, style) for matches in object_matches if taxonomy.has(matches, taxonomy.CATEGORY)]
+
+    fashion = [text for text, matches in zip(labels + objects, label_matches + object_matches)
+               if taxonomy.has(matches, taxonomy.FASHION)]
+    return items, fashion
+
+def cached_matcher(labels, objects):
+    """The matcher behind the per-text cache used in production"""
+    return matcher(labels, objects, scan=taxonomy.scan)
+
+def _run(extract, images) -> float:
+    started = time.perf_counter()
+    for labels, objects in images:
+        extract(labels, objects)
+    return time.perf_counter() - started
+
+def main(args):
+    rng = random.Random(args.seed)
+    images = [
+        (rng.sample(LABEL_VOCABULARY, 10), rng.sample(OBJECT_VOCABULARY, 5))
+        for _ in range(args.images)
+    ]
+
+    # Warm up both paths before timing
+    _run(naive, images[:50])
+    _run(matcher, images[:50])
+
+    before = min(_run(naive, images) for _ in range(args.repeat))
+    after = min(_run(matcher, images) for _ in range(args.repeat))
+    cached = min(_run(cached_matcher, images) for _ in range(args.repeat))
+    print(f"{args.images} images, 10 labels + 5 objects each, "
+          f"{len(list(taxonomy._terms()))} taxonomy terms")
+    print(f"before  {before / args.images * 1e6:.1f}us/image")
+    print(f"after   {after / args.images * 1e6:.1f}us/image  ({before / after:.1f}x)")
+    print(f"cached  {cached / args.images * 1e6:.1f}us/image  ({before / cached:.1f}x)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
@@ -0,0 +1,35 @@
+"""Shared fixtures: the API with every upstream replaced by benchmarks/fakes.py"""
+import io
+import os
+
+# Read by app.api.utils at import
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-for-the-api-test-suite")
+
+import pytest
+from PIL import Image
+
+from benchmarks import fakes
+
+@pytest.fixture
+def upstreams():
+    """Install the fakes with no latency, on a fresh in-memory Redis"""
+    from app.core.cache import cache
+    from app.core.postgrest import PostgrestClient
+    from app.core.services import services
+    from app.services.vision import VisionAI
+
+    services._instances.clear()
+    cache.set_backend(None)
+    installed = fakes.install(latencies_ms={name: 0 for name in fakes.DEFAULT_LATENCIES_MS}, users=[])
+    yield installed
+    services._instances.clear()
+    cache.set_backend(None)
+    PostgrestClient._client = None
+    VisionAI._client = None
+
+@pytest.fixture
+def jpeg() -> bytes:
+    """A small solid-color JPEG"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (180, 30, 40)).save(buffer, format="JPEG")
+    return buffer.getvalue()
@@ -0,0 +1,47 @@
+"""Admission control of the API's expensive routes (see core/admission.py)"""
+import asyncio
+
+import httpx
+
+from app.api import deps
+from app.core.config import settings
+from app.main import app
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+def test_login_burst_from_one_address_is_not_shed(upstreams):
+    async def scenario():
+        async with _client() as client:
+            return await asyncio.gather(*(
+                client.post("/auth/login", data={"username": f"user{index}@example.com", "password": "secret"})
+                for index in range(4 * settings.ADMISSION_USER_CONCURRENCY)
+            ))
+
+    assert [response.status_code for response in asyncio.run(scenario())] == [200] * (
+        4 * settings.ADMISSION_USER_CONCURRENCY
+    )
+
+def test_admitted_request_decodes_its_token_once(upstreams, monkeypatch):
+    assert "/images/search/" in settings.ADMISSION_ROUTES.split(",")
+    decoded = []
+
+    def decode_token(token):
+        decoded.append(token)
+        return original(token)
+
+    original = deps.decode_token
+    monkeypatch.setattr(deps, "decode_token", decode_token)
+
+    async def scenario():
+        async with _client() as client:
+            login = await client.post("/auth/login", data={"username": "shopper@example.com", "password": "secret"})
+            token = login.json()["access_token"]
+            decoded.clear()
+            return await client.post(
+                "/images/search/", params={"query": "red dress"}, headers={"Authorization": f"Bearer {token}"}
+            )
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200, response.text
+    assert len(decoded) == 1
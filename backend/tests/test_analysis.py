@@ -0,0 +1,78 @@
+"""Concurrency of the analysis pipeline's upstream calls (see services/analysis.py)"""
+import asyncio
+import time
+
+import pytest
+
+from benchmarks import fakes
+from app.services.analysis import analyze_image_job, build_product_query
+from app.services.shopping import ShoppingAPI
+from app.services.vision import VisionAI
+
+# Latency of every Vision request and product search
+LATENCY_MS = 200
+
+# Elapsed time, in latencies, under which calls count as overlapped;
+# back-to-back calls would take one latency each
+OVERLAP_MARGIN = 1.5
+
+@pytest.fixture
+def slow_upstreams(upstreams):
+    upstreams["vision"].latency = fakes.Latency(LATENCY_MS, sigma=0)
+    upstreams["customsearch"].latency = fakes.Latency(LATENCY_MS, sigma=0)
+    return upstreams
+
+def _elapsed(awaitable_factory) -> float:
+    async def timed():
+        started = time.perf_counter()
+        await awaitable_factory()
+        return time.perf_counter() - started
+    return asyncio.run(timed())
+
+def test_label_and_object_detection_overlap(slow_upstreams):
+    elapsed = _elapsed(lambda: asyncio.gather(
+        VisionAI.detect_labels(b"image"),
+        VisionAI.detect_objects(b"image")
+    ))
+    assert slow_upstreams["vision"].calls == 2
+    assert elapsed < OVERLAP_MARGIN * LATENCY_MS / 1000
+
+def test_product_searches_overlap(slow_upstreams):
+    queries = ["red dress", "blue jeans", "black boots"]
+    elapsed = _elapsed(lambda: asyncio.gather(*(
+        ShoppingAPI.search_products(query=query, max_results=5) for query in queries
+    )))
+    assert elapsed < OVERLAP_MARGIN * LATENCY_MS / 1000
+
+def test_analysis_job_takes_two_rounds_of_requests(slow_upstreams, jpeg):
+    slow_upstreams["storage"].upload_file(jpeg, "uploads/test/outfit.jpg", "image/jpeg")
+    payload = {"upload_id": "upload", "user_id": "user", "file_path": "uploads/test/outfit.jpg"}
+    events = []
+
+    async def report(event, data):
+        events.append(event)
+
+    # Labels and objects together, then every product search together
+    elapsed = _elapsed(lambda: analyze_image_job(payload, report))
+    assert events.count("products") > 1
+    assert elapsed < (1 + OVERLAP_MARGIN) * LATENCY_MS / 1000
+
+def test_per_garment_searches_overlap(slow_upstreams, jpeg):
+    slow_upstreams["storage"].upload_file(jpeg, "uploads/test/outfit.jpg", "image/jpeg")
+    payload = {
+        "upload_id": "upload", "user_id": "user", "file_path": "uploads/test/outfit.jpg", "per_garment": True
+    }
+    events = []
+
+    async def report(event, data):
+        events.append(event)
+
+    results = {}
+
+    async def run():
+        results.update(await analyze_image_job(payload, report))
+
+    elapsed = _elapsed(run)
+    assert events.count("products") > 1
+    assert all("similar_products" in item for item in results["analysis"] if build_product_query(item))
+    assert elapsed < (1 + OVERLAP_MARGIN) * LATENCY_MS / 1000
@@ -0,0 +1,51 @@
+"""Token revocation (see api/deps.py)"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import deps
+from app.api.utils import create_tokens, decode_token
+from app.core.cache import cache
+
+USER_ID = "0b1c5a9e-8d3f-4a7b-9c2d-1e6f7a8b9c0d"
+
+@pytest.fixture(autouse=True)
+def fresh_revocations(upstreams):
+    deps._revocation_cache.clear()
+    yield
+    deps._revocation_cache.clear()
+
+def test_revoking_all_tokens_denies_one_issued_the_same_second(monkeypatch):
+    token = create_tokens(USER_ID, "shopper@example.com")["access_token"]
+    issued_at = decode_token(token)["iat"]
+    monkeypatch.setattr(deps, "time", SimpleNamespace(time=lambda: issued_at + 0.9))
+
+    async def scenario():
+        await deps.revoke_user_tokens(USER_ID)
+        return await deps._authenticate(token, "access")
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(scenario())
+    assert raised.value.detail == "Token has been revoked"
+
+def test_revocations_are_not_cached_while_redis_fails(monkeypatch):
+    token = create_tokens(USER_ID, "shopper@example.com")["access_token"]
+
+    async def unavailable(name):
+        raise ConnectionError("Redis is down")
+
+    async def scenario():
+        await deps.revoke_user_tokens(USER_ID)
+        deps._revocation_cache.clear()
+        with monkeypatch.context() as patch:
+            patch.setattr(cache, "get_all_hash", unavailable)
+            # Fails open while Redis is unreachable...
+            await deps._authenticate(token, "access")
+        # ...and denies the token again as soon as it is back
+        await deps._authenticate(token, "access")
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(scenario())
+    assert raised.value.detail == "Token has been revoked"
@@ -0,0 +1,37 @@
+"""Perceptual color naming (see services/color_names.py)"""
+import numpy as np
+import pytest
+
+from app.services import color_names
+from app.services.color_names import FASHION_PALETTE, ColorNamer
+
+@pytest.fixture
+def namer(monkeypatch):
+    monkeypatch.setattr(ColorNamer, "_lut", None)
+    return ColorNamer
+
+def _rgb(code: str):
+    return tuple(int(code[i:i + 2], 16) for i in (1, 3, 5))
+
+@pytest.mark.parametrize("rgb, name", [
+    ((0, 0, 0), "black"),
+    ((255, 255, 255), "white"),
+    ((220, 20, 20), "red"),
+    ((20, 30, 90), "navy"),
+])
+def test_name_picks_the_perceptually_closest_color(namer, rgb, name):
+    assert namer.name(*rgb) == name
+
+def test_name_many_matches_name(namer):
+    rgb = np.array([_rgb(code) for _, code in FASHION_PALETTE] + [(3, 200, 77), (250, 140, 5)])
+    assert namer.name_many(rgb) == [namer.name(*color) for color in rgb]
+
+def test_shipped_table_matches_the_palette(namer):
+    assert np.array_equal(namer.load(), color_names.build_lut())
+
+def test_stale_table_is_rebuilt(namer, tmp_path):
+    path = tmp_path / "color_names.npz"
+    np.savez_compressed(path, lut=np.zeros(8, dtype=np.uint8), names=np.array(["black"]), hex=np.array(["#000000"]))
+
+    assert len(namer.load(str(path))) == 1 << (3 * color_names.LUT_BITS)
+    assert namer.name(255, 255, 255) == "white"
@@ -0,0 +1,19 @@
+"""Encoding of result objects (see core/encoding.py)"""
+import json
+from datetime import datetime, timezone
+
+from app.core.encoding import dumps, to_primitive
+from app.services.results import DetectedObject, FashionItem, Vertex
+
+def test_dumps_encodes_results_as_their_fields():
+    obj = DetectedObject("Shirt", 0.9, [Vertex(0.1, 0.2)])
+    document = {"objects": [obj], 3: datetime(2024, 5, 1, tzinfo=timezone.utc)}
+
+    assert json.loads(dumps(document)) == {
+        "objects": [{"name": "Shirt", "score": 0.9, "bounding_poly": [{"x": 0.1, "y": 0.2}]}],
+        "3": "2024-05-01T00:00:00+00:00",
+    }
+
+def test_dumps_matches_to_primitive():
+    items = [FashionItem("label", "Dress", 88.0, None), FashionItem("object", "Dress", 91.0, [Vertex(0.0, 1.0)])]
+    assert json.loads(dumps(items)) == to_primitive(items)
@@ -0,0 +1,13 @@
+"""Readiness checks (see core/health.py)"""
+import asyncio
+
+import app.main  # noqa: F401  (registers every service's checks)
+from app.core.health import HealthChecker
+
+def test_readiness_runs_only_checks_that_reach_their_dependency(upstreams):
+    HealthChecker._results = None
+    checks = asyncio.run(HealthChecker.check_dependencies())
+    HealthChecker._results = None
+
+    assert set(checks) == {"redis", "supabase", "job_queue", "gcs"}
+    assert all(result["ok"] for result in checks.values()), checks
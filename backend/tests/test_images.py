@@ -0,0 +1,94 @@
+"""Image upload, its queued analysis and the job status endpoint"""
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+
+from app.core.jobs import job_queue
+from app.main import app
+
+async def _sign_in(client: httpx.AsyncClient, email: str):
+    response = await client.post("/auth/login", data={"username": email, "password": "secret"})
+    assert response.status_code == 200, response.text
+    client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+@asynccontextmanager
+async def _client(email: str = "shopper@example.com"):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        await _sign_in(client, email)
+        yield client
+
+def test_upload_queues_analysis_reported_by_job_status(upstreams, jpeg):
+    async def scenario():
+        async with _client() as client:
+            response = await client.post(
+                "/images/upload/", files={"file": ("outfit.jpg", jpeg, "image/jpeg")}
+            )
+            assert response.status_code == 200, response.text
+            upload = response.json()
+            assert upload["status"] == job_queue.QUEUED
+
+            queued = await client.get(f"/images/jobs/{upload['job_id']}")
+            assert queued.json()["status"] == job_queue.QUEUED
+
+            assert await job_queue.run_next(timeout=1)
+
+            finished = await client.get(f"/images/jobs/{upload['job_id']}")
+            return upload, finished.json()
+
+    upload, job = asyncio.run(scenario())
+
+    assert job["status"] == "succeeded", job["error"]
+    assert job["result"]["analysis"]
+    assert job["result"]["similar_products"]
+    (row,) = [row for row in upstreams["postgrest"].tables["images"] if row["id"] == upload["id"]]
+    assert row["public_url"] == upload["public_url"]
+    assert row["analysis"] == job["result"]["analysis"]
+    assert upload["file_path"] in upstreams["storage"].bucket.objects
+
+def test_job_status_hidden_from_other_users(upstreams, jpeg):
+    async def scenario():
+        async with _client() as client:
+            response = await client.post(
+                "/images/upload/", files={"file": ("outfit.jpg", jpeg, "image/jpeg")}
+            )
+            job_id = response.json()["job_id"]
+            await _sign_in(client, "other@example.com")
+            return await client.get(f"/images/jobs/{job_id}")
+
+    assert asyncio.run(scenario()).status_code == 404
+
+def test_upload_rejects_non_images(upstreams):
+    async def scenario():
+        async with _client() as client:
+            return await client.post("/images/upload/", files={"file": ("notes.txt", b"hello", "text/plain")})
+
+    assert asyncio.run(scenario()).status_code == 400
+
+def test_product_search(upstreams):
+    async def scenario():
+        async with _client() as client:
+            return await client.post("/images/search/", params={"query": "red dress", "price_max": 80})
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200, response.text
+    assert response.json()["products"]
+
+def test_batch_upload_stores_analyses_and_searches(upstreams, jpeg):
+    async def scenario():
+        async with _client() as client:
+            return await client.post("/images/upload/batch/", files=[
+                ("files", ("first.jpg", jpeg, "image/jpeg")),
+                ("files", ("second.jpg", jpeg + b"\0", "image/jpeg")),
+                ("files", ("notes.txt", b"hello", "text/plain")),
+            ])
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200, response.text
+    batch = response.json()
+    assert batch["count"] == 2
+    stored, _, rejected = batch["items"]
+    assert rejected["error"] == "File must be an image"
+    assert stored["analysis"] and stored["similar_products"]
+    (row,) = [row for row in upstreams["postgrest"].tables["images"] if row["id"] == stored["id"]]
+    assert row["similar_products"] == stored["similar_products"]
@@ -0,0 +1,20 @@
+"""Import-time budget of the API and worker entry points (see benchmarks/import_time.py)"""
+import pytest
+
+from benchmarks.import_time import BUDGET, MODULES, probe
+
+# Fresh interpreters tried before an import counts as over budget; one
+# slow run on a busy runner or a cold disk cache is not a regression
+ATTEMPTS = 3
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_within_budget(module):
+    timings = []
+    for _ in range(ATTEMPTS):
+        stats = probe(module)
+        assert "error" not in stats, f"import {module} failed: {stats.get('error')}"
+        assert not stats["built"], f"services built at import: {', '.join(stats['built'])}"
+        timings.append(stats["seconds"])
+        if stats["seconds"] <= BUDGET:
+            break
+    assert min(timings) <= BUDGET, f"import {module} took {min(timings):.2f}s, budget {BUDGET}s"
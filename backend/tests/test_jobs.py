@@ -0,0 +1,85 @@
+"""The Redis-backed job queue (see core/jobs.py), on the in-memory stand-in"""
+import asyncio
+import time
+
+import pytest
+
+from app.core.cache import cache
+from app.core.config import settings
+from app.core.jobs import JobQueue, job_queue
+from app.core.memory_cache import InMemoryRedis
+
+calls = []
+
+@job_queue.handler("test_echo")
+async def echo(payload, report):
+    calls.append(payload)
+    await report("progress", {"step": 1})
+    return {"echo": payload["value"]}
+
+@job_queue.handler("test_flaky")
+async def flaky(payload, report):
+    calls.append(payload)
+    if len(calls) == 1:
+        raise RuntimeError("upstream unavailable")
+    return {"attempt": len(calls)}
+
+@pytest.fixture(autouse=True)
+def redis(monkeypatch):
+    client = InMemoryRedis()
+    cache.set_backend(client)
+    monkeypatch.setattr(JobQueue, "_next_reclaim", 0.0)
+    calls.clear()
+    yield client
+    cache.set_backend(None)
+
+async def _events(job_id):
+    return [event["event"] async for _, event in job_queue.events(job_id, poll_interval=0)]
+
+def test_enqueue_is_idempotent_per_job_id():
+    async def scenario():
+        first = await job_queue.enqueue("test_echo", {"value": 1}, job_id="echo:1")
+        second = await job_queue.enqueue("test_echo", {"value": 2}, job_id="echo:1")
+        return first, second, await job_queue.queue_depth()
+
+    assert asyncio.run(scenario()) == (True, False, 1)
+
+def test_run_next_records_the_result_and_events():
+    async def scenario():
+        await job_queue.enqueue("test_echo", {"value": 7}, job_id="echo:7")
+        ran = await job_queue.run_next(timeout=1)
+        return ran, await job_queue.get("echo:7"), await _events("echo:7")
+
+    ran, job, events = asyncio.run(scenario())
+    assert ran
+    assert (job["status"], job["attempts"], job["result"]) == (JobQueue.SUCCEEDED, 1, {"echo": 7})
+    assert events == ["progress", "done"]
+
+def test_failed_attempt_is_retried_after_its_backoff(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF", 0)
+
+    async def scenario():
+        await job_queue.enqueue("test_flaky", {}, job_id="flaky")
+        await job_queue.run_next(timeout=1)
+        retrying = await job_queue.get("flaky")
+        await job_queue.run_next(timeout=1)
+        return retrying, await job_queue.get("flaky"), await _events("flaky")
+
+    retrying, job, events = asyncio.run(scenario())
+    assert (retrying["status"], retrying["error"]) == (JobQueue.QUEUED, "upstream unavailable")
+    assert (job["status"], job["attempts"], job["error"]) == (JobQueue.SUCCEEDED, 2, None)
+    assert events == ["retrying", "done"]
+
+def test_job_of_a_lost_worker_is_reclaimed(redis):
+    async def scenario():
+        await job_queue.enqueue("test_echo", {"value": 3}, job_id="echo:3")
+        # A worker takes the job and dies with its lease expired
+        await redis.brpoplpush(JobQueue.QUEUE_KEY, JobQueue.PROCESSING_KEY, timeout=1)
+        await redis.zadd(JobQueue.LEASES_KEY, {"echo:3": time.time() - 1})
+        ran = await job_queue.run_next(timeout=1)
+        return ran, await job_queue.get("echo:3"), await redis.llen(JobQueue.PROCESSING_KEY)
+
+    ran, job, processing = asyncio.run(scenario())
+    assert ran and job["status"] == JobQueue.SUCCEEDED
+    assert processing == 0
+    assert calls == [{"value": 3}]
@@ -0,0 +1,135 @@
+"""The in-process Redis stand-in (see core/memory_cache.py)"""
+import asyncio
+
+import pytest
+from redis.exceptions import ResponseError, WatchError
+
+from app.core.memory_cache import InMemoryRedis
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_keys_expire_after_their_ttl():
+    clock = Clock()
+    redis = InMemoryRedis(clock)
+
+    async def scenario():
+        await redis.set("count", 3, ex=60)
+        await redis.hset("hash", "field", "value")
+        await redis.expire("hash", 30)
+        before = (await redis.ttl("count"), await redis.ttl("hash"))
+        clock.now += 30
+        middle = (await redis.get("count"), await redis.hgetall("hash"))
+        clock.now += 30
+        after = (await redis.get("count"), await redis.exists("count"), await redis.ttl("count"))
+        return before, middle, after
+
+    before, middle, after = run(scenario())
+    assert before == (60, 30)
+    assert middle == ("3", {})
+    assert after == (None, 0, -2)
+
+def test_set_clears_the_ttl_unless_given_one():
+    clock = Clock()
+    redis = InMemoryRedis(clock)
+
+    async def scenario():
+        await redis.set("key", "a", ex=10)
+        await redis.set("key", "b")
+        clock.now += 60
+        return await redis.get("key"), await redis.ttl("key")
+
+    assert run(scenario()) == ("b", -1)
+
+def test_transaction_applies_queued_commands_together():
+    redis = InMemoryRedis()
+
+    async def scenario():
+        async with redis.pipeline(transaction=True) as pipe:
+            await pipe.watch("job")
+            assert not await pipe.exists("job")
+            pipe.multi()
+            pipe.hset("job", mapping={"status": "queued"})
+            pipe.lpush("queue", "job")
+            results = await pipe.execute()
+        return results, await redis.hgetall("job"), await redis.lrange("queue", 0, -1)
+
+    assert run(scenario()) == ([1, 1], {"status": "queued"}, ["job"])
+
+def test_transaction_aborts_when_a_watched_key_changes():
+    redis = InMemoryRedis()
+
+    async def scenario():
+        await redis.set("count", 1)
+        async with redis.pipeline(transaction=True) as pipe:
+            await pipe.watch("count")
+            await redis.incrby("count", 1)
+            pipe.multi()
+            pipe.incrby("count", 10)
+            with pytest.raises(WatchError):
+                await pipe.execute()
+        return await redis.get("count")
+
+    assert run(scenario()) == "2"
+
+def test_transaction_aborts_when_a_watched_key_expires():
+    clock = Clock()
+    redis = InMemoryRedis(clock)
+
+    async def scenario():
+        await redis.set("count", 1, ex=10)
+        async with redis.pipeline(transaction=True) as pipe:
+            await pipe.watch("count")
+            clock.now += 10
+            pipe.multi()
+            pipe.incrby("count", 1)
+            with pytest.raises(WatchError):
+                await pipe.execute()
+        return await redis.exists("count")
+
+    assert run(scenario()) == 0
+
+def test_brpoplpush_waits_for_a_push():
+    async def scenario():
+        redis = InMemoryRedis()
+        waiting = asyncio.ensure_future(redis.brpoplpush("queue", "processing", timeout=5))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        await redis.lpush("queue", "first", "second")
+        moved = await waiting
+        return moved, await redis.lrange("queue", 0, -1), await redis.lrange("processing", 0, -1)
+
+    assert run(scenario()) == ("first", ["second"], ["first"])
+
+def test_brpoplpush_times_out_empty():
+    async def scenario():
+        redis = InMemoryRedis()
+        return await redis.brpoplpush("queue", "processing", timeout=0.05)
+
+    assert run(scenario()) is None
+
+@pytest.mark.parametrize("setup, command", [
+    (lambda redis: redis.zadd("key", {"member": 1}), lambda redis: redis.hset("key", "field", "value")),
+    (lambda redis: redis.hset("key", "field", "value"), lambda redis: redis.zadd("key", {"member": 1})),
+    (lambda redis: redis.lpush("key", "value"), lambda redis: redis.get("key")),
+    (lambda redis: redis.set("key", "value"), lambda redis: redis.lpush("key", "value")),
+    (lambda redis: redis.hset("key", "field", "value"), lambda redis: redis.brpoplpush("queue", "key", timeout=1)),
+])
+def test_commands_on_the_wrong_type_raise_wrongtype(setup, command):
+    async def scenario():
+        redis = InMemoryRedis()
+        await setup(redis)
+        await redis.lpush("queue", "value")
+        with pytest.raises(ResponseError, match="WRONGTYPE"):
+            await command(redis)
+        return await redis.lrange("queue", 0, -1)
+
+    # A failed BRPOPLPUSH leaves its source list untouched
+    assert run(scenario()) == ["value"]
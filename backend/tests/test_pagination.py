@@ -0,0 +1,74 @@
+"""Keyset cursors and cached counts (see core/pagination.py)"""
+import asyncio
+
+import pytest
+
+from app.core import pagination
+from app.core.cache import cache
+from app.core.memory_cache import InMemoryRedis
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def redis():
+    clock = Clock()
+    client = InMemoryRedis(clock)
+    client.clock = clock
+    cache.set_backend(client)
+    yield client
+    cache.set_backend(None)
+
+def test_cursor_round_trip():
+    cursor = pagination.encode_cursor("2024-05-01T12:30:00.123456+00:00", "0b1c5a9e-8d3f-4a7b-9c2d-1e6f7a8b9c0d")
+    assert pagination.decode_cursor(cursor) == (
+        "2024-05-01T12:30:00.123456+00:00", "0b1c5a9e-8d3f-4a7b-9c2d-1e6f7a8b9c0d"
+    )
+
+@pytest.mark.parametrize("created_at, item_id", [
+    ('2024-05-01",id.gt."0', "0b1c5a9e-8d3f-4a7b-9c2d-1e6f7a8b9c0d"),
+    ("2024-05-01T12:30:00+00:00", "1),or(id.gt.0"),
+])
+def test_cursor_rejects_filter_injection(created_at, item_id):
+    cursor = pagination.encode_cursor(created_at, item_id)
+    with pytest.raises(ValueError):
+        pagination.decode_cursor(cursor)
+
+def test_adjust_leaves_uncached_counts_alone(redis):
+    assert asyncio.run(pagination.adjust_cached_count("image_count:user", 1)) is None
+    assert asyncio.run(redis.exists("image_count:user")) == 0
+
+def test_adjust_keeps_the_count_ttl(redis):
+    async def scenario():
+        await pagination.get_cached_count("image_count:user", _load(7))
+        count = await pagination.adjust_cached_count("image_count:user", 2)
+        return count, await redis.ttl("image_count:user")
+
+    assert asyncio.run(scenario()) == (9, pagination.COUNT_CACHE_EXPIRATION)
+
+def test_adjust_does_not_recreate_a_count_expiring_mid_update(redis):
+    exists = redis.exists
+
+    async def exists_then_expire(*keys):
+        found = await exists(*keys)
+        # The count expires between the check and the increment
+        redis.clock.now += pagination.COUNT_CACHE_EXPIRATION
+        return found
+
+    redis.exists = exists_then_expire
+
+    async def scenario():
+        await pagination.get_cached_count("image_count:user", _load(7))
+        return await pagination.adjust_cached_count("image_count:user", 1)
+
+    assert asyncio.run(scenario()) is None
+    assert asyncio.run(exists("image_count:user")) == 0
+
+def _load(count: int):
+    async def loader() -> int:
+        return count
+    return loader
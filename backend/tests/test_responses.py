@@ -0,0 +1,43 @@
+"""The fields= projection of JSON responses (see core/responses.py)"""
+import asyncio
+
+import httpx
+
+from app.core.responses import parse_fields, project
+from app.main import app
+from app.services.results import DetectedObject, Vertex
+
+def test_parse_fields_builds_a_projection_tree():
+    assert parse_fields("count, items.id,items.analysis.type,") == {
+        "count": {}, "items": {"id": {}, "analysis": {"type": {}}}
+    }
+
+def test_shorter_path_selects_the_whole_field():
+    assert parse_fields("items.id,items") == {"items": {}}
+    assert parse_fields("items,items.id") == {"items": {}}
+
+def test_project_traverses_lists_and_results():
+    document = {
+        "count": 1,
+        "cursor": "abc",
+        "items": [{"id": "a", "objects": [DetectedObject("Shirt", 0.9, [Vertex(0.1, 0.2)])]}],
+    }
+
+    assert project(document, parse_fields("count,items.objects.name,items.missing")) == {
+        "count": 1, "items": [{"objects": [{"name": "Shirt"}]}]
+    }
+
+def test_endpoint_response_is_projected(upstreams):
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            login = await client.post("/auth/login", data={"username": "shopper@example.com", "password": "secret"})
+            client.headers["Authorization"] = f"Bearer {login.json()['access_token']}"
+            return await client.post(
+                "/images/search/", params={"query": "red dress", "fields": "products.title,products.price"}
+            )
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200, response.text
+    products = response.json()["products"]
+    assert list(response.json()) == ["products"]
+    assert products and all(set(product) <= {"title", "price"} and "title" in product for product in products)
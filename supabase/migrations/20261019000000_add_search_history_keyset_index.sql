@@ -0,0 +1,4 @@
+-- Keyset pagination of search history orders by (created_at, id) per user;
+-- a composite index lets deep pages seek directly instead of scanning
+CREATE INDEX IF NOT EXISTS search_history_user_created_id_idx
+    ON search_history(user_id, created_at DESC, id DESC);
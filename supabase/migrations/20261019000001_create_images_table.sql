@@ -0,0 +1,29 @@
+-- Uploaded images and their analysis, written by the API and the analysis
+-- job worker (services/analysis.py) through PostgREST
+CREATE TABLE IF NOT EXISTS images (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    file_name TEXT,
+    file_path TEXT NOT NULL,
+    public_url TEXT,
+    analysis JSONB,
+    dominant_colors JSONB,
+    similar_products JSONB,
+    -- Written by the offline re-analysis (app/reanalyze.py)
+    vision_analysis JSONB,
+    analyzed_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Re-analysis writes back by file path
+CREATE INDEX IF NOT EXISTS images_file_path_idx ON images(file_path);
+
+-- Upload history pages are keyed on (created_at, id) per user
+CREATE INDEX IF NOT EXISTS images_user_created_id_idx
+    ON images(user_id, created_at DESC, id DESC);
+
+ALTER TABLE images ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view their own images"
+    ON images FOR SELECT
+    USING (auth.uid() = user_id);